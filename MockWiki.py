@@ -0,0 +1,370 @@
+import json
+import random
+from time import sleep,strftime,gmtime
+from threading import Thread,Lock
+from http.server import ThreadingHTTPServer,BaseHTTPRequestHandler
+from urllib.parse import urlparse,parse_qsl
+from WikiApi import canonicalQuery
+
+
+class RecordedResponses:
+    """
+    Responder that replays responses recorded with MediaWikiApi(record=True).
+
+    Args:
+        responses (dict): canonicalQuery : json response
+    """
+    def __init__(self,responses=None):
+        self.responses = responses if not type(responses) == type(None) else {}
+
+    @staticmethod
+    def load(file_name):
+        with open(file_name,'r',encoding='utf-8') as fp:
+            return RecordedResponses(json.load(fp))
+
+    def save(self,file_name):
+        with open(file_name,'w',encoding='utf-8') as fp:
+            json.dump(self.responses,fp)
+
+    def __call__(self,params):
+        key = canonicalQuery(params)
+        if not key in self.responses:
+            return 404,{},{'error':{'code':'notrecorded','info':f'No recorded response for {key}'}}
+        return 200,{},self.responses[key]
+
+
+class FaultyResponses:
+    """
+    Responder that injects errors into the responses of another responder, to test retries and backoff.
+
+    Args:
+        responder (function): Responder for the requests that are answered normally.
+
+        rates (dict): error : probability, errors are 'ratelimit' (429 with Retry-After), 'unavailable' (503),
+            'maxlag' (maxlag error with Retry-After), 'timeout' (answer after delay seconds) and 'disconnect'
+            (connection closed without answer).
+
+        retry_after (float): Seconds sent in Retry-After headers.
+
+        delay (float): Delay of 'timeout' answers.
+
+        seed (int / None): Seed of the random errors.
+    """
+    def __init__(self,responder,rates,retry_after=1,delay=2,seed=None):
+        self.responder = responder
+        self.rates = rates
+        self.retry_after = retry_after
+        self.delay = delay
+        self.random = random.Random(seed)
+        self.injected = {}
+        self._lock = Lock()
+
+    def __call__(self,params):
+        with self._lock:
+            draw = self.random.random()
+            error = None
+            for name,rate in self.rates.items():
+                if draw < rate:
+                    error = name
+                    break
+                draw -= rate
+            if error:
+                self.injected[error] = self.injected.get(error,0)+1
+        if error == 'ratelimit':
+            return 429,{'Retry-After':self.retry_after},{'error':{'code':'ratelimited','info':'Too many requests'}}
+        if error == 'unavailable':
+            return 503,{},{'error':{'code':'unavailable','info':'Service unavailable'}}
+        if error == 'maxlag':
+            return 200,{'Retry-After':self.retry_after,'X-Database-Lag':6},{'error':{'code':'maxlag','lag':6,
+                    'info':'Waiting for a database server: 6 seconds lagged'}}
+        if error == 'disconnect':
+            return None,{},{}
+        if error == 'timeout':
+            sleep(self.delay)
+        return self.responder(params)
+
+
+class SyntheticWiki:
+    """
+    Responder for a generated wiki, to measure the crawler without the live Wikipedia. Starting at the root category,
+    every category down to the given depth has fan_out subcategories and articles_per_category own articles.
+    A fraction of the articles (shared) is also member of a second random category. Every article links to links
+    other articles and to some titles outside the tree, its html has paragraphs of random words, citation marks and a
+    references section. The same seed gives the same wiki.
+
+    Answers list=categorymembers, prop=info|categories|links|extracts|langlinks, meta=siteinfo and list=recentchanges
+    with continuation like the MediaWiki api: at most limit list entries and extract_limit extracts per response.
+    Interlanguage links are taken from self.langlinks (title : {language : title}), which is empty at first.
+
+    Args:
+        depth (int): Levels of subcategories below the root.
+
+        fan_out (int): Subcategories per category.
+
+        articles_per_category (int): Articles per category.
+
+        links (int): Links to other articles per article.
+
+        paragraphs (int): Paragraphs per article.
+
+        shared (float): Fraction of the articles that are member of two categories.
+
+        limit (int): Maximal entries of list properties per response ('max' of the api).
+
+        extract_limit (int): Extracts per response (1 for full-page extracts of the api).
+
+        seed (int): Seed of the generator.
+
+        root (str): Title of the root category.
+    """
+    words = ('network','history','theory','city','river','language','science','system','music','century','state',
+             'species','model','culture','energy','function','group','region','book','method')
+
+    def __init__(self,depth=3,fan_out=4,articles_per_category=5,links=20,paragraphs=5,shared=0.1,limit=500,
+                 extract_limit=1,seed=0,root='Category:Root'):
+        self.limit = limit
+        self.extract_limit = extract_limit
+        self.root = root
+        self.random = random.Random(seed)
+        self.categories = {}
+        self.articles = {}
+        self.revisions = {}
+        self.changes = []
+        # category : title : timestamp of members added by addArticle
+        self.added = {}
+        self.langlinks = {}
+
+        level = [root]
+        self.categories[root] = {'members':[],'categories':[]}
+        for lvl in range(depth+1):
+            next_level = []
+            for category in level:
+                if lvl < depth:
+                    for i in range(fan_out):
+                        sub = '%s-%d'%(category,i)
+                        self.categories[sub] = {'members':[],'categories':[category]}
+                        self.categories[category]['members'].append(sub)
+                        next_level.append(sub)
+                for i in range(articles_per_category):
+                    article = 'Article %s-%d'%(category.split(':',1)[1],i)
+                    self.articles[article] = {'categories':[category]}
+                    self.categories[category]['members'].append(article)
+            level = next_level
+
+        titles = list(self.articles)
+        category_titles = list(self.categories)
+        for article in titles:
+            entry = self.articles[article]
+            if self.random.random() < shared:
+                other = self.random.choice(category_titles)
+                if not other in entry['categories']:
+                    entry['categories'].append(other)
+                    self.categories[other]['members'].append(article)
+            entry['links'] = self.random.sample(titles,min(links,len(titles)))
+            entry['links'] += ['Outside %d'%self.random.randrange(10*len(titles)) for _ in range(max(1,links//10))]
+            entry['links'].sort()
+            entry['text'] = self.html(article,paragraphs)
+        self.ids = {title:i+1 for i,title in enumerate(category_titles+titles)}
+
+    def html(self,title,paragraphs):
+        lines = []
+        for p in range(paragraphs):
+            sentence = ' '.join(self.random.choice(self.words) for _ in range(self.random.randint(40,120)))
+            lines.append('<p><b>%s</b> %s.<sup class="reference">[%d]</sup></p>'%(title,sentence,p+1))
+            if p == 0:
+                lines.append('<h2>Overview</h2>')
+        lines.append('<h2>References</h2><ol><li>Source of %s</li></ol>'%title)
+        return '\n'.join(lines)
+
+    def page(self,title):
+        if title in self.categories:
+            return self.categories[title]
+        return self.articles.get(title)
+
+    def namespace(self,title):
+        return 14 if title.startswith(self.root.split(':')[0]+':') else 0
+
+    def addArticle(self,title,categories,timestamp=None):
+        """
+        Create an article in categories, listed in the recent changes and as new member of the categories.
+        """
+        timestamp = timestamp if timestamp else strftime('%Y-%m-%dT%H:%M:%SZ',gmtime())
+        self.articles[title] = {'categories':list(categories),'links':[],'text':self.html(title,1)}
+        self.ids[title] = len(self.ids)+1
+        for category in categories:
+            self.categories[category]['members'].append(title)
+            self.added.setdefault(category,{})[title] = timestamp
+        self.changes.append(title)
+
+    def edit(self,titles):
+        """
+        Increase the revision of pages and list them in the recent changes.
+        """
+        for title in titles:
+            self.revisions[title] = self.revisions.get(title,0)+1
+            self.changes.append(title)
+
+    def __call__(self,params):
+        if params.get('list') == 'categorymembers':
+            members = self.categories.get(params['cmtitle'],{}).get('members',[])
+            if params.get('cmsort') == 'timestamp':
+                # members of the generated tree count as added before any timestamp
+                added = self.added.get(params['cmtitle'],{})
+                members = [m for m in members if added.get(m,'') >= params.get('cmstart','')]
+            if 'cmnamespace' in params:
+                namespaces = params['cmnamespace'].split('|')
+                members = [m for m in members if str(self.namespace(m)) in namespaces]
+            offset = int(params.get('cmcontinue',0))
+            response = {'query':{'categorymembers':[{'title':m,'ns':self.namespace(m),'pageid':self.ids[m]}
+                                                    for m in members[offset:offset+self.limit]]}}
+            if offset+self.limit < len(members):
+                response['continue'] = {'cmcontinue':str(offset+self.limit),'continue':'-||'}
+            return 200,{},response
+        if params.get('list') == 'recentchanges':
+            return 200,{},{'query':{'recentchanges':[{'title':t} for t in self.changes]}}
+        if params.get('meta') == 'siteinfo':
+            return 200,{},{'query':{'namespaces':{'0':{'name':''},'14':{'name':self.root.split(':')[0]}}}}
+        if not 'titles' in params:
+            return 400,{},{'error':{'code':'badparams','info':'Unsupported query'}}
+
+        titles = params['titles'].split('|')
+        props = params.get('prop','info').split('|')
+        done = set(params.get('continue','||').split('||',1)[-1].split('|'))
+        pages = []
+        found = []
+        for title in titles:
+            if type(self.page(title)) == type(None):
+                pages.append({'title':title,'missing':True})
+                continue
+            pages.append({'title':title,'pageid':self.ids[title],
+                          'lastrevid':10*self.ids[title]+self.revisions.get(title,0)})
+            found.append(pages[-1])
+
+        cont = {}
+        for prop,prefix in [('categories','cl'),('links','pl')]:
+            if not prop in props or prop in done:
+                continue
+            entries = [(p['title'],value) for p in found for value in self.page(p['title']).get(prop,[])]
+            offset = int(params.get(prefix+'continue',0))
+            chunk = {}
+            for title,value in entries[offset:offset+self.limit]:
+                chunk.setdefault(title,[]).append({'title':value,'ns':self.namespace(value)})
+            for p in found:
+                if p['title'] in chunk:
+                    p[prop] = chunk[p['title']]
+            if offset+self.limit < len(entries):
+                cont[prefix+'continue'] = str(offset+self.limit)
+            else:
+                done.add(prop)
+        if 'langlinks' in props:
+            for p in found:
+                links = self.langlinks.get(p['title'],{})
+                if len(links) > 0:
+                    p['langlinks'] = [{'lang':language,'title':title} for language,title in sorted(links.items())]
+        if 'extracts' in props and not 'extracts' in done:
+            offset = int(params.get('excontinue',0))
+            for p in found[offset:offset+self.extract_limit]:
+                p['extract'] = self.page(p['title']).get('text','')
+            if offset+self.extract_limit < len(found):
+                cont['excontinue'] = str(offset+self.extract_limit)
+            else:
+                done.add('extracts')
+
+        if not params.get('formatversion') == '2':
+            # format of wikipediaapi: pages by page id (negative for missing pages), empty strings as flags
+            pages = {str(p.get('pageid',-1-i)):dict(p,ns=self.namespace(p['title']),**({'missing':''} if 'missing' in p
+                                                                                     else {}))
+                     for i,p in enumerate(pages)}
+        response = {'query':{'pages':pages}}
+        if len(cont) > 0:
+            cont['continue'] = '||'+'|'.join(sorted(d for d in done if d))
+            response['continue'] = cont
+        return 200,{},response
+
+
+class DelayedResponses:
+    """
+    Responder that answers after a random latency, to simulate the round trip to a remote server.
+
+    Args:
+        responder (function): Responder for the requests.
+
+        latency (float): Mean latency in seconds.
+
+        jitter (float): Latencies are uniform in latency*(1-jitter) ... latency*(1+jitter).
+
+        seed (int / None): Seed of the random latencies.
+    """
+    def __init__(self,responder,latency=0.05,jitter=0.5,seed=None):
+        self.responder = responder
+        self.latency = latency
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self._lock = Lock()
+
+    def __call__(self,params):
+        with self._lock:
+            factor = 1+self.jitter*(2*self.random.random()-1)
+        if self.latency > 0:
+            sleep(self.latency*factor)
+        return self.responder(params)
+
+
+class MockWikiServer:
+    """
+    Local http stand-in for api.php. Every GET request is answered by the responder, a function mapping the
+    request parameters to (status, headers, json response). A status of None closes the connection without answer.
+
+    Example:
+        with MockWikiServer(DelayedResponses(SyntheticWiki(depth=3),latency=0.05)) as server:
+            net = KnowledgeNet()
+            net.setBackend(batched=True,api_url=server.url)
+    """
+    def __init__(self,responder,host='127.0.0.1',port=0):
+        self.responder = responder
+        self.request_count = 0
+        self._lock = Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # keep connections alive like the api servers, send headers and body without waiting for acks
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def log_message(self,*args):
+                pass
+
+            def do_GET(self):
+                with server._lock:
+                    server.request_count += 1
+                params = dict(parse_qsl(urlparse(self.path).query))
+                status,headers,response = server.responder(params)
+                if type(status) == type(None):
+                    self.close_connection = True
+                    return
+                body = json.dumps(response).encode()
+                self.send_response(status)
+                self.send_header('Content-Type','application/json')
+                self.send_header('Content-Length',str(len(body)))
+                for key,value in headers.items():
+                    self.send_header(key,str(value))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer((host,port),Handler)
+        self.httpd.daemon_threads = True
+        self.url = 'http://%s:%d/w/api.php'%self.httpd.server_address[:2]
+
+    def start(self):
+        Thread(target=self.httpd.serve_forever,daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self,*args):
+        self.stop()
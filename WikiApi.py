@@ -0,0 +1,687 @@
+import sqlite3
+import json
+import random
+from time import time,sleep,perf_counter
+from urllib.parse import urlencode
+from threading import Lock
+
+# days of the recent changes that Wikipedia keeps (see MediaWikiApi.recentChanges)
+RECENT_CHANGES_DAYS = 30
+
+
+def canonicalQuery(params):
+    """
+    Unique string for a set of request parameters (independent of the order), used to record and replay responses.
+
+    Args:
+        params (dict): Parameters of an api request.
+
+    Returns:
+        str
+    """
+    return urlencode(sorted((str(k),str(v)) for k,v in params.items() if not k in ['format','formatversion','maxlag']))
+
+
+class RequestFailed(Exception):
+    """
+    A request that still failed after the retries of the RequestScheduler.
+    """
+    def __init__(self,message,error_class=None):
+        super().__init__(message)
+        self.error_class = error_class
+
+    def __reduce__(self):
+        return (RequestFailed,(self.args[0],self.error_class))
+
+
+class RequestScheduler:
+    """
+    Schedules all requests to Wikipedia, shared by all workers and both backends. A token bucket caps the request
+    rate; transient errors are retried with exponential backoff and jitter per error class on the same http session.
+    Retry-After headers (429, 503, maxlag) pause all workers for the given time.
+
+    Args:
+        max_rps (float / None): Requests per second of all workers together. None means no cap.
+
+        burst (int): Number of requests that may be sent at once after an idle period.
+
+        max_retries (int): Retries per request before RequestFailed is raised.
+
+        maxlag (int / None): Sent as maxlag parameter, so that the api refuses requests while its replication lag
+            exceeds maxlag seconds (recommended for long crawls: 5).
+
+        backoff (dict / None): error class : (base delay, max. delay) in seconds, see default_backoff.
+
+        pool_size (int): Connections kept open per host in the shared http session.
+
+        metrics (WikiMetrics.Metrics / None): Receives request latencies, bytes and retries.
+    """
+    default_backoff = {'network':(1.0,30.0),'server':(2.0,60.0),'ratelimit':(5.0,120.0),'maxlag':(5.0,120.0)}
+
+    def __init__(self,max_rps=None,burst=1,max_retries=5,maxlag=None,backoff=None,pool_size=16,metrics=None):
+        self.max_rps = max_rps
+        self.burst = burst
+        self.max_retries = max_retries
+        self.maxlag = maxlag
+        self.backoff = dict(self.default_backoff,**(backoff if backoff else {}))
+        self.pool_size = pool_size
+        self.metrics = metrics
+        self._lock = Lock()
+        self._session = None
+        self.resetCounters()
+
+    def session(self):
+        """
+        Http session shared by all clients of the scheduler, so that connections are pooled across workers and
+        language editions.
+        """
+        with self._lock:
+            if type(self._session) == type(None):
+                import requests
+                from requests.adapters import HTTPAdapter
+                self._session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.pool_size,pool_maxsize=self.pool_size)
+                self._session.mount('http://',adapter)
+                self._session.mount('https://',adapter)
+                self._session.headers.update({'User-Agent':'WikiCrawler (https://github.com/lohex/WikiCrawler)'})
+            return self._session
+
+    def resetCounters(self):
+        with self._lock:
+            self._tokens = self.burst
+            self._refilled = time()
+            self._paused_until = 0
+            self.started = time()
+            self.requests = 0
+            self.succeeded = 0
+            self.failed = 0
+            self.retries = {}
+            self.waited = 0.0
+            self.bytes = 0
+            self.endpoints = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        state['_session'] = None
+        return state
+
+    def __setstate__(self,state):
+        self.__dict__.update(state)
+        self.__dict__.setdefault('pool_size',16)
+        self.__dict__.setdefault('metrics',None)
+        self._session = None
+        self._lock = Lock()
+        self.resetCounters()
+
+    def acquire(self):
+        """
+        Block until the token bucket and a possible pause allow the next request.
+        """
+        with self._lock:
+            now = time()
+            wait = max(0,self._paused_until-now)
+            if self.max_rps:
+                self._tokens = min(self.burst,self._tokens+(now-self._refilled)*self.max_rps)
+                self._refilled = now
+                # reserve a token, a negative balance is the queue of waiting requests
+                self._tokens -= 1
+                if self._tokens < 0:
+                    wait = max(wait,-self._tokens/self.max_rps)
+            self.waited += wait
+        if wait > 0:
+            sleep(wait)
+
+    def pause(self,seconds):
+        """
+        Hold back all requests for seconds (e.g. after Retry-After).
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until,time()+seconds)
+
+    def delay(self,error_class,attempt,retry_after=None):
+        """
+        Waiting time before the next attempt: Retry-After if given, otherwise exponential backoff with jitter.
+        """
+        if retry_after:
+            return retry_after+random.uniform(0,0.1*retry_after)
+        base,cap = self.backoff[error_class]
+        delay = min(cap,base*2**attempt)
+        return delay/2+random.uniform(0,delay/2)
+
+    @staticmethod
+    def retryAfter(response):
+        try:
+            return float(response.headers.get('Retry-After'))
+        except (TypeError,ValueError):
+            return None
+
+    def classify(self,response):
+        """
+        Error class of a response (None for responses that are not retried).
+        """
+        if response.status_code == 429:
+            return 'ratelimit'
+        if response.status_code >= 500:
+            return 'server'
+        if response.status_code == 200 and b'"error"' in response.content[:200]:
+            try:
+                code = response.json().get('error',{}).get('code')
+            except ValueError:
+                return None
+            if code == 'maxlag':
+                return 'maxlag'
+            if code == 'ratelimited':
+                return 'ratelimit'
+        return None
+
+    def request(self,session,url,params,timeout=10,label=''):
+        """
+        Send a GET request through the scheduler.
+
+        Args:
+            label (str): Kind of request (e.g. the requested properties) for the latency histogram of the metrics.
+
+        Returns:
+            requests.Response: the first response that is not a transient error
+        """
+        import requests
+        params = dict(params)
+        if self.maxlag and not 'maxlag' in params:
+            params['maxlag'] = self.maxlag
+        for attempt in range(self.max_retries+1):
+            self.acquire()
+            retry_after = None
+            start = perf_counter()
+            try:
+                response = session.get(url,params=params,timeout=timeout)
+                error_class = self.classify(response)
+                retry_after = self.retryAfter(response)
+            except (requests.Timeout,requests.ConnectionError) as e:
+                error_class,response = 'network',e
+            if not type(self.metrics) == type(None):
+                self.metrics.observe('request_seconds',perf_counter()-start,label)
+                if error_class:
+                    self.metrics.count('retries_'+error_class)
+                else:
+                    self.metrics.count('bytes_fetched',len(response.content))
+            with self._lock:
+                self.requests += 1
+                endpoint = self.endpoints.setdefault(url,{'requests':0,'succeeded':0,'bytes':0})
+                endpoint['requests'] += 1
+                if error_class:
+                    self.retries[error_class] = self.retries.get(error_class,0)+1
+                else:
+                    self.succeeded += 1
+                    self.bytes += len(response.content)
+                    endpoint['succeeded'] += 1
+                    endpoint['bytes'] += len(response.content)
+            if not error_class:
+                return response
+            if attempt == self.max_retries:
+                break
+            wait = self.delay(error_class,attempt,retry_after)
+            if retry_after or error_class in ['ratelimit','maxlag']:
+                self.pause(wait)
+            else:
+                sleep(wait)
+        with self._lock:
+            self.failed += 1
+        raise RequestFailed('Request failed after %d retries (%s): %s'%(self.max_retries,error_class,response),error_class)
+
+    def stats(self):
+        """
+        Counters since the last reset.
+
+        Returns:
+            dict: requests, succeeded, failed, retries per error class, seconds waited for the rate limit or pauses,
+                received bytes, successful requests per second and the counters per api url (endpoints)
+        """
+        with self._lock:
+            elapsed = max(1e-9,time()-self.started)
+            return {'requests':self.requests,'succeeded':self.succeeded,'failed':self.failed,
+                    'retries':dict(self.retries),'waited':round(self.waited,3),'bytes':self.bytes,
+                    'throughput':self.succeeded/elapsed,
+                    'endpoints':{url:dict(counts,throughput=counts['succeeded']/elapsed)
+                                 for url,counts in self.endpoints.items()}}
+
+
+class ResponseCache:
+    """
+    Persistent sqlite cache for api responses, keyed by language, title and property.
+
+    Args:
+        path (str): sqlite file.
+
+        ttl (float / None): Entries older than ttl seconds are treated as missing.
+
+        max_mb (float / None): When the cache grows beyond max_mb, the least recently used entries are removed.
+
+        revalidate (bool): Compare the stored revision id with the current lastrevid of the page before using an entry.
+            This costs one info request per batch, but pages that were edited since are requested again.
+    """
+    def __init__(self,path,ttl=None,max_mb=None,revalidate=False):
+        self.path = path
+        self.ttl = ttl
+        self.max_mb = max_mb
+        self.revalidate = revalidate
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evicted = 0
+        self._lock = Lock()
+        self.connect()
+
+    def connect(self):
+        self.db = sqlite3.connect(self.path,check_same_thread=False,isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS responses (language TEXT, title TEXT, prop TEXT, revid INTEGER, '
+                        'stored REAL, accessed REAL, size INTEGER, value TEXT, PRIMARY KEY (language,title,prop))')
+        self.db.execute('CREATE INDEX IF NOT EXISTS lru ON responses (accessed)')
+        self._size = self.db.execute('SELECT COALESCE(SUM(size),0) FROM responses').fetchone()[0]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['db']
+        del state['_lock']
+        return state
+
+    def __setstate__(self,state):
+        self.__dict__.update(state)
+        self._lock = Lock()
+        self.connect()
+
+    def get(self,language,title,prop,revid=None):
+        """
+        Cached value or None.
+
+        Args:
+            revid (int / None): Current revision of the page. Entries of other revisions are treated as missing.
+        """
+        with self._lock:
+            row = self.db.execute('SELECT revid,stored,value FROM responses WHERE language=? AND title=? AND prop=?',
+                                  (language,title,prop)).fetchone()
+            if type(row) == type(None):
+                self.misses += 1
+                return None
+            if (self.ttl and row[1]+self.ttl < time()) or (revid and not row[0] == revid):
+                self.stale += 1
+                self.misses += 1
+                return None
+            self.db.execute('UPDATE responses SET accessed=? WHERE language=? AND title=? AND prop=?',
+                            (time(),language,title,prop))
+            self.hits += 1
+            return json.loads(row[2])
+
+    def put(self,language,title,prop,value,revid=0):
+        value = json.dumps(value)
+        with self._lock:
+            old = self.db.execute('SELECT size FROM responses WHERE language=? AND title=? AND prop=?',
+                                  (language,title,prop)).fetchone()
+            self._size += len(value) - (old[0] if old else 0)
+            now = time()
+            self.db.execute('INSERT OR REPLACE INTO responses VALUES (?,?,?,?,?,?,?,?)',
+                            (language,title,prop,revid,now,now,len(value),value))
+            if self.max_mb and self._size > self.max_mb*1e6:
+                self._evict(0.9*self.max_mb*1e6)
+
+    def _evict(self,target):
+        rows = self.db.execute('SELECT language,title,prop,size FROM responses ORDER BY accessed').fetchall()
+        remove = []
+        for language,title,prop,size in rows:
+            if self._size <= target:
+                break
+            remove.append((language,title,prop))
+            self._size -= size
+        self.db.executemany('DELETE FROM responses WHERE language=? AND title=? AND prop=?',remove)
+        self.evicted += len(remove)
+
+    def purge(self):
+        """
+        Remove all entries that are older than ttl.
+        """
+        if not self.ttl:
+            return 0
+        with self._lock:
+            removed = self.db.execute('DELETE FROM responses WHERE stored < ?',(time()-self.ttl,)).rowcount
+            self._size = self.db.execute('SELECT COALESCE(SUM(size),0) FROM responses').fetchone()[0]
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self.db.execute('DELETE FROM responses')
+            self._size = 0
+
+    def info(self):
+        """
+        Counters of the cache.
+
+        Returns:
+            dict
+        """
+        with self._lock:
+            entries = self.db.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+        total = self.hits + self.misses
+        return {'entries':entries,'size_mb':self._size/1e6,'hits':self.hits,'misses':self.misses,'stale':self.stale,
+                'evicted':self.evicted,'hit_rate':self.hits/total if total > 0 else 0}
+
+
+class BatchedPage:
+    """
+    Page object with the same interface as wikipediaapi.WikipediaPage (exists, categories, links, text,
+    categorymembers). Properties that were not prefetched in a batch are requested on first access.
+    """
+    def __init__(self,api,title,data=None):
+        self.api = api
+        self.title = title
+        self._data = data if not type(data) == type(None) else {}
+
+    def _get(self,prop):
+        if not prop in self._data:
+            self._data.update(self.api.loadPages([self.title],[prop])[self.title])
+        return self._data[prop]
+
+    def exists(self):
+        return self._get('pageid') > 0
+
+    @property
+    def pageid(self):
+        return self._get('pageid')
+
+    @property
+    def lastrevid(self):
+        return self._get('lastrevid')
+
+    @property
+    def categories(self):
+        return dict.fromkeys(self._get('categories'))
+
+    @property
+    def links(self):
+        return dict.fromkeys(self._get('links'))
+
+    @property
+    def text(self):
+        return self._get('extract')
+
+    @property
+    def langlinks(self):
+        return self._get('langlinks')
+
+    @property
+    def categorymembers(self):
+        if not 'categorymembers' in self._data:
+            self._data['categorymembers'] = self.api.categoryMembers(self.title)
+        return dict.fromkeys(self._data['categorymembers'])
+
+
+class MediaWikiApi:
+    """
+    Minimal client for the MediaWiki query api that requests several properties of up to batch_size titles at once
+    and follows continue tokens until the batch is complete.
+
+    Only pageid, lastrevid, categories, links and langlinks are batched. TextExtracts returns at most one full-page
+    extract per response even with exlimit='max' (20 only for intro extracts), so extracts of a batch are collected
+    by one continuation request per title: a collection with text still needs about one request per article, the
+    other properties come with the first responses.
+
+    Args:
+        language (str): Language edition of Wikipedia.
+
+        api_url (str / None): Url of api.php, e.g. of a local stand-in server. Default is the Wikipedia of language.
+
+        batch_size (int): Number of titles per request (the api accepts at most 50).
+
+        record (bool): Keep all responses in self.recorded (canonicalQuery : response) for replaying them later.
+
+        cache (ResponseCache / None): Persistent cache for page properties and category members.
+
+        scheduler (RequestScheduler / None): Rate limit and retries, shared with other clients.
+    """
+    props = {'categories':'categories','links':'links','extract':'extracts','langlinks':'langlinks','pageid':'info',
+             'lastrevid':'info'}
+
+    def __init__(self,language='en',api_url=None,batch_size=50,record=False,timeout=10,cache=None,scheduler=None):
+        self.language = language
+        self.cache = cache
+        self.scheduler = scheduler if not type(scheduler) == type(None) else RequestScheduler()
+        self.api_url = api_url if api_url else f'https://{language}.wikipedia.org/w/api.php'
+        self.batch_size = min(50,batch_size)
+        self.timeout = timeout
+        self.recorded = {} if record else None
+        self.request_count = 0
+        self._prefetched = {}
+        self._lock = Lock()
+        self.connect()
+
+    def connect(self):
+        """
+        Use the http session of the scheduler (connections are pooled with all clients of the scheduler).
+        """
+        self.session = self.scheduler.session()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for volatile in ['session','_prefetched','_lock']:
+            del state[volatile]
+        return state
+
+    def __setstate__(self,state):
+        self.__dict__.update(state)
+        if not 'scheduler' in state:
+            self.scheduler = RequestScheduler()
+        self._prefetched = {}
+        self._lock = Lock()
+        self.connect()
+
+    def get(self,params):
+        """
+        Send a single request to the api.
+
+        Args:
+            params (dict): Parameters of the request (without format).
+
+        Returns:
+            dict: decoded json response
+        """
+        params = dict(params,format='json',formatversion=2)
+        label = params.get('prop',params.get('list',params.get('meta','')))
+        response = self.scheduler.request(self.session,self.api_url,params,timeout=self.timeout,label=label)
+        response.raise_for_status()
+        result = response.json()
+        with self._lock:
+            self.request_count += 1
+        if not type(self.recorded) == type(None):
+            self.recorded[canonicalQuery(params)] = result
+        if 'error' in result:
+            raise Exception('MediaWiki api error %s: %s'%(result['error'].get('code'),result['error'].get('info')))
+        return result
+
+    def query(self,params):
+        """
+        Send a query and follow the continue tokens.
+
+        Yields:
+            dict: the 'query' part of each response
+        """
+        params = dict(params,action='query')
+        while True:
+            result = self.get(params)
+            if 'query' in result:
+                yield result['query']
+            if not 'continue' in result:
+                break
+            params.update(result['continue'])
+
+    def loadPages(self,titles,properties=('pageid','categories'),cached=True):
+        """
+        Request properties of up to batch_size titles at once.
+
+        Args:
+            titles (list of str): Page titles.
+
+            properties (list of str): Any of 'pageid', 'lastrevid', 'categories', 'links', 'extract' and 'langlinks'
+                (language : title of the article in other language editions). 'extract' costs one request per title.
+
+            cached (bool): Use the response cache (if there is one).
+
+        Returns:
+            dict: title : {property : value} (pageid is 0 for missing pages)
+        """
+        pages = {}
+        for first in range(0,len(titles),self.batch_size):
+            batch = titles[first:first+self.batch_size]
+            if type(self.cache) == type(None) or not cached:
+                pages.update(self._loadBatch(batch,properties))
+            else:
+                pages.update(self._loadCached(batch,properties))
+        return pages
+
+    def _loadCached(self,titles,properties):
+        properties = [p for p in properties if not p in ['pageid','lastrevid']]
+        revids = {}
+        if self.cache.revalidate:
+            revids = {t:info['lastrevid'] for t,info in self._loadBatch(titles,['pageid']).items()}
+
+        pages = {}
+        missing = []
+        for title in titles:
+            cached = {p:self.cache.get(self.language,title,p,revids.get(title)) for p in ['info']+properties}
+            if any(type(v) == type(None) for v in cached.values()):
+                missing.append(title)
+                continue
+            pages[title] = cached.pop('info')
+            pages[title].update(cached)
+
+        if len(missing) > 0:
+            loaded = self._loadBatch(missing,properties)
+            for title,data in loaded.items():
+                revid = data['lastrevid']
+                self.cache.put(self.language,title,'info',{'pageid':data['pageid'],'lastrevid':revid},revid)
+                for p in properties:
+                    self.cache.put(self.language,title,p,data[p],revid)
+            pages.update(loaded)
+        return pages
+
+    def _loadBatch(self,titles,properties):
+        prop = sorted(set(self.props[p] for p in properties).union(['info']))
+        params = {'titles':'|'.join(titles),'prop':'|'.join(prop),'redirects':1}
+        if 'categories' in prop:
+            params['cllimit'] = 'max'
+        if 'links' in prop:
+            params['pllimit'] = 'max'
+        if 'extracts' in prop:
+            params['exlimit'] = 'max'
+        if 'langlinks' in prop:
+            params['lllimit'] = 'max'
+
+        alias = {}
+        data = {}
+        for query in self.query(params):
+            for key in ['normalized','redirects']:
+                for entry in query.get(key,[]):
+                    alias[entry['from']] = entry['to']
+            for page in query.get('pages',[]):
+                entry = data.setdefault(page['title'],{'pageid':0,'lastrevid':0,'categories':[],'links':[],'extract':'',
+                                                      'langlinks':{}})
+                if not page.get('missing',False) and 'pageid' in page:
+                    entry['pageid'] = page['pageid']
+                    entry['lastrevid'] = page.get('lastrevid',0)
+                entry['categories'] += [c['title'] for c in page.get('categories',[])]
+                entry['links'] += [l['title'] for l in page.get('links',[])]
+                entry['extract'] += page.get('extract','')
+                entry['langlinks'].update({l['lang']:l['title'] for l in page.get('langlinks',[])})
+
+        pages = {}
+        for title in titles:
+            target = title
+            for _ in range(len(alias)):
+                if not target in alias:
+                    break
+                target = alias[target]
+            found = data.get(target,{'pageid':0,'lastrevid':0,'categories':[],'links':[],'extract':'','langlinks':{}})
+            pages[title] = {p:found[p] for p in properties}
+            pages[title].update(pageid=found['pageid'],lastrevid=found['lastrevid'])
+        return pages
+
+    def categoryMembers(self,category):
+        """
+        Request all members (articles and subcategories) of a category.
+
+        Returns:
+            list of str
+        """
+        if not type(self.cache) == type(None):
+            members = self.cache.get(self.language,category,'categorymembers')
+            if not type(members) == type(None):
+                return members
+        members = []
+        for query in self.query({'list':'categorymembers','cmtitle':category,'cmlimit':'max'}):
+            members += [m['title'] for m in query.get('categorymembers',[])]
+        if not type(self.cache) == type(None):
+            self.cache.put(self.language,category,'categorymembers',members)
+        return members
+
+    def newMembers(self,category,since,namespaces=(0,)):
+        """
+        Members that were added to a category since a point in time (not limited to the recent changes).
+
+        Args:
+            since (str): UTC timestamp, e.g. '2024-01-31T00:00:00Z'.
+
+            namespaces (list of int): 0 = articles, 14 = categories.
+
+        Returns:
+            list of str
+        """
+        params = {'list':'categorymembers','cmtitle':category,'cmsort':'timestamp','cmdir':'newer','cmstart':since,
+                  'cmnamespace':'|'.join(str(n) for n in namespaces),'cmlimit':'max'}
+        members = []
+        for query in self.query(params):
+            members += [m['title'] for m in query.get('categorymembers',[])]
+        return members
+
+    def namespaceName(self,namespace=14):
+        """
+        Local name of a namespace from the siteinfo of the wiki (e.g. 'Kategorie' for 14 in the German Wikipedia).
+        """
+        for query in self.query({'meta':'siteinfo','siprop':'namespaces'}):
+            return query['namespaces'][str(namespace)]['name']
+
+    def recentChanges(self,since,namespaces=(0,)):
+        """
+        Titles of all pages that were edited, created, moved or deleted since a point in time.
+        Wikipedia keeps the recent changes for 30 days (RECENT_CHANGES_DAYS).
+
+        Args:
+            since (str): UTC timestamp, e.g. '2024-01-31T00:00:00Z'.
+
+            namespaces (list of int): 0 = articles, 14 = categories.
+
+        Returns:
+            set of str
+        """
+        params = {'list':'recentchanges','rcend':since,'rcnamespace':'|'.join(str(n) for n in namespaces),
+                  'rcprop':'title|ids','rctype':'edit|new|log','rclimit':'max'}
+        titles = set()
+        for query in self.query(params):
+            titles.update(change['title'] for change in query.get('recentchanges',[]))
+        return titles
+
+    def prefetch(self,titles,properties=('pageid','categories')):
+        """
+        Load pages in batches and keep them until they are requested by page().
+        """
+        loaded = self.loadPages(titles,properties)
+        with self._lock:
+            for title,data in loaded.items():
+                self._prefetched[title] = BatchedPage(self,title,data)
+
+    def page(self,title):
+        """
+        Page object for a title. Prefetched pages are handed out once, otherwise the data is requested lazily.
+        """
+        with self._lock:
+            prefetched = self._prefetched.pop(title,None)
+        return prefetched if not type(prefetched) == type(None) else BatchedPage(self,title)
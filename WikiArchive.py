@@ -0,0 +1,584 @@
+import os
+import io
+import glob
+import shutil
+import zipfile
+import hashlib
+import json
+import multiprocessing
+from collections import deque,namedtuple
+from WikiBlocks import isDeduplicated,openStore,closeStore
+
+
+def isZipped(archive_path):
+    return archive_path.endswith('.zip')
+
+
+def shardPath(archive_path,index):
+    """
+    File name of a shard of a zip archive: name.zip -> name-00003.zip
+    """
+    return '%s-%05d.zip'%(archive_path[:-4],index)
+
+
+def archiveFiles(archive_path):
+    """
+    All zip files that belong to an archive (the zip file itself and its shards).
+
+    Args:
+        archive_path (str): Path of the archive (name.zip).
+
+    Returns:
+        list of str
+    """
+    files = [archive_path] if os.path.isfile(archive_path) else []
+    return files + sorted(glob.glob(glob.escape(archive_path[:-4])+'-[0-9][0-9][0-9][0-9][0-9].zip'))
+
+
+def entryName(title):
+    """
+    File name of an article in the archive.
+    """
+    return hashlib.md5(title.encode()).hexdigest()+'.txt'
+
+
+def manifestPath(archive_path):
+    return archive_path.rstrip('/\\')+'.manifest.jsonl'
+
+
+def hasEntries(archive_path):
+    """
+    True if the archive exists and holds at least one article.
+    """
+    if isDeduplicated(archive_path):
+        return os.path.exists(os.path.join(archive_path,'store.json')) and len(openStore(archive_path)) > 0
+    if isZipped(archive_path):
+        return len(archiveFiles(archive_path)) > 0
+    return os.path.isdir(archive_path) and any(entry.name.endswith('.txt') for entry in os.scandir(archive_path))
+
+
+def labelRecord(text):
+    """
+    Labels of an archive entry for its manifest record: the inherited and the direct categories (first two lines).
+    """
+    lines = text.split('\n',2)
+    return {'categories':_splitLabels(lines[0]),'direct':_splitLabels(lines[1]) if len(lines) > 1 else []}
+
+
+class ArchiveManifest:
+    """
+    Index of an archive: article title : storage key (file name), shard (zip file), offset of the entry in the zip
+    file, size in bytes, revision id and the labels (categories and direct categories, so that readers can filter
+    by category without decompressing the entries). It is kept as an append-only json-lines file next to the archive
+    (name.zip.manifest.jsonl or name.manifest.jsonl), later lines replace earlier ones.
+
+    Args:
+        archive_path (str): Directory or zip file of the archive.
+    """
+    def __init__(self,archive_path):
+        self.archive_path = archive_path
+        self.path = manifestPath(archive_path)
+        self.entries = {}
+        if os.path.exists(self.path):
+            with open(self.path,'r',encoding='utf-8') as fp:
+                for line in fp:
+                    if len(line.strip()) == 0:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if record.get('removed',False):
+                        self.entries.pop(record['title'],None)
+                    else:
+                        self.entries[record['title']] = record
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    @staticmethod
+    def append(archive_path,records):
+        """
+        Append records (dicts with title, key, shard, offset, size, revid) to the manifest of an archive.
+        """
+        if len(records) == 0:
+            return
+        with open(manifestPath(archive_path),'a',encoding='utf-8') as fp:
+            fp.write(''.join(json.dumps(record)+'\n' for record in records))
+
+    def add(self,records):
+        ArchiveManifest.append(self.archive_path,records)
+        for record in records:
+            self.entries[record['title']] = record
+
+    def remove(self,titles):
+        titles = [t for t in titles if t in self.entries]
+        ArchiveManifest.append(self.archive_path,[{'title':t,'removed':True} for t in titles])
+        for title in titles:
+            del self.entries[title]
+
+    def compact(self):
+        """
+        Rewrite the manifest with one line per article.
+        """
+        with open(self.path+'.tmp','w',encoding='utf-8') as fp:
+            fp.write(''.join(json.dumps(record)+'\n' for record in self.entries.values()))
+        os.replace(self.path+'.tmp',self.path)
+
+    def refresh(self,zip_paths):
+        """
+        Update the offsets of all entries in rewritten zip files.
+        """
+        for path in zip_paths:
+            shard = os.path.basename(path)
+            with zipfile.ZipFile(path,'r') as zf:
+                offsets = {info.filename:info.header_offset for info in zf.infolist()}
+            for record in self.entries.values():
+                if record.get('shard') == shard and record['key'] in offsets:
+                    record['offset'] = offsets[record['key']]
+        self.compact()
+
+    def rebuild(self,titles):
+        """
+        Create the manifest from the files of the archive. Titles are recovered from the md5 file names.
+
+        Args:
+            titles (iterable of str): Titles of all articles that might be in the archive.
+        """
+        names = {entryName(t):t for t in titles}
+        self.entries = {}
+        if isDeduplicated(self.archive_path):
+            store = openStore(self.archive_path)
+            for name in store.names():
+                if name in names:
+                    title = names[name]
+                    self.entries[title] = {'title':title,'key':name,'shard':None,'offset':None,
+                                           'size':len(store.get(name).encode()),'revid':0}
+        elif isZipped(self.archive_path):
+            for path in archiveFiles(self.archive_path):
+                with zipfile.ZipFile(path,'r') as zf:
+                    for info in zf.infolist():
+                        if info.filename in names:
+                            title = names[info.filename]
+                            self.entries[title] = {'title':title,'key':info.filename,'shard':os.path.basename(path),
+                                                   'offset':info.header_offset,'size':info.file_size,'revid':0}
+        elif os.path.isdir(self.archive_path):
+            for entry in os.scandir(self.archive_path):
+                if entry.name in names:
+                    title = names[entry.name]
+                    self.entries[title] = {'title':title,'key':entry.name,'shard':None,'offset':None,
+                                           'size':entry.stat().st_size,'revid':0}
+        self.compact()
+
+    def __contains__(self,title):
+        return title in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self,title,default=None):
+        return self.entries.get(title,default)
+
+    def missing(self,titles):
+        """
+        Titles that are not in the archive.
+        """
+        return [t for t in titles if not t in self.entries]
+
+    def stale(self,revisions):
+        """
+        Titles whose stored revision differs from the given one.
+
+        Args:
+            revisions (dict): title : revision id
+        """
+        return [t for t,revid in revisions.items() if t in self.entries and not self.entries[t].get('revid') == revid]
+
+
+def removeEntries(archive_path,names):
+    """
+    Delete entries from an archive. Every zip file (or shard) that contains such entries is rewritten once.
+
+    Args:
+        archive_path (str): Directory or zip file.
+
+        names (set of str): File names of the entries.
+
+    Returns:
+        list of str: rewritten zip files
+    """
+    if isDeduplicated(archive_path):
+        if os.path.isdir(archive_path):
+            openStore(archive_path).remove(names)
+        return []
+    if not isZipped(archive_path):
+        for name in names:
+            file_path = os.path.join(archive_path,name)
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        return []
+
+    rewritten = []
+    for path in archiveFiles(archive_path):
+        with zipfile.ZipFile(path,'r') as zf:
+            if len(names.intersection(zf.namelist())) == 0:
+                continue
+            with zipfile.ZipFile(path+'.tmp','w',compression=zipfile.ZIP_DEFLATED) as out:
+                for info in zf.infolist():
+                    if not info.filename in names:
+                        out.writestr(info,zf.read(info))
+        os.replace(path+'.tmp',path)
+        rewritten.append(path)
+    return rewritten
+
+
+def deleteArchive(archive_path):
+    """
+    Delete an archive directory or a zip file including its shards.
+    """
+    if isDeduplicated(archive_path):
+        closeStore(archive_path)
+    if os.path.isdir(archive_path):
+        shutil.rmtree(archive_path)
+    elif isZipped(archive_path):
+        for path in archiveFiles(archive_path):
+            os.remove(path)
+    if os.path.exists(manifestPath(archive_path)):
+        os.remove(manifestPath(archive_path))
+
+
+class ArchiveWriter:
+    """
+    Writes the text files of collected articles into a directory, a zip archive or a deduplicating paragraph store
+    (name.wds, see WikiBlocks.ParagraphStore).
+
+    Entries of zip archives are kept in memory and written by flush(): the zip file is opened once per flush,
+    all buffered entries are appended and the central directory is written when it is closed. So the file on disk is
+    a complete zip archive between the flushes and appending n articles no longer rewrites the central directory
+    n times. An interruption during a flush (e.g. KeyboardInterrupt) still closes the zip file properly. Entries of
+    paragraph stores are buffered the same way and written as compressed blocks by flush().
+
+    With shard_articles or shard_mb, the archive is split into name-00000.zip, name-00001.zip, ... and a new shard
+    is started when the current one holds shard_articles entries or exceeds shard_mb MB (checked before every entry,
+    so a shard is at most one entry larger).
+
+    Args:
+        archive_path (str): Directory, zip file (name.zip) or paragraph store (name.wds).
+
+        buffer_size (int): Number of buffered entries that triggers a flush.
+
+        shard_articles (int / None): Maximal number of articles per shard.
+
+        shard_mb (float / None): Maximal size of a shard in MB.
+
+        titles (iterable of str / None): Titles of all articles that might be in the archive. If the archive was
+            written by an older version without a manifest, the manifest is rebuilt from them before appending, so
+            that it also holds the older entries.
+    """
+    def __init__(self,archive_path,buffer_size=100,shard_articles=None,shard_mb=None,titles=None):
+        self.archive_path = archive_path
+        self.zipped = isZipped(archive_path)
+        self.deduplicated = isDeduplicated(archive_path)
+        self.buffer_size = max(1,buffer_size)
+        self.shard_articles = shard_articles
+        self.shard_mb = shard_mb
+        self.sharded = self.zipped and bool(shard_articles or shard_mb)
+        self.buffer = deque()
+        self.written = 0
+        self.bytes_written = 0
+        self.shard = 0
+        self.shard_entries = 0
+        if self.sharded:
+            shards = archiveFiles(archive_path)
+            shards = [s for s in shards if not s == archive_path]
+            self.shard = max(0,len(shards)-1)
+            if len(shards) > 0:
+                with zipfile.ZipFile(shards[-1],'r') as zf:
+                    self.shard_entries = len(zf.namelist())
+        if not type(titles) == type(None) and not os.path.exists(manifestPath(archive_path)) \
+           and hasEntries(archive_path):
+            ArchiveManifest(archive_path).rebuild(titles)
+
+    def currentPath(self):
+        return shardPath(self.archive_path,self.shard) if self.sharded else self.archive_path
+
+    def write(self,name,text,title=None,revid=0):
+        """
+        Add a text file to the archive (buffered for zip archives). With a title, the entry is recorded in the
+        manifest of the archive once it is written.
+        """
+        if not self.zipped and not self.deduplicated:
+            with open(os.path.join(self.archive_path,name),'w',encoding='utf-8') as fp:
+                fp.write(text)
+            self.written += 1
+            self.bytes_written += len(text)
+            if not type(title) == type(None):
+                ArchiveManifest.append(self.archive_path,[dict(title=title,key=name,shard=None,offset=None,
+                                                               size=len(text.encode()),revid=revid,**labelRecord(text))])
+            return
+        self.buffer.append((name,text,title,revid))
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def _shardFull(self):
+        if not self.sharded or self.shard_entries == 0:
+            return False
+        if self.shard_articles and self.shard_entries >= self.shard_articles:
+            return True
+        path = self.currentPath()
+        return bool(self.shard_mb) and os.path.exists(path) and os.path.getsize(path) >= self.shard_mb*1e6
+
+    def _entriesFull(self,zf):
+        # checked before every entry of a flush, so that a shard exceeds shard_mb by at most one entry
+        if self.shard_articles and self.shard_entries >= self.shard_articles:
+            return True
+        return bool(self.shard_mb) and zf.fp.tell() >= self.shard_mb*1e6
+
+    def flush(self):
+        """
+        Append all buffered entries to the zip archive or paragraph store.
+        """
+        if self.deduplicated:
+            self._flushStore()
+        while len(self.buffer) > 0:
+            if self._shardFull():
+                self.shard += 1
+                self.shard_entries = 0
+            records = []
+            try:
+                with zipfile.ZipFile(self.currentPath(),'a',compression=zipfile.ZIP_DEFLATED) as zf:
+                    while len(self.buffer) > 0:
+                        if self.sharded and self.shard_entries > 0 and self._entriesFull(zf):
+                            break
+                        name,text,title,revid = self.buffer[0]
+                        zf.writestr(name,text)
+                        self.buffer.popleft()
+                        self.written += 1
+                        self.shard_entries += 1
+                        self.bytes_written += len(text)
+                        if not type(title) == type(None):
+                            info = zf.filelist[-1]
+                            records.append(dict(title=title,key=name,shard=os.path.basename(self.currentPath()),
+                                                offset=info.header_offset,size=info.file_size,revid=revid,
+                                                **labelRecord(text)))
+            finally:
+                ArchiveManifest.append(self.archive_path,records)
+
+    def _flushStore(self):
+        store = openStore(self.archive_path,create=True)
+        records = []
+        try:
+            while len(self.buffer) > 0:
+                name,text,title,revid = self.buffer[0]
+                store.add(name,text)
+                self.buffer.popleft()
+                self.written += 1
+                self.bytes_written += len(text)
+                if not type(title) == type(None):
+                    records.append(dict(title=title,key=name,shard=None,offset=None,size=len(text.encode()),
+                                        revid=revid,**labelRecord(text)))
+        finally:
+            store.flush()
+            ArchiveManifest.append(self.archive_path,records)
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        self.close()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['buffer'] = deque()
+        return state
+
+
+ArticleRecord = namedtuple('ArticleRecord',['title','categories','direct_categories','paragraphs'])
+
+# path : (modification time, size), open ZipFile
+_open_archives = {}
+# handles inherited by a worker process (see _forgetArchives)
+_inherited_archives = []
+
+def _openZip(path):
+    """
+    ZipFile of a path, shared by the readers of this process. It is opened again (and the former handle closed) when
+    the file was changed since, e.g. by an ArchiveWriter or removeEntries.
+    """
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns,stat.st_size)
+    cached = _open_archives.get(path)
+    if type(cached) == type(None) or not cached[0] == version:
+        if not type(cached) == type(None):
+            cached[1].close()
+        _open_archives[path] = (version,zipfile.ZipFile(path,'r'))
+    return _open_archives[path][1]
+
+
+def _forgetArchives():
+    """
+    Initializer of the worker processes of a CorpusReader. The ZipFiles inherited from the parent process share their
+    file offsets with it, so the workers open their own. The inherited handles are kept (not closed) and not used.
+    """
+    _inherited_archives.extend(cached[1] for cached in _open_archives.values())
+    _open_archives.clear()
+
+
+def _readEntry(source,name,categories=None,match_direct=False):
+    """
+    Read one text file of an archive. If categories are given, only the two header lines are decoded for articles
+    that do not belong to any of them.
+
+    Returns:
+        tuple: inherited categories , direct categories , paragraphs (None if filtered out)
+    """
+    if isDeduplicated(source):
+        lines = openStore(source).lines(name)
+        inherited,direct = _splitLabels(lines[0]),(_splitLabels(lines[1]) if len(lines) > 1 else [])
+        if categories:
+            labels = set(inherited).union(direct) if match_direct else set(inherited)
+            if len(labels.intersection(categories)) == 0:
+                return None
+        return inherited,direct,[p for p in lines[2:] if len(p) > 0]
+    if isZipped(source):
+        fp = io.TextIOWrapper(_openZip(source).open(name),encoding='utf-8')
+    else:
+        fp = open(os.path.join(source,name),'r',encoding='utf-8')
+    with fp:
+        inherited = _splitLabels(fp.readline())
+        direct = _splitLabels(fp.readline())
+        if categories:
+            labels = set(inherited).union(direct) if match_direct else set(inherited)
+            if len(labels.intersection(categories)) == 0:
+                return None
+        paragraphs = fp.read().split('\n')
+    return inherited,direct,[p for p in paragraphs if len(p) > 0]
+
+
+def _splitLabels(line):
+    line = line.rstrip('\n')
+    return line.split(', ') if len(line) > 0 else []
+
+
+def _readEntries(source,names,categories=None,match_direct=False):
+    return [(name,_readEntry(source,name,categories,match_direct)) for name in names]
+
+
+class CorpusReader:
+    """
+    Streams the articles of a collected archive (directory, zip file, zip shards or paragraph store) one by one, so
+    that corpora of any size can be read with constant memory.
+
+    The text files only contain labels and paragraphs; titles are recovered from the md5 file names when the
+    collected titles are given (e.g. KnowledgeNet.articles). With a category filter, entries whose labels are in the
+    manifest of the archive are only read if they match.
+
+    Example:
+        for article in CorpusReader('biology_collection.zip',titles=net.articles,categories=['Genetics']):
+            print(article.title,len(article.paragraphs))
+
+    Args:
+        archive_path (str): Directory, zip file (name.zip) or paragraph store (name.wds).
+
+        titles (iterable of str / None): Article titles of the collection.
+
+        categories (list of str / None): Only yield articles with one of these (short) category names as label.
+
+        match_direct (bool): Also use the direct categories (second line) for the category filter.
+
+        workers (int): Number of processes that decompress and decode the entries.
+
+        chunk_size (int): Entries per task of a worker process.
+    """
+    def __init__(self,archive_path,titles=None,categories=None,match_direct=False,workers=1,chunk_size=64):
+        self.archive_path = archive_path
+        self.titles = {} if type(titles) == type(None) else {entryName(t):t for t in titles}
+        self.categories = set(categories) if categories else None
+        self.match_direct = match_direct
+        self.workers = workers
+        self.chunk_size = chunk_size
+
+    def _labels(self):
+        """
+        File name : set of labels used by the category filter, for the manifest records with labels.
+        """
+        labels = {}
+        for record in ArchiveManifest(self.archive_path).entries.values():
+            if 'categories' in record:
+                labels[record['key']] = set(record['categories']).union(record['direct'] if self.match_direct else [])
+        return labels
+
+    def _selected(self):
+        """
+        (source, file name) pairs that are read: all entries without a category filter, otherwise the entries that
+        match it or have no labels in the manifest.
+        """
+        if not self.categories:
+            yield from self.entries()
+            return
+        labels = self._labels()
+        for source,name in self.entries():
+            if not name in labels or not labels[name].isdisjoint(self.categories):
+                yield source,name
+
+    def entries(self):
+        """
+        All (source, file name) pairs of the archive.
+        """
+        if isDeduplicated(self.archive_path):
+            for name in openStore(self.archive_path).names():
+                yield self.archive_path,name
+            return
+        if not isZipped(self.archive_path):
+            for entry in os.scandir(self.archive_path):
+                if entry.name.endswith('.txt'):
+                    yield self.archive_path,entry.name
+            return
+        for path in archiveFiles(self.archive_path):
+            for name in _openZip(path).namelist():
+                yield path,name
+
+    def __len__(self):
+        return sum(1 for _ in self.entries())
+
+    def _chunks(self):
+        source,names = None,[]
+        for path,name in self._selected():
+            if (not path == source or len(names) >= self.chunk_size) and len(names) > 0:
+                yield source,names
+                names = []
+            source = path
+            names.append(name)
+        if len(names) > 0:
+            yield source,names
+
+    def _record(self,name,entry):
+        if type(entry) == type(None):
+            return None
+        return ArticleRecord(self.titles.get(name),*entry)
+
+    def __iter__(self):
+        if self.workers <= 1:
+            for source,name in self._selected():
+                record = self._record(name,_readEntry(source,name,self.categories,self.match_direct))
+                if not type(record) == type(None):
+                    yield record
+            return
+
+        pending = deque()
+        with multiprocessing.Pool(self.workers,initializer=_forgetArchives) as pool:
+            for source,names in self._chunks():
+                pending.append(pool.apply_async(_readEntries,(source,names,self.categories,self.match_direct)))
+                while len(pending) >= 2*self.workers:
+                    yield from self._collectChunk(pending.popleft())
+            while len(pending) > 0:
+                yield from self._collectChunk(pending.popleft())
+
+    def _collectChunk(self,task):
+        for name,entry in task.get():
+            record = self._record(name,entry)
+            if not type(record) == type(None):
+                yield record
@@ -0,0 +1,452 @@
+import os
+import json
+import mmap
+import zlib
+import shutil
+import hashlib
+from array import array
+from bisect import bisect_right
+from threading import Lock
+from collections import Counter,OrderedDict
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+STORE_SUFFIX = '.wds'
+ZLIB_DICT_SIZE = 32768
+
+
+def isDeduplicated(archive_path):
+    return archive_path.rstrip('/\\').endswith(STORE_SUFFIX)
+
+
+def paragraphKey(paragraph):
+    return hashlib.blake2b(paragraph.encode(),digest_size=16).digest()
+
+
+def trainDictionary(samples,codec,size):
+    """
+    Compression dictionary from sample paragraphs. zstd trains a dictionary with zstandard, zlib gets a preset
+    dictionary of the most frequent words and word pairs (the most valuable at the end, where deflate finds them
+    with the shortest distances).
+
+    Args:
+        samples (list of str): Paragraphs.
+
+        codec (str): 'zstd' or 'zlib'.
+
+        size (int): Maximal size of the dictionary in bytes.
+
+    Returns:
+        bytes / None: None if the samples are too few
+    """
+    if codec == 'zstd':
+        try:
+            return zstandard.train_dictionary(size,[s.encode() for s in samples]).as_bytes()
+        except zstandard.ZstdError:
+            return None
+    counts = Counter()
+    for sample in samples:
+        words = sample.split(' ')
+        counts.update(words)
+        counts.update(' '.join(pair) for pair in zip(words,words[1:]))
+    scored = sorted(((n*len(w),w) for w,n in counts.items() if n > 1 and len(w) > 3),reverse=True)
+    chosen,total = [],0
+    for _,word in scored:
+        total += len(word.encode())+1
+        if total > min(size,ZLIB_DICT_SIZE):
+            break
+        chosen.append(word)
+    if len(chosen) == 0:
+        return None
+    return ' '.join(reversed(chosen)).encode()
+
+
+class Codec:
+    """
+    Compression of the blocks with zstd (if the zstandard package is installed) or zlib, optionally with a dictionary.
+    """
+    def __init__(self,codec,level,dictionary=None):
+        if codec == 'zstd' and type(zstandard) == type(None):
+            raise Exception('The store is compressed with zstd, install the zstandard package to read it!')
+        self.codec = codec
+        self.level = level
+        self.dictionary = dictionary
+        if codec == 'zstd':
+            dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+            self.compressor = zstandard.ZstdCompressor(level=level,dict_data=dict_data)
+            self.decompressor = zstandard.ZstdDecompressor(dict_data=dict_data)
+
+    def compress(self,data):
+        if self.codec == 'zstd':
+            return self.compressor.compress(data)
+        compressor = zlib.compressobj(self.level,zlib.DEFLATED,-15,zdict=self.dictionary) if self.dictionary \
+                     else zlib.compressobj(self.level,zlib.DEFLATED,-15)
+        return compressor.compress(data)+compressor.flush()
+
+    def decompress(self,data):
+        if self.codec == 'zstd':
+            return self.decompressor.decompress(data)
+        decompressor = zlib.decompressobj(-15,zdict=self.dictionary) if self.dictionary else zlib.decompressobj(-15)
+        return decompressor.decompress(data)+decompressor.flush()
+
+
+class ParagraphStore:
+    """
+    Text archive that stores every distinct paragraph once. Paragraphs (all lines of an article including the two
+    label lines) are keyed by their blake2b hash and appended to blocks of about block_size bytes, which are
+    compressed together with zstd (if the zstandard package is installed) or zlib. Once train_bytes of new paragraphs
+    were collected, a dictionary is trained on them and used for all later blocks, so that short texts and small
+    blocks still compress well. An article is the list of its paragraph ids, so reading one article only
+    decompresses the few blocks it refers to (the latest cache_blocks blocks are kept decompressed).
+
+    Files in the directory of the store (name.wds):
+        store.json       codec and settings
+        dict-N.bin       compression dictionaries
+        blocks.dat       compressed blocks
+        blocks.idx       one line "offset length first_id count dictionary" per block
+        paragraphs.idx   16 byte hashes of all stored paragraphs in the order of their ids
+        articles.dat     paragraph ids of the articles (unsigned 32 bit)
+        articles.idx     one line "offset count name" per article, count -1 marks a removed article
+
+    New paragraphs and articles are kept in memory until flush(). Removed articles leave their paragraphs in the
+    blocks until compact() rewrites the store.
+
+    Args:
+        path (str): Directory of the store.
+
+        create (bool): Create the store if it does not exist.
+
+        codec (str / None): 'zstd' or 'zlib' for a new store, default is zstd if available.
+
+        level (int / None): Compression level (default 9 for zlib and 12 for zstd).
+
+        block_size (int): Uncompressed bytes per block.
+
+        train_bytes (int): Bytes of new paragraphs used to train the dictionary, 0 disables dictionaries.
+
+        dict_size (int): Maximal size of the dictionary in bytes.
+
+        cache_blocks (int): Number of decompressed blocks kept in memory.
+    """
+    def __init__(self,path,create=False,codec=None,level=None,block_size=1<<16,train_bytes=1<<20,dict_size=1<<16,
+                 cache_blocks=32):
+        self.path = path.rstrip('/\\')
+        self.cache_blocks = cache_blocks
+        self._lock = Lock()
+        settings_path = os.path.join(self.path,'store.json')
+        if not os.path.exists(settings_path):
+            if not create:
+                raise FileNotFoundError(f'No paragraph store at {path}!')
+            if type(codec) == type(None):
+                codec = 'zlib' if type(zstandard) == type(None) else 'zstd'
+            if type(level) == type(None):
+                level = 12 if codec == 'zstd' else 9
+            os.makedirs(self.path,exist_ok=True)
+            with open(settings_path,'w',encoding='utf-8') as fp:
+                json.dump({'codec':codec,'level':level,'block_size':block_size,'train_bytes':train_bytes,
+                           'dict_size':dict_size},fp)
+        with open(settings_path,'r',encoding='utf-8') as fp:
+            self.settings = json.load(fp)
+        self.open()
+
+    def _file(self,name):
+        return os.path.join(self.path,name)
+
+    def open(self):
+        """
+        Load the indices. Blocks and articles that were only partially written (e.g. by a crash during a flush) are
+        ignored.
+        """
+        self.codecs = {0:Codec(self.settings['codec'],self.settings['level'])}
+        for name in os.listdir(self.path):
+            if name.startswith('dict-') and name.endswith('.bin'):
+                with open(self._file(name),'rb') as fp:
+                    self.codecs[int(name[5:-4])] = Codec(self.settings['codec'],self.settings['level'],fp.read())
+        self.dictionary = max(self.codecs)
+
+        hashes = b''
+        if os.path.exists(self._file('paragraphs.idx')):
+            with open(self._file('paragraphs.idx'),'rb') as fp:
+                hashes = fp.read()
+        self.block_offsets,self.block_lengths = array('q'),array('q')
+        self.block_firsts,self.block_dicts = array('q'),array('q')
+        self.size = 0
+        self.count = 0
+        self.block_index_size = 0
+        if os.path.exists(self._file('blocks.idx')):
+            with open(self._file('blocks.idx'),'rb') as fp:
+                for line in fp:
+                    if not line.endswith(b'\n'):
+                        break
+                    offset,length,first,count,dictionary = map(int,line.split(b'\t'))
+                    if first+count > len(hashes)//16:
+                        break
+                    self.block_offsets.append(offset)
+                    self.block_lengths.append(length)
+                    self.block_firsts.append(first)
+                    self.block_dicts.append(dictionary)
+                    self.size = offset+length
+                    self.count = first+count
+                    self.block_index_size += len(line)
+        self.keys = {hashes[16*i:16*i+16]:i for i in range(self.count)}
+
+        self.articles = {}
+        self.article_size = 0
+        self.index_size = 0
+        if os.path.exists(self._file('articles.idx')):
+            with open(self._file('articles.idx'),'rb') as fp:
+                for line in fp:
+                    if not line.endswith(b'\n'):
+                        break
+                    offset,count,name = line.decode('utf-8').rstrip('\n').split('\t',2)
+                    if int(count) < 0:
+                        self.articles.pop(name,None)
+                    else:
+                        self.articles[name] = (int(offset),int(count))
+                        self.article_size = int(offset)+4*int(count)
+                    self.index_size += len(line)
+
+        self.pending = []
+        self.pending_bytes = 0
+        self.pending_articles = OrderedDict()
+        self.samples = []
+        self.sample_bytes = 0
+        self.cache = OrderedDict()
+        self.map = None
+        self.article_map = None
+
+    def __len__(self):
+        return len(set(self.articles).union(self.pending_articles))
+
+    def __contains__(self,name):
+        return name in self.pending_articles or name in self.articles
+
+    def names(self):
+        return [name for name in self.articles if not name in self.pending_articles]+list(self.pending_articles)
+
+    def add(self,name,text):
+        """
+        Add (or replace) the text of an article, one paragraph per line.
+        """
+        with self._lock:
+            ids = array('I')
+            for paragraph in text.split('\n'):
+                key = paragraphKey(paragraph)
+                if not key in self.keys:
+                    self.keys[key] = self.count+len(self.pending)
+                    self.pending.append((key,paragraph))
+                    self.pending_bytes += len(paragraph.encode())+1
+                    self._sample(paragraph)
+                    if self.pending_bytes >= self.settings['block_size']:
+                        self._writeBlock()
+                ids.append(self.keys[key])
+            self.pending_articles[name] = ids
+
+    def _sample(self,paragraph):
+        if self.settings['train_bytes'] and self.dictionary == 0:
+            self.samples.append(paragraph)
+            self.sample_bytes += len(paragraph)
+            if self.sample_bytes >= self.settings['train_bytes']:
+                dictionary = trainDictionary(self.samples,self.settings['codec'],self.settings['dict_size'])
+                self.samples = []
+                self.sample_bytes = 0
+                if dictionary:
+                    with open(self._file('dict-1.bin'),'wb') as fp:
+                        fp.write(dictionary)
+                    self.codecs[1] = Codec(self.settings['codec'],self.settings['level'],dictionary)
+                    self.dictionary = 1
+
+    def _append(self,name,valid,data):
+        """
+        Append data to a file after its first valid bytes (drops what a crash left after them).
+        """
+        with open(self._file(name),'ab') as fp:
+            fp.truncate(valid)
+            fp.write(data)
+        return valid+len(data)
+
+    def _writeBlock(self):
+        if len(self.pending) == 0:
+            return
+        data = self.codecs[self.dictionary].compress('\n'.join(p for _,p in self.pending).encode())
+        self._append('blocks.dat',self.size,data)
+        self._append('paragraphs.idx',16*self.count,b''.join(key for key,_ in self.pending))
+        line = '%d\t%d\t%d\t%d\t%d\n'%(self.size,len(data),self.count,len(self.pending),self.dictionary)
+        self.block_index_size = self._append('blocks.idx',self.block_index_size,line.encode())
+        self.block_offsets.append(self.size)
+        self.block_lengths.append(len(data))
+        self.block_firsts.append(self.count)
+        self.block_dicts.append(self.dictionary)
+        self.size += len(data)
+        self.count += len(self.pending)
+        self.pending = []
+        self.pending_bytes = 0
+
+    def flush(self):
+        """
+        Write the pending paragraphs as a block and the pending articles to the files.
+        """
+        with self._lock:
+            self._writeBlock()
+            if len(self.pending_articles) == 0:
+                return
+            lines,offset = [],self.article_size
+            for name,ids in self.pending_articles.items():
+                lines.append('%d\t%d\t%s\n'%(offset,len(ids),name))
+                offset += 4*len(ids)
+            self.article_size = self._append('articles.dat',self.article_size,
+                                             b''.join(ids.tobytes() for ids in self.pending_articles.values()))
+            self.index_size = self._append('articles.idx',self.index_size,''.join(lines).encode())
+            for line in lines:
+                offset,count,name = line.rstrip('\n').split('\t',2)
+                self.articles[name] = (int(offset),int(count))
+            self.pending_articles = OrderedDict()
+
+    def remove(self,names):
+        """
+        Remove articles (their paragraphs stay in the blocks until compact()).
+        """
+        self.flush()
+        with self._lock:
+            names = [name for name in names if name in self.articles]
+            if len(names) == 0:
+                return
+            self.index_size = self._append('articles.idx',self.index_size,
+                                           ''.join('-1\t-1\t%s\n'%name for name in names).encode())
+            for name in names:
+                del self.articles[name]
+
+    def changed(self):
+        """
+        True if another process appended articles since the indices were loaded.
+        """
+        path = self._file('articles.idx')
+        return os.path.exists(path) and not os.path.getsize(path) == self.index_size
+
+    def _map(self,name,current,size):
+        if not type(current) == type(None) and len(current) >= size:
+            return current
+        if not type(current) == type(None) and not type(current) == bytes:
+            current.close()
+        if size == 0:
+            return b''
+        fd = os.open(self._file(name),os.O_RDONLY)
+        try:
+            return mmap.mmap(fd,0,access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+
+    def _block(self,block):
+        if block in self.cache:
+            self.cache.move_to_end(block)
+            return self.cache[block]
+        self.map = self._map('blocks.dat',self.map,self.size)
+        offset,length = self.block_offsets[block],self.block_lengths[block]
+        paragraphs = self.codecs[self.block_dicts[block]].decompress(self.map[offset:offset+length]).decode().split('\n')
+        self.cache[block] = paragraphs
+        if len(self.cache) > self.cache_blocks:
+            self.cache.popitem(last=False)
+        return paragraphs
+
+    def paragraph(self,i):
+        if i >= self.count:
+            return self.pending[i-self.count][1]
+        block = bisect_right(self.block_firsts,i)-1
+        return self._block(block)[i-self.block_firsts[block]]
+
+    def ids(self,name):
+        if name in self.pending_articles:
+            return self.pending_articles[name]
+        offset,count = self.articles[name]
+        self.article_map = self._map('articles.dat',self.article_map,self.article_size)
+        ids = array('I')
+        ids.frombytes(self.article_map[offset:offset+4*count])
+        return ids
+
+    def lines(self,name):
+        """
+        Returns:
+            list of str: all lines of an article
+        """
+        with self._lock:
+            return [self.paragraph(i) for i in self.ids(name)]
+
+    def get(self,name):
+        """
+        Returns:
+            str: text of an article as it was added
+        """
+        return '\n'.join(self.lines(name))
+
+    def compact(self):
+        """
+        Rewrite the store with only the paragraphs of the current articles.
+        """
+        self.flush()
+        compacted = ParagraphStore(self.path+'.tmp',create=True,**{k:v for k,v in self.settings.items()})
+        for name in self.names():
+            compacted.add(name,self.get(name))
+        compacted.close()
+        self.close()
+        shutil.rmtree(self.path)
+        os.replace(self.path+'.tmp',self.path)
+        with open(os.path.join(self.path,'store.json'),'r',encoding='utf-8') as fp:
+            self.settings = json.load(fp)
+        self.open()
+
+    def stats(self):
+        """
+        Returns:
+            dict: number of articles, paragraph references and distinct paragraphs, bytes on disk
+        """
+        self.flush()
+        references = sum(count for _,count in self.articles.values())
+        disk = sum(os.path.getsize(self._file(name)) for name in os.listdir(self.path))
+        return {'articles':len(self.articles),'references':references,'paragraphs':self.count,'blocks':len(self.block_firsts),
+                'dictionary':self.dictionary > 0,'codec':self.settings['codec'],'bytes':disk}
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            for current in [self.map,self.article_map]:
+                if not type(current) == type(None) and not type(current) == bytes:
+                    current.close()
+            self.map = None
+            self.article_map = None
+            self.cache = OrderedDict()
+
+    def __getstate__(self):
+        self.flush()
+        return {'path':self.path,'cache_blocks':self.cache_blocks}
+
+    def __setstate__(self,state):
+        self.__init__(state['path'],cache_blocks=state['cache_blocks'])
+
+    def __repr__(self):
+        return 'ParagraphStore(%s, %d articles, %d paragraphs)'%(self.path,len(self),self.count+len(self.pending))
+
+
+_open_stores = {}
+
+def openStore(path,create=False):
+    """
+    Shared ParagraphStore of a path in this process. It is loaded again when another process appended articles.
+    """
+    path = path.rstrip('/\\')
+    store = _open_stores.get(path)
+    if type(store) == type(None) or (len(store.pending_articles) == 0 and store.changed()):
+        if not type(store) == type(None):
+            store.close()
+        store = ParagraphStore(path,create=create)
+        _open_stores[path] = store
+    return store
+
+
+def closeStore(path):
+    store = _open_stores.pop(path.rstrip('/\\'),None)
+    if not type(store) == type(None):
+        store.close()
@@ -0,0 +1,158 @@
+"""
+Run crawl jobs without a notebook, e.g. on a server. The state of the net is loaded from and saved to a file
+(.pkl or an incremental .db state store), so the commands can be chained:
+
+    python WikiCli.py scan net.db --root "Category:Physics" --depth 3 --batched --workers 8
+    python WikiCli.py deeper net.db --levels 1
+    python WikiCli.py collect net.db --archive texts --zipped --text --save-interval 500
+    python WikiCli.py update net.db --since 2024-01-31T00:00:00Z
+    python WikiCli.py protocol net.db
+
+In distributed mode the net is the coordinator that hands out tasks through a queue (sqlite file or directory) and
+any number of workers on other hosts fetch them:
+
+    python WikiCli.py collect net.db --queue /shared/queue --text --archive texts --zipped
+    python WikiCli.py work /shared/queue --batched --idle-timeout 600
+"""
+import os
+import sys
+import logging
+import argparse
+from WikiCrawler import KnowledgeNet
+
+
+def openNet(args):
+    """
+    Load the net from the state file or create a new one, and configure it from the common arguments.
+    """
+    if args.command == 'work':
+        net = KnowledgeNet(args.language)
+    elif os.path.exists(args.state):
+        net = KnowledgeNet.load(args.state)
+        net.save_path = args.state
+    else:
+        net = KnowledgeNet(args.language)
+        net.save_path = args.state
+    net.setDisplay(args.display,interval=args.interval,log_size=args.log_size)
+    if args.batched or args.api_url:
+        net.setBackend(True,api_url=args.api_url)
+    if args.cache:
+        net.setCache(args.cache)
+    if args.workers or args.max_rps:
+        net.setConcurrency(args.workers if args.workers else net.workers,max_rps=args.max_rps)
+    if args.metrics or args.prometheus:
+        net.setMetrics(args.metrics,args.prometheus)
+    if args.queue:
+        net.setQueue(args.queue,task_size=args.task_size,lease_seconds=args.lease_seconds)
+    return net
+
+
+def scan(net,args):
+    for root in args.root:
+        net.startScan(root,depth=args.depth,skip_rules=args.skip_rule,verbose=args.verbose)
+
+
+def deeper(net,args):
+    for _ in range(args.levels):
+        if net.crawlDeeper(skip_rules=args.skip_rule,verbose=args.verbose) == 0:
+            break
+    net.indexInfo()
+
+
+def collect(net,args):
+    net.collect(links=not args.no_links,text=args.text,archive_path=args.archive,zipped=args.zipped,
+                save_interval=args.save_interval,limit=args.limit,verbose=args.verbose,
+                shard_articles=args.shard_articles,shard_mb=args.shard_mb,deduplicated=args.deduplicated)
+
+
+def update(net,args):
+    net.updateCollection(links=not args.no_links,text=args.text,since=args.since,verbose=args.verbose)
+
+
+def protocol(net,args):
+    net.printProtocol(level=args.verbose)
+
+
+def work(net,args):
+    net.work(worker=args.worker,idle_timeout=args.idle_timeout,max_tasks=args.max_tasks)
+
+
+def parser():
+    settings = argparse.ArgumentParser(add_help=False)
+    settings.add_argument('--language',default='en')
+    settings.add_argument('--batched',action='store_true',help='use the batched api backend')
+    settings.add_argument('--api-url',default=None,help='api.php of the wiki (implies --batched)')
+    settings.add_argument('--cache',default=None,help='sqlite response cache')
+    settings.add_argument('--workers',type=int,default=None)
+    settings.add_argument('--max-rps',type=float,default=None,help='maximal requests per second')
+    settings.add_argument('--verbose',type=int,default=1,help='show log messages below this level')
+    settings.add_argument('--display',default='console',choices=['console','logging','none'])
+    settings.add_argument('--interval',type=float,default=None,help='seconds between two progress messages')
+    settings.add_argument('--log-size',type=int,default=10000,help='log messages kept in the state')
+    settings.add_argument('--log-file',default=None,help='write the messages to this file (implies --display logging)')
+    settings.add_argument('--metrics',default=None,help='append metrics as json lines to this file')
+    settings.add_argument('--prometheus',default=None,help='keep the latest metrics in this .prom file')
+    settings.add_argument('--task-size',type=int,default=50,help='categories or articles per task of the queue')
+    settings.add_argument('--lease-seconds',type=float,default=600,help='time for a task before it is handed out again')
+
+    common = argparse.ArgumentParser(add_help=False,parents=[settings])
+    common.add_argument('state',help='state file of the net (.pkl or .db), created by scan if it does not exist')
+    common.add_argument('--queue',default=None,help='distribute the tasks through this queue (.db file or directory)')
+    common.add_argument('--skip-rule',action='append',default=[],help='regular expression of skipped categories')
+
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = arg_parser.add_subparsers(dest='command',required=True)
+    command = commands.add_parser('scan',parents=[common],help='crawl the categories below roots')
+    command.add_argument('--root',action='append',required=True)
+    command.add_argument('--depth',type=int,default=3)
+    command.set_defaults(run=scan)
+    command = commands.add_parser('deeper',parents=[common],help='crawl more levels of open categories')
+    command.add_argument('--levels',type=int,default=1)
+    command.set_defaults(run=deeper)
+    for name,run in [('collect',collect),('update',update)]:
+        command = commands.add_parser(name,parents=[common],help='%s links and texts of the articles'%name)
+        command.add_argument('--text',action='store_true')
+        command.add_argument('--no-links',action='store_true')
+        command.set_defaults(run=run)
+        if name == 'collect':
+            command.add_argument('--archive',default=None,help='folder or zip archive (with --zipped) of the texts')
+            command.add_argument('--zipped',action='store_true')
+            command.add_argument('--deduplicated',action='store_true',help='paragraph store (.wds) with block compression')
+            command.add_argument('--limit',type=int,default=None)
+            command.add_argument('--save-interval',type=int,default=None,help='save the state every n articles')
+            command.add_argument('--shard-articles',type=int,default=None)
+            command.add_argument('--shard-mb',type=float,default=None)
+        else:
+            command.add_argument('--since',default=None,help='UTC timestamp of the last update')
+    command = commands.add_parser('protocol',parents=[common],help='print the log and metrics of the net')
+    command.set_defaults(run=protocol)
+    command = commands.add_parser('work',parents=[settings],help='work on the tasks of a distributed crawl')
+    command.add_argument('queue',help='queue of the coordinator (.db file or directory)')
+    command.add_argument('--worker',default=None,help='name of the worker (default: host and process id)')
+    command.add_argument('--idle-timeout',type=float,default=None,help='stop after this many seconds without tasks')
+    command.add_argument('--max-tasks',type=int,default=None)
+    command.set_defaults(run=work)
+    return arg_parser
+
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    if args.log_file:
+        args.display = 'logging'
+    if args.display == 'logging':
+        logging.basicConfig(filename=args.log_file,level=max(logging.DEBUG,logging.INFO-5*(args.verbose-1)),
+                            format='%(asctime)s %(levelname)s %(message)s')
+    if args.command in ['deeper','collect','update','protocol'] and not os.path.exists(args.state):
+        print(f'State file {args.state} does not exist, start with scan.',file=sys.stderr)
+        return 1
+    net = openNet(args)
+    try:
+        args.run(net,args)
+    finally:
+        if not args.command in ['protocol','work']:
+            net.save(args.state,overwrite=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""
+wikipediaapi clients of the KnowledgeNet. Imported on first use of the wikipediaapi backend, so that wikipediaapi is
+not loaded by jobs that use the batched api or only read collected data.
+
+The clients replace Wikipedia._query, the method of wikipediaapi that sends the api requests. It is private, so the
+versions of wikipediaapi are limited to the ones where it has the expected signature (see _checkVersion).
+"""
+import inspect
+import wikipediaapi as wiki
+from WikiApi import RequestScheduler,canonicalQuery
+
+# versions of wikipediaapi whose Wikipedia._query(page,params) is replaced by the clients: first, first not supported
+SUPPORTED_VERSIONS = ((0,5,0),(0,7,0))
+
+
+def _checkVersion():
+    version = getattr(wiki,'__version__',())
+    if type(version) == str:
+        version = tuple(int(v) for v in version.split('.') if v.isdigit())
+    query = getattr(wiki.Wikipedia,'_query',None)
+    if type(query) == type(None) or not list(inspect.signature(query).parameters)[:3] == ['self','page','params'] \
+       or not SUPPORTED_VERSIONS[0] <= version < SUPPORTED_VERSIONS[1]:
+        raise ImportError('wikipediaapi %s is not supported by the wikipediaapi backend (supported: >=%s, <%s), '
+                          'use the batched backend (KnowledgeNet.setBackend) or install a supported version'
+                          %('.'.join(str(v) for v in version),'.'.join(str(v) for v in SUPPORTED_VERSIONS[0]),
+                            '.'.join(str(v) for v in SUPPORTED_VERSIONS[1])))
+
+_checkVersion()
+
+
+class ScheduledWikipedia(wiki.Wikipedia):
+    """
+    wikipediaapi client that sends its requests through a RequestScheduler (rate limit, retries with backoff) and
+    keeps its http session on errors. The requests use the session of the scheduler, which is shared by all clients;
+    the own session of wikipediaapi is left unused, so that deleting a client (which closes it) does not close the
+    shared session.
+
+    Args:
+        language (str): Language edition.
+
+        scheduler (RequestScheduler / None): Scheduler of the requests.
+
+        api_url (str / None): Url of api.php (e.g. of a local MockWikiServer), default is Wikipedia.
+
+        timeout (float): Seconds until a request is retried.
+    """
+    def __init__(self,language,scheduler=None,api_url=None,timeout=10,**kwargs):
+        super().__init__(language,**kwargs)
+        self.scheduler = scheduler if not type(scheduler) == type(None) else RequestScheduler()
+        self.api_url = api_url
+        self.timeout = timeout
+
+    def _query(self,page,params):
+        params = dict(params,format='json',redirects=1)
+        url = self.api_url if self.api_url else 'https://%s.wikipedia.org/w/api.php'%page.language
+        response = self.scheduler.request(self.scheduler.session(),url,params,timeout=self.timeout,
+                                          label=params.get('prop',params.get('list','')))
+        return response.json()
+
+
+class CachedWikipedia(ScheduledWikipedia):
+    """
+    wikipediaapi client that answers repeated queries from a ResponseCache (keyed by language, title and query).
+    """
+    def __init__(self,language,cache,scheduler=None,**kwargs):
+        super().__init__(language,scheduler,**kwargs)
+        self.cache = cache
+
+    def _query(self,page,params):
+        key = canonicalQuery({k:v for k,v in params.items() if not k in ['titles','cmtitle']})
+        cached = self.cache.get(self.language,page.title,key)
+        if not type(cached) == type(None):
+            return cached
+        result = super()._query(page,params)
+        self.cache.put(self.language,page.title,key,result)
+        return result
@@ -1,25 +1,40 @@
-from IPython.display import clear_output
-import wikipediaapi as wiki
 import re
-import numpy as np
-import matplotlib.pyplot as plt
-from sys import getsizeof
-from time import time,sleep
-import dill as pkl
+import math
+from time import time,sleep,strftime,gmtime
 import os
-import shutil
-#from zipfile import ZipFile
-import zipfile
+import json
 import hashlib
+from threading import Lock,Thread,Event
+from queue import Queue,Full
+from WikiApi import MediaWikiApi,ResponseCache,RequestScheduler,RequestFailed,RECENT_CHANGES_DAYS
+from WikiArchive import ArchiveWriter,ArchiveManifest,CorpusReader,entryName,removeEntries,deleteArchive
+from WikiBlocks import STORE_SUFFIX
+from WikiText import extractParagraphs,DEFAULT_SKIP_SECTIONS
+from WikiStore import StateStore,StoredDict,StoredLog,MappedStore,isStateStore
+from WikiMetrics import Metrics,JsonLinesSink,PrometheusSink,timed
+from WikiLog import LogBuffer,createDisplay
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
 class DynamicClass:
+    # large dicts and the log that a state store saves entry by entry (see save)
+    stored_maps = ()
+    # stored maps whose values are all kept in memory once they are read (maps that are read as a whole)
+    cached_maps = ()
+    stored_log = None
+    # variables of the running process that are not saved
+    transient = ()
             
     def __init__(self):
         self.save_path = ''
+        self.state_store = None
     
-    @staticmethod
-    def load(file_name,verbose=False):
-        dummy = KnowledgeNet(None)#,language=None)
+    @classmethod
+    def load(cls,file_name,verbose=False):
+        if isStateStore(file_name):
+            return cls.loadStore(file_name,verbose=verbose)
+        import dill as pkl
+        dummy = (KnowledgeNet if cls == DynamicClass else cls)(None)#,language=None)
         loaded_variables = 0
         with open(file_name,'br') as fp:
             saved_variables = pkl.load(fp)
@@ -34,18 +49,58 @@ class DynamicClass:
             except:
                 print('cannot find the variables %s'%(', '.join(saved_variables[loaded_variables:])))
 
+        dummy.afterLoad()
         print('Loaded %d member variables from %s'%(len(saved_variables),file_name))
         return dummy
     
+    @classmethod
+    def loadStore(cls,file_name,verbose=False):
+        """
+        Load from a sqlite state store. The stored maps are opened lazily: only their keys are read, values are read
+        when they are accessed.
+        """
+        dummy = (KnowledgeNet if cls == DynamicClass else cls)(None)
+        store = StateStore(file_name)
+        names,maps = store.variables()
+        for name in names:
+            setattr(dummy,name,store.loadVariable(name))
+            if verbose:
+                print(f'  -{name}')
+        for name in maps:
+            setattr(dummy,name,StoredDict(store,name,cache_size=dummy._cacheSize(name)))
+        if dummy.stored_log:
+            setattr(dummy,dummy.stored_log,StoredLog(store))
+        dummy.state_store = store
+        dummy.save_path = file_name
+        dummy.afterLoad()
+        print('Loaded %d member variables and %d maps from %s'%(len(names),len(maps),file_name))
+        return dummy
+
+    def saveVariables(self):
+        no_save = ["<class 'function'>","<class 'method'>"]
+        return [child for child in dir(self)
+                if not re.match('^__.*__$',child) and not str(type(getattr(self,child))) in no_save
+                and not child in ['stored_maps','cached_maps','stored_log','state_store','transient']+list(self.transient)]
+
+    def _cacheSize(self,name):
+        return None if name in self.cached_maps else 1024
+
     def save(self,file_name,overwrite=False):
+        """
+        Save all member variables. Files ending with .db or .sqlite are incremental state stores: saving again to the
+        same store only writes the entries of the stored maps that changed and the variables whose value changed.
+        A dill file is migrated by loading it and saving it to a store, e.g.
+        KnowledgeNet.load('net.pkl').save('net.db').
+        """
+        if file_name.endswith(('.db','.sqlite')):
+            return self.saveStore(file_name,overwrite=overwrite)
+        import dill as pkl
         exists = os.path.exists(file_name)
         if exists and not overwrite:
             raise Exception(f'File {file_name} already exists!')
         
         self.save_path = file_name
-        no_save = ["<class 'function'>","<class 'method'>"]
-        save_variables = [child for child in dir(self)
-                  if not re.match('^__.*__$',child) and not str(type(getattr(self,child))) in no_save]
+        save_variables = self.saveVariables()
         
         with open(file_name,'bw') as fp:
             pkl.dump(save_variables,fp)
@@ -53,59 +108,586 @@ class DynamicClass:
                 pkl.dump(getattr(self,var),fp)
                 
         print('Saved %d member variables to %s'%(len(save_variables),file_name))
+
+    def saveStore(self,file_name,overwrite=False):
+        """
+        Save to a sqlite state store (see save).
+        """
+        store = self.state_store
+        if type(store) == type(None) or not os.path.abspath(store.path) == os.path.abspath(file_name):
+            if os.path.exists(file_name):
+                if not overwrite:
+                    raise Exception(f'File {file_name} already exists!')
+                for path in [file_name,file_name+'-wal',file_name+'-shm']:
+                    if os.path.exists(path):
+                        os.remove(path)
+            store = StateStore(file_name)
+
+        changes = 0
+        # maps in memory-mapped files (see setStorage) are saved as references like other variables, a map is saved
+        # either way and the rows of the other way are removed, so that loading does not restore an outdated copy
+        stored_maps = [name for name in self.stored_maps if not isinstance(getattr(self,name),MappedStore)]
+        for name in self.stored_maps:
+            if not name in stored_maps:
+                store.removeMap(name)
+        for name in stored_maps:
+            value = getattr(self,name)
+            if isinstance(value,StoredDict) and value.store is store:
+                changes += value.commit()
+            else:
+                store.removeVariable(name)
+                setattr(self,name,StoredDict.create(store,name,value.items(),cache_size=self._cacheSize(name)))
+                changes += len(value)
+        if self.stored_log:
+            value = getattr(self,self.stored_log)
+            if isinstance(value,StoredLog) and value.store is store:
+                changes += value.commit()
+            else:
+                setattr(self,self.stored_log,StoredLog.create(store,value,getattr(value,'capacity',None)))
+                changes += len(value)
+
+        self.state_store = store
+        self.save_path = file_name
+        save_variables = [var for var in self.saveVariables() if not var in stored_maps and not var == self.stored_log]
+        written = store.writeVariables({var:getattr(self,var) for var in save_variables})
+        store.compact()
+        print('Saved %d of %d member variables and %d map entries to %s'%(written,len(save_variables),changes,file_name))
+    
+    def afterLoad(self):
+        """
+        Hook to convert variables of older versions after loading.
+        """
+        pass
     
     def update(self):
         class_name = self.__class__.__qualname__
         new = eval(f'{class_name}()')
-        no_save = ["<class 'function'>","<class 'method'>"]
-        save_variables = [child for child in dir(self)
-                  if not re.match('^__.*__$',child) and not str(type(getattr(self,child))) in no_save]
-        for var in save_variables:
+        for var in self.saveVariables():
             setattr(new,var,getattr(self,var))
         return new
 
 
+class RuleSet:
+    """
+    Regular expressions (applied with re.match) compiled once into a combined pattern. The combined pattern rejects
+    non-matching categories in one pass; only on a hit the single rules are evaluated to report which rules matched.
+    Verdicts are cached per category, since the same categories occur in many articles.
+    """
+    def __init__(self,rules):
+        self.rules = list(rules)
+        self.compiled = [re.compile(rule) for rule in self.rules]
+        try:
+            self.combined = re.compile('|'.join('(?:%s)'%rule for rule in self.rules)) if len(self.rules) > 0 else None
+        except re.error:
+            self.combined = None
+        self.verdicts = {}
+
+    def matches(self,cat):
+        """
+        Rules that match the category (in the order of the rules).
+
+        Returns:
+            tuple of str
+        """
+        if not cat in self.verdicts:
+            if len(self.rules) == 0 or (self.combined and not self.combined.match(cat)):
+                self.verdicts[cat] = ()
+            else:
+                self.verdicts[cat] = tuple(rule for rule,pattern in zip(self.rules,self.compiled) if pattern.match(cat))
+        return self.verdicts[cat]
+
+
+@lru_cache(maxsize=32)
+def ruleSet(rules):
+    """
+    Shared RuleSet for a tuple of rules.
+    """
+    return RuleSet(rules)
+
+
+class OpenCategories(dict):
+    """
+    Categories that are not yet crawled (category : level) with an index of the categories on each level,
+    so that crawlDeeper does not need to scan all open categories for every level. The version is counted up on every
+    change, so that a state store only saves it again when it changed (see StateStore.writeVariables).
+    """
+    def __init__(self,categories={}):
+        super().__init__()
+        self.levels = {}
+        self.version = 0
+        for cat,lvl in categories.items():
+            self[cat] = lvl
+
+    def __setitem__(self,cat,lvl):
+        if cat in self:
+            del self[cat]
+        super().__setitem__(cat,lvl)
+        self.levels.setdefault(lvl,{})[cat] = None
+        self.version += 1
+
+    def __delitem__(self,cat):
+        lvl = self[cat]
+        super().__delitem__(cat)
+        self.version += 1
+        del self.levels[lvl][cat]
+        if len(self.levels[lvl]) == 0:
+            del self.levels[lvl]
+
+    def pop(self,cat,*default):
+        if not cat in self:
+            return super().pop(cat,*default)
+        lvl = self[cat]
+        del self[cat]
+        return lvl
+
+    def update(self,categories={},**kwargs):
+        for cat,lvl in dict(categories,**kwargs).items():
+            self[cat] = lvl
+
+    def atLevel(self,lvl):
+        """
+        Open categories of a level in the order they were found.
+        """
+        return list(self.levels.get(lvl,{}))
+
+    def minLevel(self):
+        return min(self.levels)
+
+    def __reduce__(self):
+        return (OpenCategories,(dict(self),))
+
+
+class ClosedCategories:
+    """
+    Ordered set of crawled categories, replacing the former list (supports append, in, len and iteration). Versioned
+    like OpenCategories.
+    """
+    def __init__(self,categories=[]):
+        self._items = dict.fromkeys(categories)
+        self.version = 0
+
+    def append(self,cat):
+        self._items[cat] = None
+        self.version += 1
+
+    def remove(self,cat):
+        del self._items[cat]
+        self.version += 1
+
+    def __contains__(self,cat):
+        return cat in self._items
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __repr__(self):
+        return 'ClosedCategories(%s)'%list(self._items)
+
+    def __reduce__(self):
+        return (ClosedCategories,(list(self._items),))
+
+
+class AncestorIndex:
+    """
+    Memoized ancestor sets of the categories in a category-tree. Category names are interned as integer ids and
+    the closure of every category is computed once (cycle-safe via strongly connected components) and shared by
+    all articles and subcategories below it. Call invalidate() when the category-tree changes. The index is shared
+    by the fetch threads of collect, its caches are guarded by a lock.
+    """
+    def __init__(self):
+        self._lock = Lock()
+        self.invalidate()
+
+    def invalidate(self):
+        with self._lock:
+            self.tree = {}
+            self.ids = {}
+            self.names = []
+            self.parents = []
+            self.closure = {}
+            self.limited = {}
+
+    def __getstate__(self):
+        return {}
+
+    def __setstate__(self,state):
+        self.__init__()
+
+    def _id(self,name):
+        if not name in self.ids:
+            self.ids[name] = len(self.names)
+            self.names.append(name)
+            self.parents.append(None)
+        return self.ids[name]
+
+    def _parents(self,node):
+        if type(self.parents[node]) == type(None):
+            self.parents[node] = tuple(self._id(p) for p in self.tree.get(self.names[node],[]))
+        return self.parents[node]
+
+    def ancestors(self,tree,name,max_depth=None):
+        """
+        All categories above name in the tree.
+
+        Args:
+            tree (dict): category-tree (name : list of parents).
+
+            name (str): Article or category.
+
+            max_depth (int / None): Only follow max_depth generations of parents.
+
+        Returns:
+            list of str: sorted by name, so that the order does not depend on the order of the lookups
+        """
+        with self._lock:
+            self.tree = tree
+            parents = set(self._id(p) for p in tree[name])
+            ancestors = set(parents)
+            for p in parents:
+                if type(max_depth) == type(None):
+                    ancestors.update(self._closure(p))
+                elif max_depth > 1:
+                    ancestors.update(self._limited(p,max_depth-1))
+            return sorted(self.names[a] for a in ancestors)
+
+    def _limited(self,node,depth):
+        key = (node,depth)
+        if not key in self.limited:
+            ancestors = set(self._parents(node))
+            if depth > 1:
+                for p in self._parents(node):
+                    ancestors.update(self._limited(p,depth-1))
+            self.limited[key] = frozenset(ancestors)
+        return self.limited[key]
+
+    def _closure(self,start):
+        if start in self.closure:
+            return self.closure[start]
+        index = {start:0}
+        low = {start:0}
+        stack = [start]
+        on_stack = {start}
+        work = [(start,iter(self._parents(start)))]
+        while len(work) > 0:
+            node,todo = work[-1]
+            descended = False
+            for p in todo:
+                if p in self.closure:
+                    continue
+                if not p in index:
+                    index[p] = low[p] = len(index)
+                    stack.append(p)
+                    on_stack.add(p)
+                    work.append((p,iter(self._parents(p))))
+                    descended = True
+                    break
+                if p in on_stack:
+                    low[node] = min(low[node],index[p])
+            if descended:
+                continue
+            work.pop()
+            if len(work) > 0:
+                low[work[-1][0]] = min(low[work[-1][0]],low[node])
+            if low[node] == index[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                ancestors = set(component) if len(component) > 1 else set()
+                for member in component:
+                    for p in self.parents[member]:
+                        ancestors.add(p)
+                        if not p in component:
+                            ancestors.update(self.closure[p])
+                ancestors = frozenset(ancestors)
+                for member in component:
+                    self.closure[member] = ancestors
+        return self.closure[start]
+
+
+class CategoryIndex:
+    """
+    Children of every category in a category-tree (reverse adjacency) with the number of subcategories and articles
+    directly below each category and anywhere below it. The children are indexed in one pass over the tree, the
+    subtree counts are computed once bottom-up (see _subtreeCounts), categories and articles reached on several paths
+    are counted once. Call invalidate() when the category-tree or the article list changes.
+    """
+    def __init__(self):
+        self.invalidate()
+
+    def invalidate(self):
+        self.children = None
+        self.direct = {}
+        self.subtree = None
+
+    def __getstate__(self):
+        return {}
+
+    def __setstate__(self,state):
+        self.invalidate()
+
+    def build(self,tree,articles,label):
+        """
+        Index the children of all categories.
+
+        Args:
+            tree (dict): category-tree (name : list of parents).
+
+            articles (dict): Collected articles, other entries of the tree that are no categories are not counted.
+
+            label (str): Namespace of the categories (e.g. 'Category').
+        """
+        self.tree = tree
+        self.articles = articles
+        self.prefix = label+':'
+        children = {}
+        for name,parents in tree.items():
+            for p in parents:
+                children.setdefault(p,[]).append(name)
+        self.children = children
+        self.direct = {}
+        self.subtree = None
+
+    def isCategory(self,name):
+        return name.startswith(self.prefix)
+
+    def subcategories(self,category):
+        return [c for c in self.children.get(category,[]) if self.isCategory(c)]
+
+    def counts(self,category):
+        """
+        Returns:
+            tuple of int: subcategories and articles directly below category
+        """
+        if not category in self.direct:
+            children = self.children.get(category,[])
+            cats = sum(1 for c in children if self.isCategory(c))
+            arts = sum(1 for c in children if c in self.articles)
+            self.direct[category] = (cats,arts)
+        return self.direct[category]
+
+    def subtreeCounts(self,category,ancestors):
+        """
+        Returns:
+            tuple of int: categories and articles anywhere below category (each counted once)
+        """
+        if type(self.subtree) == type(None):
+            self.subtree = self._subtreeCounts(ancestors)
+        return self.subtree.get(category,(0,0))
+
+    def _kind(self,name):
+        return (1,0) if self.isCategory(name) else (0,1) if name in self.articles else (0,0)
+
+    def _subtreeCounts(self,ancestors):
+        """
+        Count all entries below each category bottom-up. Entries with a single parent (and not on a cycle) form a
+        forest hanging below the other entries (hubs), the counts of these trees are summed up from the leaves in one
+        pass. Only the hubs, which can be reached on several paths, are added to their ancestors by their memoized
+        ancestor sets, so that a deep tree costs one pass instead of one ancestor set per entry.
+        """
+        up = {}
+        for name,parents in self.tree.items():
+            parents = set(parents)
+            if len(parents) == 1:
+                up[name] = parents.pop()
+        # a cycle of single parents has no hub above it, its members become hubs
+        walked = {}
+        cyclic = []
+        for name in up:
+            path = []
+            node = name
+            while node in up and not node in walked:
+                walked[node] = name
+                path.append(node)
+                node = up[node]
+            if node in up and walked[node] == name:
+                cyclic += path[path.index(node):]
+        for name in cyclic:
+            del up[name]
+
+        # breadth-first from the hubs through the forest: parents before children
+        forest = {}
+        for name,parent in up.items():
+            forest.setdefault(parent,[]).append(name)
+        order = [name for name in forest if not name in up]
+        root = {name:name for name in order}
+        i = 0
+        while i < len(order):
+            for child in forest.get(order[i],[]):
+                root[child] = root[order[i]]
+                order.append(child)
+            i += 1
+        counts = {}
+        for name in reversed(order):
+            if name in up:
+                cats,arts = counts.get(name,(0,0))
+                kind = self._kind(name)
+                above = counts.get(up[name],(0,0))
+                counts[up[name]] = (above[0]+cats+kind[0],above[1]+arts+kind[1])
+
+        totals = dict(counts)
+        with ancestors._lock:
+            ancestors.tree = self.tree
+            for name,parents in self.tree.items():
+                if name in up or len(parents) == 0:
+                    continue
+                below = counts.get(name,(0,0))
+                kind = self._kind(name)
+                cats,arts = below[0]+kind[0],below[1]+kind[1]
+                if cats == 0 and arts == 0:
+                    continue
+                above = set()
+                for p in parents:
+                    p = ancestors._id(p)
+                    above.add(p)
+                    above.update(ancestors._closure(p))
+                for a in above:
+                    a = ancestors.names[a]
+                    total = totals.get(a,(0,0))
+                    if root.get(a,a) == name:
+                        # a is on a cycle through the hub: the hub's tree contains a itself and the entries below a
+                        own,kind = counts.get(a,(0,0)),self._kind(a)
+                        total = (total[0]-own[0]-kind[0],total[1]-own[1]-kind[1])
+                    totals[a] = (total[0]+cats,total[1]+arts)
+        return totals
+
+
+class RateLimiter:
+    """
+    Thread-safe limiter that spaces requests to Wikipedia so that all workers together stay below max_rps.
+    Replaced by WikiApi.RequestScheduler, kept to load nets saved by older versions.
+    """
+    def __init__(self,max_rps=None):
+        self.max_rps = max_rps
+        self._lock = Lock()
+        self._next_slot = 0
+
+    def wait(self):
+        """
+        Block until the next request slot is free.
+        """
+        if not self.max_rps:
+            return
+        with self._lock:
+            now = time()
+            slot = max(now,self._next_slot)
+            self._next_slot = slot + 1/self.max_rps
+        if slot > now:
+            sleep(slot-now)
+
+
+def __getattr__(name):
+    # the wikipediaapi clients moved to WikiClient, nets saved by older versions still refer to them here
+    if name in ['ScheduledWikipedia','CachedWikipedia']:
+        import WikiClient
+        return getattr(WikiClient,name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+class SkippedByProblem(Exception):
+    """
+    A page that still failed after the trials of repeated_trials. Carries the page and the type of the error, so
+    that the coordinator of a distributed crawl can record the failures of its workers in skipped_by_problem.
+    """
+    def __init__(self,message,title=None,error_class=None):
+        super().__init__(message)
+        self.title = title
+        self.error_class = error_class
+
+    def __reduce__(self):
+        return (SkippedByProblem,(self.args[0],self.title,self.error_class))
+
+
 def repeated_trials(action="collecting"):
     """
-    Make functions interacting with wikipedia more stable against network/server problems.
+    Make functions interacting with wikipedia more stable against network/server problems. Transient errors
+    (timeouts, 429, 5xx, maxlag) are already retried with backoff by the RequestScheduler; other errors get one more
+    trial. Pages that still fail are recorded in skipped_by_problem.
     """
     def inner(function):
         def wrapped_function(*args,**kwargs):
-            for repeat in range(4):
+            for repeat in range(2):
                 try:
                     result = function(*args,**kwargs)
                     return result
                 except Exception as e:
-                    if repeat < 3:
-                        print(f'Problem while {action} "{args[1]}": {e}... ',end="")
-                        sleep(5)
-                        args[0].initWiki()
-                        sleep(5)
-                        print('Reconnected to Wikipkedia')
-                    else:
-                        args[0].log(f'Skipped article "{args[1]}" because of connection problems.',level=2)
-                        sleep(5)
-                        args[0].skipped_by_problem[args[1]] = type(e)
-            raise Exception('Connection to Wikipedia failed!')
+                    if repeat == 0 and not isinstance(e,RequestFailed):
+                        args[0].log(f'Problem while {action} "{args[1]}" ({type(e).__name__}: {e})... trying again',
+                                    level=2)
+                        continue
+                    args[0].log(f'Skipped "{args[1]}" after {type(e).__name__}: {e}',level=2)
+                    args[0].skipped_by_problem[args[1]] = type(e)
+                    error = e
+                    break
+            raise SkippedByProblem(f'{action} "{args[1]}" failed ({type(error).__name__}: {error})',args[1],
+                                   type(error))
         return wrapped_function
     return inner
 
+class FetchedPage:
+    """
+    Stand-in for the page object of a category that was fetched by a worker of a distributed crawl.
+    """
+    def __init__(self,title,exists):
+        self.title = title
+        self._exists = exists
+
+    def exists(self):
+        return self._exists
+
+
 class KnowledgeNet(DynamicClass):
+    stored_maps = ('links','pages','article_categories','revisions','skipped_by_rule','skipped_by_category',
+                   'skipped_by_problem','articles','category_tree','network','outside')
+    cached_maps = ('articles','category_tree','network','outside')
+    stored_log = 'logging'
+    transient = ('display','queue','html_wiki')
     
     def __init__(self,language='en',start_at=None,depth=3,skip=[],skip_rules=[],verbose=1):
         super().__init__()
-        self.logging = []
+        self.logging = LogBuffer()
+        self.log_size = self.logging.capacity
+        self.log_level = None
+        self.display = createDisplay()
         self.state = ''
         self.taskLogStart = 0
         self.verbose = 1
         self.root = []
         
         self.articles = {}
-        self.open_categories = {}
+        self.open_categories = OpenCategories()
         self.category_tree = {}
-        self.closed_categories = []
+        self.ancestors = AncestorIndex()
+        self.category_index = CategoryIndex()
+        self.ancestor_depth = None
+        self.closed_categories = ClosedCategories()
+        self.network = {}
+        self.outside = {}
         self.skip_rules = []
         self.skipped = []
+        self.workers = 1
+        self.scheduler = RequestScheduler()
+        self.queue = None
+        self.task_size = 50
+        self.lease_seconds = 600
+        self.poll_interval = 1
+        self.api = None
+        self.api_url = None
+        self.html_wiki = None
+        self.cache = None
+        self.archive_writer = None
+        self.shard_articles = None
+        self.shard_mb = None
+        self.skip_sections = list(DEFAULT_SKIP_SECTIONS)
+        self.text_parser = 'auto'
+        self.category_labels = {'de':'Kategorie','en':'Category'}
+        self.metrics = Metrics()
         self.resetCollection()
 
         self.label_blacklist = ['Wikipedia articles incorporating','pages needing','Webarchive template wayback links','Articles citing','Articles that','Wikipedia articles needing','All orphaned articles','Orphaned articles','Articles using','Pages with listed','Use dmy dates from','CS1']
@@ -122,9 +704,160 @@ class KnowledgeNet(DynamicClass):
         """
         Creates a connection to wikipedia which can be used to request articles and metainformation.
         """
-        self.html_wiki = wiki.Wikipedia(self.language, extract_format=wiki.ExtractFormat.HTML)
-        self.categry_label = {'de':'Kategorie','en':'Category'}[self.language]
+        self.html_wiki = None
+        if type(self.scheduler.metrics) == type(None):
+            self.scheduler.metrics = self.metrics
+        if not type(self.api) == type(None):
+            self.api.scheduler = self.scheduler
+            self.api.connect()
+        self.categry_label = self.categoryLabel()
+
+    def categoryLabel(self):
+        """
+        Name of the category namespace of the language edition (e.g. 'Kategorie'), requested once from the siteinfo
+        of the wiki.
+        """
+        if not self.language in self.category_labels:
+            api = self.api if not type(self.api) == type(None) else MediaWikiApi(self.language,api_url=self.api_url,
+                                                                                 scheduler=self.scheduler)
+            try:
+                self.category_labels[self.language] = api.namespaceName(14)
+            except Exception as e:
+                self.log(f'Cannot request the category namespace of {self.language}: {e}',level=0)
+                return 'Category'
+        return self.category_labels[self.language]
+
+    def setBackend(self,batched=True,api_url=None,batch_size=50,record=False):
+        """
+        Choose how pages are requested. The batched backend requests categories and links of up to 50 titles with
+        one query instead of one request per title and property. Text is requested with the same queries, but the api
+        returns only one full-page extract per response, so collecting text still takes about one request per article.
+
+        Args:
+            batched (bool): Use the batched MediaWiki api backend instead of wikipediaapi.
+
+            api_url (str / None): Url of api.php, e.g. of a local MockWikiServer, used by both backends. Default is
+                Wikipedia.
+
+            batch_size (int): Titles per request (max. 50).
+
+            record (bool): Record all responses in self.api.recorded (see MockWiki.RecordedResponses).
+        """
+        self.api_url = api_url
+        self.html_wiki = None
+        if batched:
+            self.api = MediaWikiApi(self.language,api_url=api_url,batch_size=batch_size,record=record,cache=self.cache,
+                                    scheduler=self.scheduler)
+        else:
+            self.api = None
+        self.log('Requesting pages %s.'%('in batches of %d from %s'%(self.api.batch_size,self.api.api_url) if batched else 'one by one'),level=0)
+        if not type(self.language) == type(None):
+            self.categry_label = self.categoryLabel()
+
+    def setCache(self,path,ttl=None,max_mb=None,revalidate=False):
+        """
+        Keep all responses from Wikipedia in a persistent sqlite file, so that repeated scans and collections
+        (e.g. with other skip_rules) are answered without network requests.
+
+        Args:
+            path (str / None): sqlite file of the cache. None disables the cache.
+
+            ttl (float / None): Maximal age of cached responses in seconds.
+
+            max_mb (float / None): Maximal size of the cache, least recently used responses are removed first.
+
+            revalidate (bool): Check the revision ids of cached pages (batched backend only, one request per batch).
+        """
+        self.cache = ResponseCache(path,ttl=ttl,max_mb=max_mb,revalidate=revalidate) if path else None
+        self.initWiki()
+        if not type(self.api) == type(None):
+            self.api.cache = self.cache
+        self.log('Response cache: %s.'%(path if path else 'off'),level=0)
+
+    def cacheInfo(self):
+        """
+        Print hits, misses and size of the response cache.
+        """
+        if type(self.cache) == type(None):
+            print('No response cache.')
+            return
+        info = self.cache.info()
+        print('Response cache %s: %d entries (%.1f MB), %d hits, %d misses (%d stale), %d evicted, hit rate %.1f %%'
+              %(self.cache.path,info['entries'],info['size_mb'],info['hits'],info['misses'],info['stale'],
+                info['evicted'],100*info['hit_rate']))
+
+    def wikiClient(self):
+        """
+        wikipediaapi client with the current scheduler and cache, created on first use (wikipediaapi is only imported
+        when this backend is used).
+        """
+        if type(self.html_wiki) == type(None):
+            import wikipediaapi as wiki
+            from WikiClient import ScheduledWikipedia,CachedWikipedia
+            if type(self.cache) == type(None):
+                self.html_wiki = ScheduledWikipedia(self.language,self.scheduler,api_url=self.api_url,
+                                                    extract_format=wiki.ExtractFormat.HTML)
+            else:
+                self.html_wiki = CachedWikipedia(self.language,self.cache,self.scheduler,api_url=self.api_url,
+                                                 extract_format=wiki.ExtractFormat.HTML)
+        return self.html_wiki
+
+    def wikiPage(self,title):
+        """
+        Page object of the active backend (wikipediaapi or batched api).
+        """
+        if type(self.api) == type(None):
+            return self.wikiClient().page(title)
+        return self.api.page(title)
+
+    @timed('prefetch')
+    def prefetchPages(self,titles,properties=('pageid','categories'),workers=1):
+        """
+        Load pages in batches when the batched backend is active, so that the following page requests are served
+        from memory. Failed batches are ignored, the pages are then requested individually.
+
+        Args:
+            titles (list of str): Page titles.
+
+            properties (list of str): Any of 'pageid', 'lastrevid', 'categories', 'links' and 'extract'.
+
+            workers (int): Number of batches requested in parallel.
+        """
+        if type(self.api) == type(None) or len(titles) == 0:
+            return
+        size = self.api.batch_size
+        batches = [titles[first:first+size] for first in range(0,len(titles),size)]
+        def prefetch(batch):
+            try:
+                self.api.prefetch(batch,properties)
+            except Exception as e:
+                self.log(f'Prefetching {len(batch)} pages failed: {e}',level=2)
+        with ThreadPoolExecutor(max_workers=max(1,workers)) as pool:
+            list(pool.map(prefetch,batches))
         
+    def afterLoad(self):
+        """
+        Convert the crawl state of nets saved by older versions (open_categories dict, closed_categories list,
+        category_tree with duplicate parents) and drop the archive writer of a checkpoint saved during collect.
+        """
+        self.archive_writer = None
+        if type(self.logging) == list:
+            self.logging = LogBuffer(self.logging,self.log_size)
+        if isinstance(self.logging,StoredLog):
+            self.logging.capacity = self.log_size
+        if isinstance(getattr(self,'rate_limiter',None),RateLimiter):
+            self.scheduler = RequestScheduler(self.rate_limiter.max_rps)
+            del self.rate_limiter
+        # the scheduler and the net are pickled separately, they share the metrics again after loading
+        self.scheduler.metrics = self.metrics
+        if not type(self.language) == type(None):
+            self.initWiki()
+        if not isinstance(self.open_categories,OpenCategories):
+            self.open_categories = OpenCategories(self.open_categories)
+        if not isinstance(self.closed_categories,ClosedCategories):
+            self.closed_categories = ClosedCategories(self.closed_categories)
+            self.category_tree = {cat:list(dict.fromkeys(parents)) for cat,parents in self.category_tree.items()}
+
     def setSkipRule(self,rules):
         """
         Define rules (Regex) to exclude Categories or articles.
@@ -142,6 +875,88 @@ class KnowledgeNet(DynamicClass):
                 add_counter += 1
         self.log('Appended %d new skip_rules.'%add_counter,level=0)
         
+    def setTextExtraction(self,skip_sections=None,parser='auto'):
+        """
+        Configure how paragraphs are extracted from the html of articles.
+
+        Args:
+            skip_sections (list of str / None): Headings of sections that are ignored (e.g. 'References'). None keeps
+                the current list.
+
+            parser (str): 'auto' (lxml if installed, otherwise html.parser), 'lxml', 'html.parser' or 'regex' (former
+                extraction without entity decoding and section filtering).
+        """
+        if not type(skip_sections) == type(None):
+            self.skip_sections = list(skip_sections)
+        self.text_parser = parser
+        self.log('Extracting text with %s parser, skipping %d sections.'%(parser,len(self.skip_sections)),level=0)
+
+    def setStorage(self,path=None):
+        """
+        Keep links and texts (pages) out of memory in memory-mapped files in the directory path. Only titles and
+        offsets stay in memory; links[title] and pages[title] read the article from the files. The saved net only
+        refers to the files, so loading it does not read them.
+
+        Args:
+            path (str / None): Directory of the files. None moves links and texts back into memory.
+        """
+        for name in ['links','pages']:
+            current = getattr(self,name)
+            if path:
+                store = MappedStore(path,name)
+                if isinstance(current,MappedStore) and os.path.abspath(current.data_path) == os.path.abspath(store.data_path):
+                    store.close()
+                    continue
+                for title,value in current.items():
+                    store[title] = value
+                store.flush()
+            else:
+                store = dict(current.items())
+            setattr(self,name,store)
+            if isinstance(current,MappedStore):
+                current.close()
+        self.log('Links and texts are kept %s.'%('in %s'%path if path else 'in memory'),level=0)
+
+    def setConcurrency(self,workers=1,max_rps=None,burst=1):
+        """
+        Define how many categories are crawled in parallel and how many requests per second are allowed in total.
+
+        Args:
+            workers (int): Number of threads fetching the categories of one level.
+
+            max_rps (float / None): Global cap of requests per second shared by all workers. None means no cap.
+
+            burst (int): Requests that may be sent at once after an idle period.
+        """
+        self.workers = max(1,int(workers))
+        self.scheduler.max_rps = max_rps
+        self.scheduler.burst = burst
+        self.scheduler.resetCounters()
+        self.log('Crawling with %d workers%s.'%(self.workers,'' if not max_rps else ' at max. %g requests/s'%max_rps),level=0)
+
+    def setRetries(self,max_retries=5,maxlag=None,backoff=None):
+        """
+        Define how requests are retried after transient errors (timeouts, 429, 5xx, maxlag).
+
+        Args:
+            max_retries (int): Retries per request.
+
+            maxlag (int / None): Ask the api to refuse requests while its replication lag exceeds maxlag seconds.
+
+            backoff (dict / None): error class ('network', 'server', 'ratelimit', 'maxlag') : (base delay, max. delay)
+                in seconds.
+        """
+        self.scheduler.max_retries = max_retries
+        self.scheduler.maxlag = maxlag
+        self.scheduler.backoff = dict(RequestScheduler.default_backoff,**(backoff if backoff else {}))
+        self.log('Retrying requests up to %d times.'%max_retries,level=0)
+
+    def requestStats(self):
+        """
+        Requests, retries per error class, waiting time and throughput since the last setConcurrency.
+        """
+        return self.scheduler.stats()
+
     def startScan(self,start_at,depth=3,skip=[],skip_rules=[],verbose=1):
         self.newTask(verbose=verbose)
         page,cat_categories = self.getPageAndCategories(start_at)
@@ -154,6 +969,8 @@ class KnowledgeNet(DynamicClass):
         if not start_at in self.category_tree.keys():
             self.root.append(start_at)
             self.category_tree[start_at] = []
+            self.ancestors.invalidate()
+            self.category_index.invalidate()
             
         dn_art,dn_cat,dn_skip = self.scanLevel(start_at,0,skip=skip,skip_rules=skip_rules,verbose=1)
         self.log('Scanned on level 1: found %d pages and %d subcategories, %d skipped.'%(dn_art,dn_cat,dn_skip),level=0)
@@ -166,7 +983,7 @@ class KnowledgeNet(DynamicClass):
         self.indexInfo()
         return True
 
-    def scanLevel(self,category,lvl,skip=[],skip_rules=[],verbose=1):               
+    def scanLevel(self,category,lvl,skip=[],skip_rules=[],verbose=1,fetched=None):
         new_categories = 0
         new_articles = 0
         skipped = 0
@@ -174,14 +991,17 @@ class KnowledgeNet(DynamicClass):
             self.log(f"The category '{category}' was skipped since it had been crawled before.")
             return new_articles,new_categories,skipped
         
-        cat_page,cat_categories = self.getPageAndCategories(category)            
+        if type(fetched) == type(None):
+            fetched = self.fetchCategory(category)
+        elif isinstance(fetched,Exception):
+            raise fetched
+        cat_page,cat_categories,category_members = fetched
+        self.article_categories[category] = cat_categories
         if not cat_page.exists():
             self.log('Page %s was not found!'%category,level=0)
             self.closed_categories.append(category)
             return new_articles,new_categories,skipped
         
-        category_members = self.getSubCategories(category,cat_page)
-        
         for cat in category_members:
             if not self.checkValid(cat,set([cat]).union(cat_categories),skip,skip_rules):
                 skipped += 1
@@ -198,12 +1018,53 @@ class KnowledgeNet(DynamicClass):
                     self.articles[cat] = category
                     new_articles += 1
 
-            if not cat in self.category_tree.keys():
-                self.category_tree[cat] = []
-            self.category_tree[cat].append(category)
+            parents = self.category_tree.get(cat,[])
+            if not category in parents:
+                # assigned again (not appended), so that a state store saves the changed entry
+                self.category_tree[cat] = parents+[category]
                     
+        self.ancestors.invalidate()
+        self.category_index.invalidate()
         self.closed_categories.append(category)
         return new_articles,new_categories,skipped
+
+    @timed('crawl_category')
+    def fetchCategory(self,category):
+        """
+        Request a category page, its own categories and its members without changing the state of the net.
+
+        Args:
+            category (str): Name of category.
+
+        Returns:
+            tuple: page-object , category list , member list (None if the page does not exist)
+        """
+        cat_page,cat_categories = self.fetchPageAndCategories(category)
+        if not cat_page.exists():
+            return cat_page,cat_categories,None
+        return cat_page,cat_categories,list(self.getSubCategories(category,cat_page))
+
+    def fetchCategories(self,categories,workers):
+        """
+        Fetch several categories in parallel. Failures are returned as exception objects instead of being raised,
+        so that the results can be merged in a fixed order afterwards.
+
+        Args:
+            categories (list of str): Names of categories.
+
+            workers (int): Number of threads.
+
+        Returns:
+            dict: category : result of fetchCategory or exception
+        """
+        def fetch(category):
+            try:
+                return self.fetchCategory(category)
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return dict(zip(categories,pool.map(fetch,categories)))
     
     @repeated_trials(action="getting subcategories")
     def getSubCategories(self,page,cat_page):
@@ -217,7 +1078,7 @@ class KnowledgeNet(DynamicClass):
         """
         return cat_page.categorymembers.keys()
 
-    def crawlDeeper(self,lvl=None,skip=[],skip_rules=[],verbose=1):
+    def crawlDeeper(self,lvl=None,skip=[],skip_rules=[],verbose=1,workers=None):
         """
         For each category in the list visit the subcategories that are not yet scanned for articles.
 
@@ -227,17 +1088,32 @@ class KnowledgeNet(DynamicClass):
             skip (list of str): Ignore all categories from this list.
 
             skip_rules (list of regexp.): Ignore all categories matching any rule from this list.
+
+            workers (int / None): Number of categories fetched in parallel (default: set by setConcurrency).
+                Results are merged in the original order, so the outcome does not depend on the number of workers.
         """
         if not type(lvl) == int:
-            lvl = min(self.open_categories.values())
+            lvl = self.open_categories.minLevel()
             
-        next_categories = [cat for cat,l in self.open_categories.items() if l == lvl]
+        next_categories = self.open_categories.atLevel(lvl)
         new_categories = 0
         new_articles = 0
         skipped = 0
         
+        if type(workers) == type(None):
+            workers = self.workers
+        fetched = {}
+        to_fetch = [cat for cat in next_categories if not cat in self.closed_categories]
+        if not type(self.queue) == type(None):
+            fetched = self.fetchCategoriesRemote(to_fetch)
+        else:
+            self.prefetchPages(to_fetch,workers=workers)
+        if workers > 1 and type(self.queue) == type(None):
+            self.printStatus('Fetching %d categories with %d workers.'%(len(to_fetch),workers),verbose=verbose)
+            fetched = self.fetchCategories(to_fetch,workers)
+        
         for nc,cat in enumerate(next_categories):
-            dn_art,dn_cat,dn_skip = self.scanLevel(cat,lvl,skip=skip,skip_rules=skip_rules)  
+            dn_art,dn_cat,dn_skip = self.scanLevel(cat,lvl,skip=skip,skip_rules=skip_rules,fetched=fetched.pop(cat,None))
                 
             new_categories += dn_cat
             new_articles += dn_art
@@ -249,6 +1125,7 @@ class KnowledgeNet(DynamicClass):
         
         base_message = 'Scanned on level %d: found %d pages and %d subcategories, %d skipped.'
         message = base_message%(lvl+1,new_articles,new_categories,skipped)
+        self.printStatus()
         self.log(message,level=0)
         return new_categories
 
@@ -260,75 +1137,464 @@ class KnowledgeNet(DynamicClass):
 
     def collect(self,links=True,text=False,ignore=[],ignore_rules=[],
                 archive_path=None,zipped=False,save_interval=None,
-                limit=None,verbose=1):
+                limit=None,verbose=1,workers=None,queue_size=None,shard_articles=None,shard_mb=None,deduplicated=False):
         
         """
         Collect links and/or text from all articles in the list.
+
+        Zip archives are written in batches of save_interval (default 100) articles. With shard_articles or shard_mb
+        the zip archive is split into several files (name-00000.zip, ...) of at most this many articles or MB.
+
+        With deduplicated the texts are written to a paragraph store (name.wds) instead, which keeps every distinct
+        paragraph once and compresses them in blocks (see WikiBlocks.ParagraphStore).
+
+        With workers > 1 the articles are processed by a pipeline: several fetch workers request pages from a bounded
+        queue, one parser thread extracts the text and the calling thread stores the results in the original order.
         """
         start_at = self.collected
         if type(limit) == type(None):
             limit = len(self.articles)
+        if type(workers) == type(None):
+            workers = self.workers
         
         if not type(archive_path) == type(None):
             if os.path.exists(archive_path) and not os.path.isdir(archive_path):
                 raise Exception(f'Folder {archive_path} is not a directory!')
-            if not type(archive_path) == type(None) and not zipped and not os.path.exists(archive_path):
+            if not zipped and not deduplicated and not os.path.exists(archive_path):
                 os.mkdir(archive_path)
             if not type(archive_path) == type(None):
                 self.archive_path = archive_path if not zipped else archive_path+'.zip'
+                if deduplicated:
+                    self.archive_path = archive_path+STORE_SUFFIX
+        if shard_articles or shard_mb:
+            self.shard_articles = shard_articles
+            self.shard_mb = shard_mb
         auto_save = self.save_path != '' and type(save_interval) == int
 
         txts = 0
         lnks = 0
         skpd = 0
+        i = -1
         start = time()
         self.stalk_time_prediction = []
         self.newTask(verbose=verbose)
         target_pages = list(self.articles.keys())[start_at:start_at+limit]
         total = len(target_pages)
-        for i,p in enumerate(target_pages):
-            try:
-                inherited_categories = self.retrieveCategories(p)          
-                page,page_categories = self.getPageAndCategories(p)              
-                total_cat = set(inherited_categories).union(page_categories)
-                valid = self.checkValid(p,total_cat,ignore,ignore_rules)
-                if valid:
-                    self.collectArticle(p,links=links,text=text,page_obj=page,categories=inherited_categories)
-                    if links:
-                        lnks += len(self.links[p])
-                    if text:
-                        txts += self.pages[p] if type(self.pages[p]) == int else len(self.pages[p])
-                        
-            except KeyboardInterrupt:
-                self._progresBar(i,total,start,lnks,txts,skpd,verbose)
-                print('stopped by user')
-                break
-            except Exception as e:
-                self.log(f"Exception while collecting {p}: {e}")
-                skpd += 1
-            
-            self.collected += 1
-            if auto_save and (i%save_interval == 0 or i+1 == total):
-                self.save(self.save_path,overwrite=True)
-            
-            if (i+1)%10 == 0 or i+1 == total: 
-                self._progresBar(i,total,start,lnks,txts,skpd,verbose)
+        if not type(self.queue) == type(None):
+            results = self._fetchRemote(target_pages,links,text,ignore,ignore_rules)
+        elif workers > 1:
+            results = self._fetchPipelined(target_pages,links,text,ignore,ignore_rules,workers,queue_size)
+        else:
+            results = self._fetchSequential(target_pages,links,text,ignore,ignore_rules)
+        if type(self.last_update) == type(None):
+            self.last_update = strftime('%Y-%m-%dT%H:%M:%SZ',gmtime(start))
+        self.openArchive(save_interval if type(save_interval) == int else 100)
+        try:
+            for i,p,result in results:
+                if isinstance(result,Exception):
+                    self.log(f"Exception while collecting {p}: {result}")
+                    skpd += 1
+                    self.metrics.count('articles_failed')
+                else:
+                    dn_lnk,dn_txt = self.storeResult(p,result)
+                    lnks += dn_lnk
+                    txts += dn_txt
+                    self.metrics.count('articles_collected')
                 
-    def _progresBar(self,i,total,start,lnks,txts,skpd,verbose):
-        bar = '='*int(np.ceil((i+1)/total*30))
-        now = time()
-        diff = np.round(now-start)
-        pro = (i+1)/total
-        wait = np.round((1-pro)/pro*diff)
-        run_time = f'{diff} s'
-        if diff > 60:
-            mins = int(diff//60)
-            rest = int(diff%60)
-            run_time = f'{mins} min {rest:02d} s'
-        wait_time = f'{wait} s'
-        if wait > 60:
-            mins = int(wait//60)
-            rest = int(wait%60)
+                self.collected += 1
+                if auto_save and (i%save_interval == 0 or i+1 == total):
+                    with self.metrics.timer('checkpoint'):
+                        self.flushArchive()
+                        self.save(self.save_path,overwrite=True)
+                
+                if (i+1)%10 == 0 or i+1 == total: 
+                    self._progresBar(i,total,start,lnks,txts,skpd,verbose)
+                    self.metrics.export()
+                    
+        except KeyboardInterrupt:
+            self._progresBar(max(i,0),total,start,lnks,txts,skpd,verbose)
+            print('stopped by user')
+        finally:
+            results.close()
+            self.closeArchive()
+            self.printStatus()
+            self.metrics.export(force=True)
+
+    def openArchive(self,buffer_size=100):
+        """
+        Start writing to the archive with a single ArchiveWriter until closeArchive() is called.
+        """
+        if hasattr(self,'archive_path') and type(self.archive_writer) == type(None):
+            self.archive_writer = ArchiveWriter(self.archive_path,buffer_size=buffer_size,
+                                                shard_articles=self.shard_articles,shard_mb=self.shard_mb,
+                                                titles=self.articles)
+
+    def flushArchive(self):
+        if not type(self.archive_writer) == type(None):
+            self.archive_writer.flush()
+
+    def closeArchive(self):
+        if not type(self.archive_writer) == type(None):
+            writer = self.archive_writer
+            self.archive_writer = None
+            writer.close()
+
+    @timed('store')
+    def storeResult(self,page,result):
+        """
+        Bookkeeping for a result of fetchArticle: save categories, revision and skip reasons and store the content of
+        valid articles.
+
+        Returns:
+            tuple: number of links , number of text lines
+        """
+        self.article_categories[page] = result['direct']
+        self.revisions[page] = result.get('revid',0)
+        if not self.registerSkipReasons(page,*result['skip']):
+            return 0,0
+        self.storeArticle(page,result,result['categories'])
+        lnks = len(self.links[page]) if 'links' in result and page in self.links else 0
+        txts = 0
+        if 'lines' in result and page in self.pages:
+            txts = self.pages[page] if type(self.pages[page]) == int else len(self.pages[page])
+        return lnks,txts
+
+    def fetchArticle(self,page,links=False,text=False,ignore=[],ignore_rules=[],inherited=None):
+        """
+        Request everything that is needed to collect an article without changing the state of the net.
+        Links and html are only requested if the article passes the ignore-rules and was not collected before.
+
+        Args:
+            page (str): Article name.
+
+            inherited (list of str / None): Inherited categories, default is retrieveCategories(page).
+
+        Returns:
+            dict: inherited 'categories', 'direct' categories, 'skip' reasons and optionally 'links' and 'html'
+        """
+        inherited_categories = self.retrieveCategories(page) if type(inherited) == type(None) else inherited
+        page_obj,page_categories = self.fetchPageAndCategories(page)
+        total_cat = set(inherited_categories).union(page_categories)
+        result = {'categories':inherited_categories,'direct':page_categories,'revid':self._revisionOf(page_obj),
+                  'skip':self.findSkipReasons(total_cat,ignore,ignore_rules)}
+        if not any(result['skip']) and not page in self.pages.keys():
+            result.update(self.fetchContent(page,page_obj=page_obj,links=links,text=text))
+        return result
+
+    def _prefetchProperties(self,links,text):
+        return ['pageid','categories'] + (['links'] if links else []) + (['extract'] if text else [])
+
+    @staticmethod
+    def _revisionOf(page_obj):
+        try:
+            return page_obj.lastrevid
+        except Exception:
+            return 0
+
+    def _fetchSequential(self,target_pages,links,text,ignore,ignore_rules):
+        size = self.api.batch_size if not type(self.api) == type(None) else len(target_pages)
+        for i,p in enumerate(target_pages):
+            if i%max(1,size) == 0:
+                self.prefetchPages(target_pages[i:i+size],self._prefetchProperties(links,text))
+            try:
+                result = self.fetchArticle(p,links,text,ignore,ignore_rules)
+                if 'html' in result:
+                    result['lines'] = self.extractText(result.pop('html'))
+            except Exception as e:
+                result = e
+            yield i,p,result
+
+    def _fetchPipelined(self,target_pages,links,text,ignore,ignore_rules,workers,queue_size=None):
+        """
+        Fetch articles with several threads and parse them in a separate thread.
+        Yields the results in the order of target_pages, so that the calling thread can store them like the
+        sequential loop does.
+        """
+        queue_size = queue_size if queue_size else 4*workers
+        stop = Event()
+        titles = Queue(maxsize=queue_size)
+        fetched = Queue(maxsize=queue_size)
+        parsed = Queue(maxsize=queue_size)
+
+        def put(q,item):
+            while not stop.is_set():
+                try:
+                    q.put(item,timeout=0.1)
+                    return
+                except Full:
+                    pass
+
+        size = self.api.batch_size if not type(self.api) == type(None) else 1
+        def feed():
+            for first in range(0,len(target_pages),size):
+                put(titles,list(enumerate(target_pages[first:first+size],first)))
+            for _ in range(workers):
+                put(titles,None)
+
+        def fetch():
+            while not stop.is_set():
+                batch = titles.get()
+                if type(batch) == type(None):
+                    break
+                self.prefetchPages([p for i,p in batch],self._prefetchProperties(links,text))
+                for i,p in batch:
+                    try:
+                        result = self.fetchArticle(p,links,text,ignore,ignore_rules)
+                    except Exception as e:
+                        result = e
+                    put(fetched,(i,p,result))
+            put(fetched,None)
+
+        def parse():
+            running = workers
+            while running > 0 and not stop.is_set():
+                item = fetched.get()
+                if type(item) == type(None):
+                    running -= 1
+                    continue
+                i,p,result = item
+                if type(result) == dict and 'html' in result:
+                    try:
+                        result['lines'] = self.extractText(result.pop('html'))
+                    except Exception as e:
+                        result = e
+                put(parsed,(i,p,result))
+            put(parsed,None)
+
+        threads = [Thread(target=feed,daemon=True),Thread(target=parse,daemon=True)]
+        threads += [Thread(target=fetch,daemon=True) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+
+        pending = {}
+        next_i = 0
+        try:
+            while True:
+                item = parsed.get()
+                if type(item) == type(None):
+                    break
+                pending[item[0]] = item
+                while next_i in pending:
+                    yield pending.pop(next_i)
+                    next_i += 1
+        finally:
+            stop.set()
+                
+    def setQueue(self,queue=None,task_size=50,lease_seconds=600,poll_interval=1,max_attempts=3):
+        """
+        Distribute the crawl: crawlDeeper and collect hand out categories and articles as tasks in the queue and
+        merge the results of the workers (see work) into this net in the original order. Tasks of crashed workers
+        are handed out again when their lease expired. A coordinator that was stopped continues with the results
+        that are already in the queue.
+
+        Args:
+            queue (str / queue / None): SqliteQueue (file ending with .db), FileQueue (directory) or None to crawl
+                locally again.
+
+            task_size (int): Categories or articles per task.
+
+            lease_seconds (float): Time a worker has for a task before it is handed out again.
+
+            poll_interval (float): Seconds between two looks into the queue while waiting.
+
+            max_attempts (int): Leases of a task before it fails.
+        """
+        from WikiQueue import openQueue
+        self.queue = openQueue(queue,max_attempts) if type(queue) == str else queue
+        self.task_size = task_size
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        if not type(queue) == type(None):
+            self.log('Distributing tasks of %d pages through %s.'%(task_size,self.queue.path),level=0)
+
+    def _taskSettings(self):
+        return {'language':self.language,'skip_rules':list(self.skip_rules),'skip_sections':list(self.skip_sections),
+                'text_parser':self.text_parser}
+
+    def _remoteResults(self,kind,payloads):
+        """
+        Submit tasks to the queue and yield (task number, result) in the order of the tasks while the workers
+        finish them. The job is removed from the queue when all results were handed on.
+        """
+        import dill as pkl
+        job = '%s-%s'%(kind,hashlib.md5(pkl.dumps([kind,payloads])).hexdigest())
+        self.queue.submit(job,kind,payloads)
+        finished = {}
+        received = set()
+        merged = 0
+        while merged < len(payloads):
+            if not merged in finished:
+                new = self.queue.results(job,skip=received)
+                received.update(new)
+                finished.update(new)
+            if not merged in finished:
+                progress = self.queue.progress(job)
+                self.printStatus('Waiting for workers: %d of %d tasks done, %d leased.'%(progress['done'],
+                                 len(payloads),progress['leased']))
+                sleep(self.poll_interval)
+                continue
+            yield merged,finished.pop(merged)
+            merged += 1
+        self.queue.remove(job)
+
+    def fetchCategoriesRemote(self,categories):
+        """
+        Fetch categories by the workers of the queue (see setQueue).
+
+        Returns:
+            dict: category : result of fetchCategory or exception
+        """
+        size = max(1,self.task_size)
+        chunks = [categories[first:first+size] for first in range(0,len(categories),size)]
+        payloads = [dict(self._taskSettings(),items=chunk) for chunk in chunks]
+        fetched = {}
+        for seq,result in self._remoteResults('categories',payloads):
+            for cat in chunks[seq]:
+                if isinstance(result,Exception):
+                    fetched[cat] = result
+                elif isinstance(result[cat],Exception):
+                    fetched[cat] = result[cat]
+                    self._recordProblem(result[cat])
+                else:
+                    exists,cat_categories,members = result[cat]
+                    fetched[cat] = (FetchedPage(cat,exists),cat_categories,members)
+        return fetched
+
+    def _fetchRemote(self,target_pages,links,text,ignore,ignore_rules):
+        """
+        Fetch articles by the workers of the queue. Yields the results in the order of target_pages like
+        _fetchSequential.
+        """
+        size = max(1,self.task_size)
+        settings = dict(self._taskSettings(),links=links,text=text,ignore=list(ignore),ignore_rules=list(ignore_rules))
+        chunks = [target_pages[first:first+size] for first in range(0,len(target_pages),size)]
+        payloads = [dict(settings,items=[(p,self.retrieveCategories(p)) for p in chunk]) for chunk in chunks]
+        for seq,results in self._remoteResults('articles',payloads):
+            for j,p in enumerate(chunks[seq]):
+                result = results if isinstance(results,Exception) else results[j]
+                if type(result) == dict and p in self.pages:
+                    # collected before, a local fetch would not have requested the content
+                    result.pop('links',None)
+                    result.pop('lines',None)
+                self._recordProblem(result)
+                yield seq*size+j,p,result
+
+    def _recordProblem(self,result):
+        # failures of the workers are recorded by repeated_trials in their own state, merge them like a local fetch
+        if isinstance(result,SkippedByProblem):
+            self.skipped_by_problem[result.title] = result.error_class
+
+    def work(self,queue=None,worker=None,idle_timeout=None,max_tasks=None):
+        """
+        Work for a distributed crawl (see setQueue): lease tasks, fetch their categories or articles and hand back
+        the results. The worker does not change its own crawl state; it only needs the settings of the requests
+        (setBackend, setCache, setConcurrency, setRetries).
+
+        Args:
+            queue (str / queue / None): Queue of the coordinator, default is the queue set by setQueue.
+
+            worker (str / None): Name of the worker, default is host and process id.
+
+            idle_timeout (float / None): Stop when no task was open for this many seconds (None: never stop).
+
+            max_tasks (int / None): Stop after this many tasks.
+
+        Returns:
+            int: number of finished tasks
+        """
+        from WikiQueue import openQueue,workerName
+        queue = openQueue(queue) if type(queue) == str else queue if not type(queue) == type(None) else self.queue
+        worker = worker if worker else workerName()
+        self.log('Working for %s as %s.'%(queue.path,worker),level=0)
+        done = 0
+        idle = time()
+        while type(max_tasks) == type(None) or done < max_tasks:
+            lease = queue.lease(worker,self.lease_seconds)
+            if type(lease) == type(None):
+                if not type(idle_timeout) == type(None) and time()-idle > idle_timeout:
+                    break
+                sleep(self.poll_interval)
+                continue
+            result = self.runTask(lease)
+            if not lease.complete(result):
+                self.log('The lease of task %d of %s expired, its result was dropped.'%(lease.seq,lease.job))
+            done += 1
+            idle = time()
+            self.printStatus('Finished %d tasks.'%done)
+        self.printStatus()
+        return done
+
+    def runTask(self,lease):
+        """
+        Fetch the categories or articles of a task without changing the crawl state.
+
+        Returns:
+            dict (categories): category : (exists, categories, members) or exception
+
+            list (articles): result of fetchArticle (with extracted 'lines') or exception per article
+        """
+        payload = lease.payload
+        if not payload['language'] == self.language:
+            self.language = payload['language']
+            self.initWiki()
+        self.skip_rules = payload['skip_rules']
+        self.skip_sections = payload['skip_sections']
+        self.text_parser = payload['text_parser']
+
+        import dill as pkl
+
+        def portable(e):
+            try:
+                pkl.dumps(e)
+                return e
+            except Exception:
+                return Exception(repr(e))
+
+        def renew():
+            if lease.expires-time() < self.lease_seconds/2:
+                lease.renew(self.lease_seconds)
+
+        items = payload['items']
+        if lease.kind == 'categories':
+            self.prefetchPages(items,workers=self.workers)
+            renew()
+            fetched = {}
+            step = max(1,self.workers)
+            for first in range(0,len(items),step):
+                fetched.update(self.fetchCategories(items[first:first+step],self.workers))
+                renew()
+            return {cat:portable(r) if isinstance(r,Exception) else (r[0].exists(),list(r[1]),r[2])
+                    for cat,r in fetched.items()}
+
+        results = []
+        self.prefetchPages([p for p,inherited in items],self._prefetchProperties(payload['links'],payload['text']))
+        for p,inherited in items:
+            try:
+                result = self.fetchArticle(p,payload['links'],payload['text'],payload['ignore'],
+                                           payload['ignore_rules'],inherited=inherited)
+                if 'html' in result:
+                    result['lines'] = self.extractText(result.pop('html'))
+            except Exception as e:
+                result = portable(e)
+            results.append(result)
+            renew()
+        return results
+
+    def _progresBar(self,i,total,start,lnks,txts,skpd,verbose):
+        bar = '='*math.ceil((i+1)/total*30)
+        now = time()
+        diff = float(round(now-start))
+        pro = (i+1)/total
+        wait = float(round((1-pro)/pro*diff))
+        run_time = f'{diff} s'
+        if diff > 60:
+            mins = int(diff//60)
+            rest = int(diff%60)
+            run_time = f'{mins} min {rest:02d} s'
+        wait_time = f'{wait} s'
+        if wait > 60:
+            mins = int(wait//60)
+            rest = int(wait%60)
             wait_time = f'{mins} min {rest:02d} s'
             
         info = f'Collecting: [{bar:<30}] {int(pro*100):3d} % ({i+1}/{total} pages)'
@@ -343,7 +1609,6 @@ class KnowledgeNet(DynamicClass):
         self.stalk_time_prediction.append([diff,wait])
         self.printStatus(info,verbose=verbose)
     
-    @repeated_trials(action="getting page")
     def getPageAndCategories(self,page):
         """
         Collect page-object and save explicit categories
@@ -352,11 +1617,23 @@ class KnowledgeNet(DynamicClass):
         Return:
             tuple: page-object , category list
         """
-        page_obj = self.html_wiki.page(page)
+        page_obj,self.article_categories[page] = self.fetchPageAndCategories(page)
+        return page_obj,self.article_categories[page]
+
+    @timed('fetch_page')
+    @repeated_trials(action="getting page")
+    def fetchPageAndCategories(self,page):
+        """
+        Request page-object and explicit categories without saving them.
+        Args:
+            p (str): article name
+        Return:
+            tuple: page-object , category list
+        """
+        page_obj = self.wikiPage(page)
         if not page_obj.exists():
             raise Exception('Article does not exist!')
-        self.article_categories[page] = list(page_obj.categories.keys())
-        return page_obj,self.article_categories[page]
+        return page_obj,list(page_obj.categories.keys())
     
     def checkValid(self,p,total_cat,ignore,ignore_rules):
         """
@@ -372,16 +1649,32 @@ class KnowledgeNet(DynamicClass):
                 If at least one rule matches on one category, the article is ignored.
             
         """
-        ignore_by_rule = []
-        for cat in total_cat:
-            for rule in ignore_rules + self.skip_rules:
-                if re.match(rule,cat):
-                    ignore_by_rule.append([cat,rule])
-             
+        ignore_by_rule,bad_cat = self.findSkipReasons(total_cat,ignore,ignore_rules)
+        return self.registerSkipReasons(p,ignore_by_rule,bad_cat)
+
+    @timed('check_valid')
+    def findSkipReasons(self,total_cat,ignore,ignore_rules):
+        """
+        Find the rules and categories that exclude an article, without any bookkeeping.
+
+        Returns:
+            tuple: list of [category, rule] pairs , set of forbidden categories
+        """
+        rules = ruleSet(tuple(ignore_rules + self.skip_rules))
+        ignore_by_rule = [[cat,rule] for cat in total_cat for rule in rules.matches(cat)]
+        bad_cat = set(total_cat).intersection(ignore)
+        return ignore_by_rule,bad_cat
+
+    def registerSkipReasons(self,p,ignore_by_rule,bad_cat):
+        """
+        Save the reasons found by findSkipReasons in skipped_by_rule / skipped_by_category.
+
+        Returns:
+            bool: True if the article is valid
+        """
         if len(ignore_by_rule) > 0:
             self.skipped_by_rule[p] = ignore_by_rule
                     
-        bad_cat = total_cat.intersection(ignore)
         if len(bad_cat) > 0:
             self.skipped_by_category[p] = bad_cat
             
@@ -391,46 +1684,80 @@ class KnowledgeNet(DynamicClass):
         
         return True
     
-    @repeated_trials(action="collecting")
     def collectArticle(self,page,links=False,text=False,page_obj=None,categories=[]):
         if page in self.pages.keys():
             return False
-            
+        
+        content = self.fetchContent(page,page_obj=page_obj,links=links,text=text)
+        if 'html' in content:
+            content['lines'] = self.extractText(content.pop('html'))
+        return self.storeArticle(page,content,categories)
+
+    @timed('fetch_content')
+    @repeated_trials(action="collecting")
+    def fetchContent(self,page,page_obj=None,links=False,text=False):
+        """
+        Request the links and/or the html of an article.
+
+        Returns:
+            dict: optional keys 'links' (list of str) and 'html' (str)
+        """
         if type(page_obj) == type(None):
-            page_obj = self.html_wiki.page(page)
-                    
+            page_obj = self.wikiPage(page)
+        
+        content = {}
         if links:
-            self.links[page] = list(page_obj.links.keys())
+            content['links'] = list(page_obj.links.keys())
         if text:
-            text = self.extractText(page_obj) 
-            if hasattr(self,'archive_path'):
-                self.pages[page] = len(text)
-                self.saveText(page,text,categories)
-            else:
-                self.pages[page] = text
-                        
+            content['html'] = page_obj.text
+        return content
+
+    def storeArticle(self,page,content,categories=[]):
+        """
+        Save links and extracted text lines of an article in the net or the archive.
+
+        Args:
+            page (str): Article name.
+
+            content (dict): optional keys 'links' (list of str) and 'lines' (list of str).
+
+            categories (list of str): Inherited categories, used as labels in the archive.
+
+        Returns:
+            int: number of text lines
+        """
+        if 'links' in content:
+            self.links[page] = content['links']
+        if not 'lines' in content:
+            return 0
+        
+        text = content['lines']
+        if hasattr(self,'archive_path'):
+            self.pages[page] = len(text)
+            self.saveText(page,text,categories)
+        else:
+            self.pages[page] = text
         return len(text)
     
+    @timed('extract_text')
     def extractText(self,page):
         """
-        Extracts plain text content from an article.
+        Extracts plain text content from an article: one line per paragraph, entities decoded, citation marks and
+        the sections in skip_sections removed (see setTextExtraction).
+
         Args:
-            page (str): Article name.
+            page (page object / str): Article or its html.
 
         Returns:
             list of lines (list)
         """
-        lines = []
-        res = re.findall('<p[^>]*>.*?</p>',page.text,flags= re.IGNORECASE | re.DOTALL)
-        for p in res:
-            p = re.sub('<.*?>','',p)
-            p = re.sub('\s+',' ',p,)
-            lines.append(p.strip())
-        return [lns for lns in lines if len(lns) > 3]
+        html = page if type(page) == str else page.text
+        return extractParagraphs(html,skip_sections=self.skip_sections,parser=self.text_parser)
     
+    @timed('save_text')
     def saveText(self,page,lines,categories):
         """
-        Save the extracted text lines with categories as labels in either txt-files or a zip-archive.
+        Save the extracted text lines with categories as labels in txt-files, a zip-archive or a paragraph store.
 
         Args:
             page (str): Name of article (used for file name).
@@ -439,50 +1766,261 @@ class KnowledgeNet(DynamicClass):
 
             categories (list of str): List of categories that are used as labels.
         """
-        title = hashlib.md5(page.encode()).hexdigest() # re.sub('[^a-z0-9_-]','~',page.replace(' ','_'),flags=re.IGNORECASE)
         skip_label = len(self.categry_label)+1
         short_categories = [cat[skip_label:] for cat in categories]
 
 
         direct_categories = [cat[skip_label:] for cat in self.article_categories[page]]
         #filter by wikipedia related labals (blacklist)
-        filtered_direct_categories = [cat for cat in direct_categories if not any([re.match(f"{rule}.*",cat) for rule in self.label_blacklist])]
+        blacklist = ruleSet(tuple(self.label_blacklist))
+        filtered_direct_categories = [cat for cat in direct_categories if len(blacklist.matches(cat)) == 0]
         print_lines = [', '.join(short_categories)]+[', '.join(filtered_direct_categories)]+lines
 
-        if re.match('.*?\.zip$',self.archive_path):
-            with zipfile.ZipFile(self.archive_path,'a',compression=zipfile.ZIP_DEFLATED) as zf:
-                zf.writestr(title+'.txt','\n'.join(print_lines)) 
-                
+        revid = self.revisions.get(page,0)
+        self.metrics.count('bytes_written',len('\n'.join(print_lines).encode()))
+        if type(self.archive_writer) == type(None):
+            with ArchiveWriter(self.archive_path,buffer_size=1,shard_articles=self.shard_articles,
+                               shard_mb=self.shard_mb,titles=self.articles) as writer:
+                writer.write(entryName(page),'\n'.join(print_lines),title=page,revid=revid)
         else:
-            file_path = os.path.join(self.archive_path, title)
-            with open(file_path+'.txt','w', encoding="utf-8") as fp:
-                for l,line in enumerate(print_lines):
-                    out = line+'\n' if l < len(print_lines)-1 else line
-                    fp.write(out)
+            self.archive_writer.write(entryName(page),'\n'.join(print_lines),title=page,revid=revid)
         
+    def corpus(self,categories=None,match_direct=False,workers=1):
+        """
+        Stream the collected articles from the archive as (title, categories, direct_categories, paragraphs) records.
+        See CorpusReader.
+
+        Args:
+            categories (list of str / None): Only read articles labeled with one of these categories.
+
+            match_direct (bool): Also use the direct categories of the articles for the filter.
+
+            workers (int): Number of processes decoding the archive.
+
+        Returns:
+            CorpusReader
+        """
+        self.flushArchive()
+        prefix = self.categry_label+':'
+        if categories:
+            categories = [c[len(prefix):] if c.startswith(prefix) else c for c in categories]
+        return CorpusReader(self.archive_path,titles=self.articles,categories=categories,
+                            match_direct=match_direct,workers=workers)
+
+    def manifest(self):
+        """
+        Index of the archive (title : file, shard, offset, size, revision). For archives written by older versions,
+        the index is created once from the md5 file names.
+
+        Returns:
+            ArchiveManifest
+        """
+        self.flushArchive()
+        manifest = ArchiveManifest(self.archive_path)
+        if not manifest.exists():
+            manifest.rebuild(self.articles.keys())
+        return manifest
+
     def collectMissed(self,links=True,text=True):
-        as_file = lambda x:'%s.txt'%re.sub('[^a-z0-9_-]','~',x.replace(' ','_'),flags=re.IGNORECASE)
-        have = [file.name for file in os.scandir(self.archive_path)]
-        is_missing = lambda a: as_file(a) not in have and a not in self.skipped_by_rule.keys()
+        """
+        Collect the text of all articles up to collected that are neither in the archive nor skipped by rules.
+        """
+        manifest = self.manifest()
+        is_missing = lambda a: not a in manifest and not a in self.skipped_by_rule.keys()
         missing = [a for a in list(self.articles.keys())[:self.collected] if is_missing(a)]
         print(len(missing))
 
-        for this_missing in missing:
-            page_obj,direct_cat = self.getPageAndCategories(this_missing)
-            label_cat = self.retrieveCategories(this_missing)
-            total_cat = set(direct_cat).union(label_cat)
-            if self.checkValid(this_missing,total_cat,[],[]):
-                self.collectArticle(this_missing,links=links,text=text,page_obj=page_obj,categories=label_cat)
-                print(f'collected {this_missing}')
+        self.openArchive()
+        try:
+            for this_missing in missing:
+                page_obj,direct_cat = self.getPageAndCategories(this_missing)
+                label_cat = self.retrieveCategories(this_missing)
+                total_cat = set(direct_cat).union(label_cat)
+                if self.checkValid(this_missing,total_cat,[],[]):
+                    if text:
+                        self.pages.pop(this_missing,None)
+                    self.collectArticle(this_missing,links=links,text=text,page_obj=page_obj,categories=label_cat)
+                    print(f'collected {this_missing}')
+        finally:
+            self.closeArchive()
+
+    def updateCollection(self,links=True,text=True,ignore=[],ignore_rules=[],since=None,assume_current=False,verbose=1):
+        """
+        Bring the collection up to date: only articles that were edited, deleted or newly added to a crawled category
+        are requested again. Article list, category-tree and archive are patched in place.
+
+        Args:
+            since (str / None): UTC timestamp (e.g. '2024-01-31T00:00:00Z'). The changed articles are taken from the
+                recent changes of Wikipedia (30 days), the new articles from the members that were added to the
+                crawled categories since then (one request per category). Default is the start of the last
+                collection. Without any timestamp or with a timestamp older than the recent changes, the revision
+                ids of all collected articles are compared (one request per 50 articles).
+
+            assume_current (bool): Articles that were collected before revision ids were saved are not re-collected,
+                only their current revision ids are saved.
+
+        Returns:
+            dict: lists of 'changed', 'new' and 'deleted' articles
+        """
+        self.newTask(verbose=verbose)
+        started = strftime('%Y-%m-%dT%H:%M:%SZ',gmtime())
+        api = self.api if not type(self.api) == type(None) else MediaWikiApi(self.language,api_url=self.api_url,
+                                                                             cache=self.cache,scheduler=self.scheduler)
+        since = since if since else self.last_update
+        collected = list(self.articles.keys())[:self.collected]
+        # looked up by removeArticle instead of searching the article list for every removed article
+        collected_titles = set(collected)
+        complete = self.collected >= len(self.articles)
+
+        new = []
+        if since:
+            oldest = strftime('%Y-%m-%dT%H:%M:%SZ',gmtime(time()-RECENT_CHANGES_DAYS*24*3600))
+            recent = api.recentChanges(max(since,oldest))
+            if since < oldest:
+                self.log('The recent changes only reach back to %s, comparing the revisions of all articles.'%oldest,
+                         level=0)
+                candidates = collected
+            else:
+                candidates = [a for a in collected if a in recent]
+            # articles added to the crawled categories, instead of all recently changed articles of the wiki
+            unknown = {}
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                for members in pool.map(lambda cat: api.newMembers(cat,since),list(self.closed_categories)):
+                    unknown.update((t,None) for t in members if not t in self.articles)
+            new = self._newArticles(api,unknown)
+        else:
+            candidates = collected
+        self.log('Checking revisions of %d articles.'%len(candidates),level=0)
+        current = {t:d['lastrevid'] for t,d in api.loadPages(candidates,['lastrevid'],cached=False).items()}
+        
+        deleted = [t for t in candidates if current[t] == 0]
+        changed = []
+        for t in candidates:
+            if current[t] == 0:
+                continue
+            if not t in self.revisions and assume_current:
+                self.revisions[t] = current[t]
+            elif not self.revisions.get(t) == current[t]:
+                changed.append(t)
+
+        if hasattr(self,'archive_path'):
+            self.removeFromArchive(changed+deleted)
+        for t in deleted:
+            self.removeArticle(t,collected_titles)
+            
+        start = time()
+        lnks = 0
+        txts = 0
+        skpd = 0
+        self.openArchive()
+        try:
+            for i,t in enumerate(changed):
+                for store in [self.pages,self.links,self.skipped_by_rule,self.skipped_by_category,self.skipped_by_problem]:
+                    store.pop(t,None)
+                try:
+                    page_obj,direct = self.fetchPageAndCategories(t)
+                    old_parents = self.category_tree.get(t,[])
+                    old_direct = set(self.article_categories.get(t,[]))
+                    parents = old_parents+[c for c in direct if c in self.closed_categories and not c in old_direct
+                                           and not c in old_parents]
+                    parents = [c for c in parents if not c in old_direct.difference(direct)]
+                    if not parents == old_parents:
+                        self.category_tree[t] = parents
+                        self.ancestors.invalidate()
+                        self.category_index.invalidate()
+                    if len(parents) == 0:
+                        self.removeArticle(t,collected_titles)
+                        deleted.append(t)
+                        continue
+                    inherited = self.retrieveCategories(t)
+                    result = {'categories':inherited,'direct':direct,'revid':self._revisionOf(page_obj),
+                              'skip':self.findSkipReasons(set(inherited).union(direct),ignore,ignore_rules)}
+                    if not any(result['skip']):
+                        result.update(self.fetchContent(t,page_obj=page_obj,links=links,text=text))
+                        if 'html' in result:
+                            result['lines'] = self.extractText(result.pop('html'))
+                    dn_lnk,dn_txt = self.storeResult(t,result)
+                    lnks += dn_lnk
+                    txts += dn_txt
+                except Exception as e:
+                    self.log(f"Exception while updating {t}: {e}")
+                    skpd += 1
+                if (i+1)%10 == 0 or i+1 == len(changed):
+                    self._progresBar(i,len(changed),start,lnks,txts,skpd,verbose)
+        finally:
+            self.closeArchive()
+            self.category_index.invalidate()
+        changed = [t for t in changed if not t in deleted]
+        
+        self.log('Updated %d changed articles, removed %d deleted articles, found %d new articles.'
+                 %(len(changed),len(deleted),len(new)),level=0)
+        self.last_update = started
+        if len(new) > 0:
+            if complete:
+                self.collect(links=links,text=text,ignore=ignore,ignore_rules=ignore_rules,verbose=verbose)
+            else:
+                self.log('The new articles are collected with the next call of collect().',level=0)
+        return {'changed':changed,'new':new,'deleted':deleted}
+
+    def _newArticles(self,api,titles):
+        """
+        Add articles that belong to crawled categories to the article list and the category-tree.
+        """
+        new = []
+        for title,data in api.loadPages(list(titles),['categories'],cached=False).items():
+            parents = [c for c in data['categories'] if c in self.closed_categories]
+            if data['pageid'] == 0 or len(parents) == 0:
+                continue
+            self.articles[title] = parents[0]
+            self.category_tree[title] = parents
+            new.append(title)
+        self.ancestors.invalidate()
+        self.category_index.invalidate()
+        return new
+
+    def removeArticle(self,article,collected=None):
+        """
+        Remove an article and everything collected from it (except the archive, see removeFromArchive).
+
+        Args:
+            collected (set / None): Titles of the collected articles, kept up to date when removing several articles
+                (default: the collected part of the article list is searched).
+        """
+        if type(collected) == type(None):
+            collected = set(list(self.articles.keys())[:self.collected])
+        if article in collected:
+            collected.discard(article)
+            self.collected -= 1
+        for store in [self.articles,self.category_tree,self.links,self.pages,self.article_categories,self.revisions,
+                      self.skipped_by_rule,self.skipped_by_category,self.skipped_by_problem]:
+            store.pop(article,None)
+        self.ancestors.invalidate()
+        self.category_index.invalidate()
+
+    def removeFromArchive(self,articles):
+        """
+        Delete the text files of articles from the archive. A zip archive is rewritten once without these entries.
+        """
+        names = set(entryName(a) for a in articles)
+        if len(names) > 0:
+            rewritten = removeEntries(self.archive_path,names)
+            manifest = ArchiveManifest(self.archive_path)
+            manifest.remove(articles)
+            manifest.refresh(rewritten)
 
     def resetCollection(self,ask_before_deleting=True):
         """
         Delete the files containing the text and categories. The article list and category-tree will be maintained.
         """
         self.collected = 0
-        self.links = {}
-        self.pages = {}
+        for name in ['links','pages']:
+            if isinstance(getattr(self,name,None),MappedStore):
+                getattr(self,name).clear()
+            else:
+                setattr(self,name,{})
         self.article_categories = {}
+        self.revisions = {}
+        self.last_update = None
         
         self.skipped_by_rule = {}
         self.skipped_by_category = {}
@@ -499,116 +2037,425 @@ class KnowledgeNet(DynamicClass):
                 ask_delelte = "y"
                  
             if ask_delelte == "y":
-                if os.path.isfile(self.archive_path):
-                    os.remove(self.archive_path)
-                elif os.path.isdir(self.archive_path):
-                    shutil.rmtree(self.archive_path)
+                deleteArchive(self.archive_path)
 
-    def printCategoryTree(self,max_lvl=None):
+    def categoryIndex(self):
         """
-        Print hierarchical tree of article categories up to level max_level.
+        Index of the children of all categories, built when the category-tree changed since the last call.
+        """
+        if type(self.category_index.children) == type(None):
+            self.category_index.build(self.category_tree,self.articles,self.categry_label)
+        return self.category_index
+
+    def categoryTreeLines(self,max_lvl=None,subtree=False):
+        """
+        Lines of the hierarchical tree of categories below the roots, generated one by one. Each category shows the
+        number of its subcategories (C) and articles (A). Categories that are reached on several paths are repeated,
+        cycles are cut.
 
         Args:
-            max_lvl (int): maximal level that is dispayed.
+            max_lvl (int / None): maximal level that is dispayed (None: all levels).
+
+            subtree (bool): Also show the number of all categories and articles below each category.
+
+        Yields:
+            str
         """
-        if type(max_lvl) == type(None):
-            max_lvl = max(self.articles.values())
+        index = self.categoryIndex()
+        label = f'{self.categry_label}:'
+        def line(cat,lvl):
+            cats,arts = index.counts(cat)
+            info = f'{cats} C ; {arts} A'
+            if subtree:
+                all_cats,all_arts = index.subtreeCounts(cat,self.ancestors)
+                info += f' ; total {all_cats} C ; {all_arts} A'
+            name = cat if lvl == 0 else ' '*4*lvl+cat.replace(label,'')
+            return f'{name} ({info})'
+
         for root in self.root:
-            cats = len([c for c,p in self.category_tree.items() if self.categry_label in c and root in p])
-            arts = len([c for c,p in self.category_tree.items() if root in p and c in self.articles.keys()])
-            print(f'{root} ({cats} C ; {arts} A)')
-            if max_lvl > 0:
-                self._printSubcats(root,0,max_lvl-2)
-        
-    def _printSubcats(self,cat,lvl,max_lvl):
-        subcats = [c for c,p in self.category_tree.items() if cat in p]
-        for ct in subcats:
-            if self.categry_label in ct:
-                indent = ' '*4*(lvl+1)
-                name = ct.replace(f'{self.categry_label}:','')
-                cats = len([c for c,p in self.category_tree.items() if self.categry_label in c and ct in p])
-                arts = len([c for c,p in self.category_tree.items() if ct in p and c in self.articles.keys()])
-                print(f'{indent}{name} ({cats} C ; {arts} A)')
-                if not lvl > max_lvl:
-                    self._printSubcats(ct,lvl+1,max_lvl)
+            yield line(root,0)
+            if not type(max_lvl) == type(None) and max_lvl < 1:
+                continue
+            path = [root]
+            stack = [iter(index.subcategories(root))]
+            while len(stack) > 0:
+                cat = next(stack[-1],None)
+                if type(cat) == type(None):
+                    stack.pop()
+                    path.pop()
+                    continue
+                if cat in path:
+                    continue
+                yield line(cat,len(stack))
+                if type(max_lvl) == type(None) or len(stack) < max_lvl:
+                    stack.append(iter(index.subcategories(cat)))
+                    path.append(cat)
+
+    def printCategoryTree(self,max_lvl=None,subtree=False,file=None):
+        """
+        Print hierarchical tree of article categories up to level max_level.
+
+        Args:
+            max_lvl (int / None): maximal level that is dispayed (None: all levels).
+
+            subtree (bool): Also show the number of all categories and articles below each category.
+
+            file (str / None): Write the tree to this text file instead of printing it.
+        """
+        lines = self.categoryTreeLines(max_lvl,subtree)
+        if type(file) == type(None):
+            for line in lines:
+                print(line)
+            return
+        with open(file,'w',encoding='utf-8') as fp:
+            for line in lines:
+                fp.write(line+'\n')
+
+    def exportCategoryTree(self,file_name,subtree=True):
+        """
+        Save the category-tree as json: the roots and for every category its subcategories, the number of its
+        articles and (with subtree) the number of all categories and articles below it.
+        """
+        index = self.categoryIndex()
+        categories = {}
+        for cat in self.category_tree:
+            if not index.isCategory(cat):
+                continue
+            entry = {'subcategories':index.subcategories(cat),'articles':index.counts(cat)[1]}
+            if subtree:
+                entry['total_categories'],entry['total_articles'] = index.subtreeCounts(cat,self.ancestors)
+            categories[cat] = entry
+        with open(file_name,'w',encoding='utf-8') as fp:
+            fp.write(json.dumps({'roots':list(self.root),'categories':categories}))
     
-    def retrieveCategories(self,article):
+    @timed('retrieve_categories')
+    def retrieveCategories(self,article,max_depth=None):
         """
         Collect all categories an article belongs to, including inhereted categories.
+        The ancestors of each category are computed once and cached until the category-tree changes.
 
         Args:
             artilce (str): name of article.
 
+            max_depth (int / None): Number of parent generations to follow (default: ancestor_depth, None = all).
+
         Returns:
             list of categories (str)
         """
-        ancestor_generation = set(self.category_tree[article])
-        ancestors = set([])
-        while len([a for a in ancestor_generation if not a == []]) > 0 and len(ancestors) < 100:
-            next_ancestor_generation = set([])
-            for parent in ancestor_generation:
-                next_ancestor_generation.update(self.category_tree[parent])
-            next_ancestor_generation.difference_update(ancestors)
-            ancestor_generation = next_ancestor_generation
-            ancestors.update(ancestor_generation)
-        return list(ancestors)
-  
+        if type(max_depth) == type(None):
+            max_depth = self.ancestor_depth
+        return self.ancestors.ancestors(self.category_tree,article,max_depth)
+
+    def linkGraph(self,path=None):
+        """
+        Link graph of the collected articles with integer ids and CSR adjacency (see WikiGraph.LinkGraph).
+
+        Args:
+            path (str / None): Directory to save the graph as .npy files, which LinkGraph.load(path) memory-maps
+                without loading the net.
+
+        Returns:
+            LinkGraph
+        """
+        from WikiGraph import LinkGraph
+        graph = LinkGraph.fromLinks(self.links)
+        if path:
+            graph.save(path)
+        return graph
 
-    def retrieveNetwork(self):
+    def retrieveNetwork(self,graph=None):
         """
         Counts how often other the remaining articles from the list point to the respective artilce. 
         In a second list, also articles that are not on the list are considered.
 
+        Args:
+            graph (LinkGraph / None): Graph to count on, default is the graph of self.links.
+
         Returns:
             inside (map): article from list : count of links to this artilce
 
             outside (map): artilce not from list : count of links to this artilce
         """
-        network = {}
-        outside = {}
-        for page,link_list in self.links.items():
-            for lnk in link_list:
-                if lnk in self.links.keys():
-                    if not lnk in network.keys():
-                        network[lnk] = 0
-                    network[lnk] += 1
-                else:
-                    if not lnk in outside.keys():
-                        outside[lnk] = 0
-                    outside[lnk] += 1
+        import numpy as np
+        graph = graph if not type(graph) == type(None) else self.linkGraph()
+        counts = graph.inDegree()
+        # most linked first, ties in the order of the first link to the article
+        order = np.lexsort((graph.firstLinked(),-counts))
+        order = order[counts[order] > 0]
+        inside = order[order < graph.n_inside]
+        outside = order[order >= graph.n_inside]
 
-        self.network = {p:c for p,c in sorted(network.items(),key=lambda x:-x[1])}
-        self.outside = {p:c for p,c in sorted(outside.items(),key=lambda x:-x[1]) if not '(identifier)' in p and not 'Wikipedia:' in p}
+        self.network = dict(zip(graph.titles(inside),counts[inside].tolist()))
+        self.outside = {p:c for p,c in zip(graph.titles(outside),counts[outside].tolist()) if not '(identifier)' in p and not 'Wikipedia:' in p}
         return self.network
+
+    def rankArticles(self,method='pagerank',top=None,graph=None):
+        """
+        Rank the collected articles by their links.
+
+        Args:
+            method (str): 'pagerank' (PageRank on the links between collected articles) or 'indegree' (number of links
+                from collected articles).
+
+            top (int / None): Number of returned articles.
+
+            graph (LinkGraph / None): Graph to rank, default is the graph of self.links.
+
+        Returns:
+            list of tuples: (article, score), highest first
+        """
+        graph = graph if not type(graph) == type(None) else self.linkGraph()
+        if method == 'pagerank':
+            scores = graph.pageRank()
+        elif method == 'indegree':
+            scores = graph.inDegree()[:graph.n_inside]
+        else:
+            raise Exception(f'Unknown ranking method {method}!')
+        return graph.ranking(scores,top=top)
     
     def printStatus(self,state=None,verbose=None):
         '''
-        Print status message and prepend log messages.
+        Show a status message below the log messages of the current task. The display shows the status at most every
+        few seconds (see setDisplay); without a state the pending output is shown at once.
         
         Args:
             state (str): message that is printed after log
-            
-            level (int): print log-level: 0 = none, 1 = only results or errors, 2 = include infos (e.g. skipped articles)
         '''
-        
-        clear_output(True)
-        for lg in self.logging[self.taskLogStart:]:
-            if lg['level'] < self.verbose:
-                print(lg['message'])
-        if not type(state) == type(None):
-            self.state = state
-            print(self.state)
+        if type(state) == type(None):
+            self.display.flush()
+            return
+        self.state = state
+        self.display.status(state)
         
     def log(self,message,level=1):
-        self.logging.append({'message':message,'level':level})
-        self.printStatus(self.state)
+        """
+        Add a message to the log and show it if its level is below verbose.
+
+        Args:
+            level (int): 0 = configuration and results, 1 = errors, 2 = infos (e.g. skipped articles)
+        """
+        if not type(self.log_level) == type(None) and level > self.log_level:
+            return
+        self.logging.append({'message':message,'level':level,'time':time()})
+        if level < self.verbose:
+            self.display.message(message,level)
         
     def newTask(self,verbose=1):
         self.verbose = verbose
         self.taskLogStart = len(self.logging)
+        self.display.newTask()
+
+    def setDisplay(self,mode='auto',interval=None,log_size=10000,log_level=None,logger='wikicrawler'):
+        """
+        Define how messages and progress are shown and how much of the log is kept.
+
+        Args:
+            mode (str): 'notebook' (redraw the cell), 'console' (print every message once, e.g. for batch jobs),
+                'logging' (forward to the standard logging module), 'none' or 'auto' (notebook in a Jupyter kernel,
+                otherwise console).
+
+            interval (float / None): Minimal time between two status updates in seconds (default depends on mode).
+
+            log_size (int / None): Number of the latest log messages that are kept (None keeps all).
+
+            log_level (int / None): Messages with a higher level are not kept (None keeps all levels).
+
+            logger (str): Name of the logger in mode 'logging'.
+        """
+        self.display = createDisplay(mode,interval,logger)
+        self.log_level = log_level
+        self.log_size = log_size
+        if isinstance(self.logging,LogBuffer) and not self.logging.capacity == log_size:
+            entries = list(self.logging)
+            dropped = len(self.logging)-len(entries)
+            self.logging = LogBuffer(entries,log_size)
+            self.logging.dropped += dropped
+        elif isinstance(self.logging,StoredLog):
+            # older entries are deleted from the state store by the next save
+            self.logging.capacity = log_size
         
-    def printProtocol(self,level=1):
+    def printProtocol(self,level=1,metrics=True):
         for lg in self.logging:
             if lg['level'] < level:
                 print(lg['message'])
-                
\ No newline at end of file
+        if metrics and len(self.metrics.timers) > 0:
+            print('\n'.join(self.metrics.summary()))
+
+    def setMetrics(self,jsonl_path=None,prometheus_path=None,interval=30,reset=True):
+        """
+        Export the metrics (time per stage, counters, request latencies) during collect.
+
+        Args:
+            jsonl_path (str / None): Append a json line with all metrics to this file.
+
+            prometheus_path (str / None): Keep the latest metrics in this file in the Prometheus text format.
+
+            interval (float): Minimal time between two exports in seconds.
+
+            reset (bool): Start with empty timers and counters.
+        """
+        sinks = []
+        if jsonl_path:
+            sinks.append(JsonLinesSink(jsonl_path))
+        if prometheus_path:
+            sinks.append(PrometheusSink(prometheus_path))
+        self.metrics.sinks = sinks
+        self.metrics.interval = interval
+        if reset:
+            self.metrics.reset()
+                
+
+
+class MultiLanguageNet(DynamicClass):
+    """
+    KnowledgeNets of several language editions in one object. All nets share one RequestScheduler (rate limit,
+    retries and pooled connections) and are crawled and collected concurrently, one thread per language. Articles can
+    be aligned across the languages with the interlanguage links of Wikipedia.
+
+    Args:
+        languages (list of str / None): Language editions, e.g. ['en','de'].
+
+        max_rps (float / None): Requests per second of all languages together.
+
+        batched (bool): Use the batched api backend (see KnowledgeNet.setBackend).
+
+        api_urls (dict / None): language : url of api.php, e.g. of a local MockWikiServer.
+    """
+    def __init__(self,languages=None,max_rps=None,batched=True,api_urls=None):
+        super().__init__()
+        self.metrics = Metrics()
+        self.scheduler = RequestScheduler(max_rps,metrics=self.metrics)
+        self.nets = {}
+        self.aligned = {}
+        self.timings = {}
+        for language in (languages if languages else []):
+            self.addLanguage(language,batched=batched,api_url=api_urls.get(language) if api_urls else None)
+
+    def addLanguage(self,language,batched=True,api_url=None):
+        """
+        Add a KnowledgeNet for a language edition that uses the shared scheduler.
+        """
+        net = KnowledgeNet(None)
+        net.language = language
+        net.scheduler = self.scheduler
+        net.metrics = self.metrics
+        if batched:
+            net.setBackend(True,api_url=api_url)
+        net.initWiki()
+        self.nets[language] = net
+        self.timings[language] = {}
+        return net
+
+    def afterLoad(self):
+        self.scheduler.metrics = self.metrics
+        for net in self.nets.values():
+            net.scheduler = self.scheduler
+            net.metrics = self.metrics
+            net.afterLoad()
+
+    def __getitem__(self,language):
+        return self.nets[language]
+
+    def run(self,action,arguments):
+        """
+        Call a method of the nets concurrently.
+
+        Args:
+            action (str): Name of the KnowledgeNet method.
+
+            arguments (dict): language : dict of keyword arguments. Only these languages are run.
+
+        Returns:
+            dict: language : result
+        """
+        def call(language):
+            start = time()
+            try:
+                return getattr(self.nets[language],action)(**arguments[language])
+            finally:
+                self.timings[language][action] = self.timings[language].get(action,0)+time()-start
+
+        with ThreadPoolExecutor(max_workers=max(1,len(arguments))) as pool:
+            return dict(zip(arguments.keys(),pool.map(call,arguments.keys())))
+
+    def startScan(self,roots,depth=3,skip_rules=[],verbose=0):
+        """
+        Crawl the category trees of all languages concurrently.
+
+        Args:
+            roots (dict): language : root category (e.g. {'en':'Category:Physics','de':'Kategorie:Physik'}).
+        """
+        return self.run('startScan',{language:dict(start_at=root,depth=depth,skip_rules=skip_rules,verbose=verbose)
+                                     for language,root in roots.items()})
+
+    def collect(self,archive_paths=None,languages=None,**kwargs):
+        """
+        Collect the articles of all languages concurrently (keyword arguments as in KnowledgeNet.collect).
+
+        Args:
+            archive_paths (dict / None): language : archive path, one archive per language.
+
+            languages (list of str / None): Only collect these languages.
+        """
+        languages = languages if languages else list(self.nets.keys())
+        arguments = {}
+        for language in languages:
+            arguments[language] = dict(kwargs)
+            if archive_paths and language in archive_paths:
+                arguments[language]['archive_path'] = archive_paths[language]
+        return self.run('collect',arguments)
+
+    def alignArticles(self,source,targets=None):
+        """
+        Request the interlanguage links of the articles of one language and keep them in self.aligned[source]
+        (article : {language : title}).
+
+        Args:
+            source (str): Language of the articles.
+
+            targets (list of str / None): Keep links to these languages, default are the other languages of the net.
+
+        Returns:
+            dict: target language : number of aligned articles that are also in the net of the target language
+        """
+        targets = targets if targets else [language for language in self.nets if not language == source]
+        net = self.nets[source]
+        api = net.api if not type(net.api) == type(None) else MediaWikiApi(source,api_url=net.api_url,
+                                                                           scheduler=self.scheduler)
+        start = time()
+        loaded = api.loadPages(list(net.articles.keys()),['langlinks'])
+        self.timings[source]['alignArticles'] = self.timings[source].get('alignArticles',0)+time()-start
+        aligned = self.aligned.setdefault(source,{})
+        for title,data in loaded.items():
+            links = {language:other for language,other in data['langlinks'].items() if language in targets}
+            if len(links) > 0:
+                aligned[title] = links
+        return {language:sum(1 for links in aligned.values() if language in links and language in self.nets
+                             and links[language] in self.nets[language].articles) for language in targets}
+
+    def parallelArticles(self,source,target):
+        """
+        Pairs of articles (source title, target title) that are in the nets of both languages.
+        """
+        articles = self.nets[target].articles
+        return [(title,links[target]) for title,links in self.aligned.get(source,{}).items()
+                if target in links and links[target] in articles]
+
+    def stats(self):
+        """
+        Articles, requests and throughput per language.
+
+        Returns:
+            dict: language : counters
+        """
+        endpoints = self.scheduler.stats()['endpoints']
+        stats = {}
+        for language,net in self.nets.items():
+            url = net.api.api_url if not type(net.api) == type(None) else 'https://%s.wikipedia.org/w/api.php'%language
+            requests = endpoints.get(url,{'requests':0,'succeeded':0,'bytes':0})
+            seconds = sum(self.timings[language].values())
+            stats[language] = {'articles':len(net.articles),'categories':len(net.closed_categories),
+                               'collected':net.collected,'requests':requests['requests'],'bytes':requests['bytes'],
+                               'seconds':round(seconds,3),
+                               'requests/s':requests['succeeded']/seconds if seconds > 0 else 0.0}
+        return stats
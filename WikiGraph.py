@@ -0,0 +1,153 @@
+import os
+import json
+import numpy as np
+
+
+class LinkGraph:
+    """
+    Link graph of the collected articles with integer ids and CSR adjacency. The articles with links (the sources)
+    get the ids 0..n_inside-1 in the order of the links map, link targets that are not collected get the following
+    ids in the order they first occur. The links of source i are indices[indptr[i]:indptr[i+1]].
+
+    Titles are kept as one utf-8 byte array with offsets, so that a saved graph can be memory-mapped without
+    building Python strings for all nodes.
+
+    Args:
+        indptr (array of int64): Offsets of the links of each source (length n_inside+1).
+
+        indices (array of int32/int64): Link targets.
+
+        title_bytes (array of uint8): Concatenated utf-8 titles of all nodes.
+
+        title_offsets (array of int64): Offsets of the titles in title_bytes (length n+1).
+    """
+    files = ['indptr','indices','title_bytes','title_offsets']
+
+    def __init__(self,indptr,indices,title_bytes,title_offsets):
+        self.indptr = indptr
+        self.indices = indices
+        self.title_bytes = title_bytes
+        self.title_offsets = title_offsets
+        self.n_inside = len(indptr)-1
+        self.n = len(title_offsets)-1
+        self._ids = None
+        self._title_data = None
+
+    @staticmethod
+    def fromLinks(links):
+        """
+        Build the graph from a map article : list of linked titles in one pass.
+        """
+        ids = {title:i for i,title in enumerate(links.keys())}
+        n_inside = len(ids)
+        indptr = np.zeros(n_inside+1,dtype=np.int64)
+        targets = []
+        intern = ids.setdefault
+        for i,link_list in enumerate(links.values()):
+            targets.extend([intern(lnk,len(ids)) for lnk in link_list])
+            indptr[i+1] = len(targets)
+        dtype = np.int32 if len(ids) < 2**31 else np.int64
+        encoded = [title.encode() for title in ids]
+        title_offsets = np.zeros(len(encoded)+1,dtype=np.int64)
+        np.cumsum([len(e) for e in encoded],out=title_offsets[1:])
+        title_bytes = np.frombuffer(b''.join(encoded),dtype=np.uint8)
+        graph = LinkGraph(indptr,np.array(targets,dtype=dtype),title_bytes,title_offsets)
+        graph._ids = ids
+        return graph
+
+    def save(self,path):
+        """
+        Save the arrays as .npy files in the directory path.
+        """
+        os.makedirs(path,exist_ok=True)
+        for name in self.files:
+            np.save(os.path.join(path,name+'.npy'),getattr(self,name))
+        with open(os.path.join(path,'graph.json'),'w') as fp:
+            json.dump({'nodes':int(self.n),'inside':int(self.n_inside),'edges':int(len(self.indices))},fp)
+
+    @staticmethod
+    def load(path,mmap=True):
+        """
+        Load a saved graph. With mmap, the arrays are memory-mapped and only read when they are used.
+        """
+        arrays = [np.load(os.path.join(path,name+'.npy'),mmap_mode='r' if mmap else None) for name in LinkGraph.files]
+        return LinkGraph(*arrays)
+
+    def _titleData(self):
+        if type(self._title_data) == type(None):
+            self._title_data = self.title_bytes.tobytes()
+        return self._title_data
+
+    def title(self,i):
+        return self._titleData()[self.title_offsets[i]:self.title_offsets[i+1]].decode()
+
+    def titles(self,ids=None):
+        ids = np.arange(self.n) if type(ids) == type(None) else np.asarray(ids,dtype=np.int64)
+        data = self._titleData()
+        return [data[start:end].decode() for start,end in zip(self.title_offsets[ids].tolist(),
+                                                               self.title_offsets[ids+1].tolist())]
+
+    def id(self,title):
+        if type(self._ids) == type(None):
+            self._ids = {t:i for i,t in enumerate(self.titles())}
+        return self._ids[title]
+
+    def links(self,title):
+        i = self.id(title)
+        if i >= self.n_inside:
+            return []
+        return self.titles(self.indices[self.indptr[i]:self.indptr[i+1]])
+
+    def inDegree(self):
+        """
+        Number of links to each node.
+        """
+        return np.bincount(self.indices,minlength=self.n)
+
+    def outDegree(self):
+        return np.diff(self.indptr)
+
+    def firstLinked(self):
+        """
+        Position of the first link to each node in the link order (n_edges for nodes without links to them).
+        """
+        first = np.full(self.n,len(self.indices),dtype=np.int64)
+        targets,positions = np.unique(self.indices,return_index=True)
+        first[targets] = positions
+        return first
+
+    def pageRank(self,damping=0.85,tol=1e-8,max_iter=100):
+        """
+        PageRank of the collected articles on the links between them (power iteration). Links to articles that are not
+        collected are ignored; the rank of articles without such links is distributed over all articles.
+
+        Returns:
+            array of float: rank of node 0..n_inside-1 (sums up to 1)
+        """
+        n = self.n_inside
+        if n == 0:
+            return np.zeros(0)
+        sources = np.repeat(np.arange(n),self.outDegree())
+        inside = self.indices < n
+        sources,targets = sources[inside],np.asarray(self.indices[inside])
+        out_degree = np.bincount(sources,minlength=n).astype(float)
+        dangling = out_degree == 0
+        weights = np.divide(1.0,out_degree,out=np.zeros(n),where=~dangling)
+        rank = np.full(n,1.0/n)
+        for _ in range(max_iter):
+            spread = np.bincount(targets,weights=(rank*weights)[sources],minlength=n)
+            new = (1-damping)/n+damping*(spread+rank[dangling].sum()/n)
+            delta = np.abs(new-rank).sum()
+            rank = new
+            if delta < tol:
+                break
+        return rank
+
+    def ranking(self,scores,top=None):
+        """
+        Titles with scores, highest first.
+        """
+        order = np.argsort(-scores,kind='stable')
+        if top:
+            order = order[:top]
+        return [(self.title(i),scores[i].item()) for i in order]
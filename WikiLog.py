@@ -0,0 +1,213 @@
+import sys
+import logging
+from time import time
+from collections import deque
+
+
+class LogBuffer:
+    """
+    Ring buffer for the log messages of a KnowledgeNet: keeps the latest capacity entries, older entries are dropped.
+    Indices count all entries ever appended, so that positions like the start of a task stay valid after entries
+    were dropped; dropped entries are left out of slices.
+
+    Args:
+        entries (list): Initial entries (e.g. the log list of an older version).
+
+        capacity (int / None): Maximal number of entries kept, None keeps all.
+    """
+    def __init__(self,entries=(),capacity=10000):
+        self.entries = deque(entries,maxlen=capacity)
+        self.dropped = max(0,len(entries)-capacity) if capacity else 0
+
+    @property
+    def capacity(self):
+        return self.entries.maxlen
+
+    def append(self,entry):
+        if self.entries.maxlen and len(self.entries) == self.entries.maxlen:
+            self.dropped += 1
+        self.entries.append(entry)
+
+    def __len__(self):
+        return self.dropped+len(self.entries)
+
+    def __getitem__(self,index):
+        if type(index) == slice:
+            start,stop,step = index.indices(len(self))
+            start,stop = max(0,start-self.dropped),max(0,stop-self.dropped)
+            return list(self.entries)[start:stop:step]
+        if index < 0:
+            index += len(self)
+        if index < self.dropped or index >= len(self):
+            raise IndexError('log index out of range')
+        return self.entries[index-self.dropped]
+
+    def __iter__(self):
+        return iter(list(self.entries))
+
+
+def inNotebook():
+    """
+    True when running in a Jupyter kernel (without importing IPython if it is not loaded yet).
+    """
+    ipython = sys.modules.get('IPython')
+    if type(ipython) == type(None):
+        return False
+    shell = ipython.get_ipython()
+    return not type(shell) == type(None) and 'IPKernelApp' in shell.config
+
+
+class NotebookDisplay:
+    """
+    Output in a notebook cell: the messages of the current task and the status below them. The cell is cleared and
+    redrawn at most every interval seconds instead of on every message.
+
+    Args:
+        interval (float): Minimal time between two redraws in seconds.
+
+        max_lines (int): Number of the latest messages that are shown.
+    """
+    def __init__(self,interval=0.5,max_lines=1000):
+        self.interval = interval
+        self.max_lines = max_lines
+        self.newTask()
+
+    def __getstate__(self):
+        return {'interval':self.interval,'max_lines':self.max_lines}
+
+    def __setstate__(self,state):
+        self.__init__(**state)
+
+    def newTask(self):
+        self.lines = deque(maxlen=self.max_lines)
+        self.state = None
+        self.drawn = 0
+
+    def message(self,message,level):
+        self.lines.append(message)
+        self.draw()
+
+    def status(self,state):
+        self.state = state
+        self.draw()
+
+    def draw(self,force=False):
+        if not force and time()-self.drawn < self.interval:
+            return
+        from IPython.display import clear_output
+        self.drawn = time()
+        clear_output(True)
+        for line in self.lines:
+            print(line)
+        if not type(self.state) == type(None):
+            print(self.state)
+
+    def flush(self):
+        self.draw(force=True)
+
+
+class ConsoleDisplay:
+    """
+    Output for terminals and batch jobs: every message is printed once when it is logged, the status (e.g. the
+    progress of collect) is printed at most every interval seconds.
+
+    Args:
+        interval (float): Minimal time between two status lines in seconds.
+
+        stream (file / None): Output stream, default is sys.stdout.
+    """
+    def __init__(self,interval=5,stream=None):
+        self.interval = interval
+        self.stream = stream
+        self.newTask()
+
+    def __getstate__(self):
+        return {'interval':self.interval}
+
+    def __setstate__(self,state):
+        self.__init__(**state)
+
+    def newTask(self):
+        self.state = None
+        self.shown = 0
+        self.pending = False
+
+    def write(self,text):
+        stream = self.stream if not type(self.stream) == type(None) else sys.stdout
+        stream.write(text+'\n')
+        stream.flush()
+
+    def message(self,message,level):
+        self.write(message)
+
+    def status(self,state):
+        self.state = state
+        self.pending = True
+        if time()-self.shown >= self.interval:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.shown = time()
+            self.pending = False
+            self.write(self.state)
+
+
+class LoggingDisplay(ConsoleDisplay):
+    """
+    Forward the messages to a logger of the standard logging module. Log level 0 of the net is logged as INFO,
+    level 1 as INFO-5 and level 2 and higher as DEBUG; status messages are logged as INFO at most every interval
+    seconds.
+
+    Args:
+        logger (str): Name of the logger.
+
+        interval (float): Minimal time between two status messages in seconds.
+    """
+    def __init__(self,logger='wikicrawler',interval=30):
+        self.logger = logger
+        super().__init__(interval)
+
+    def __getstate__(self):
+        return {'logger':self.logger,'interval':self.interval}
+
+    def message(self,message,level):
+        logging.getLogger(self.logger).log(max(logging.DEBUG,logging.INFO-5*level),message)
+
+    def write(self,text):
+        logging.getLogger(self.logger).info(text)
+
+
+class SilentDisplay:
+    """
+    No output, the messages are only kept in the log.
+    """
+    def newTask(self):
+        pass
+
+    def message(self,message,level):
+        pass
+
+    def status(self,state):
+        pass
+
+    def flush(self):
+        pass
+
+
+def createDisplay(mode='auto',interval=None,logger='wikicrawler'):
+    """
+    Display for a mode: 'notebook', 'console', 'logging', 'none' or 'auto' (notebook in a Jupyter kernel, otherwise
+    console).
+    """
+    if mode == 'auto':
+        mode = 'notebook' if inNotebook() else 'console'
+    if mode == 'notebook':
+        return NotebookDisplay() if type(interval) == type(None) else NotebookDisplay(interval)
+    if mode == 'console':
+        return ConsoleDisplay() if type(interval) == type(None) else ConsoleDisplay(interval)
+    if mode == 'logging':
+        return LoggingDisplay(logger) if type(interval) == type(None) else LoggingDisplay(logger,interval)
+    if mode == 'none':
+        return SilentDisplay()
+    raise Exception(f'Unknown display mode {mode}!')
@@ -0,0 +1,179 @@
+import os
+import json
+from time import time,perf_counter
+from threading import Lock
+from contextlib import contextmanager
+from functools import wraps
+
+
+# upper bounds of the histogram buckets in seconds
+LATENCY_BUCKETS = (0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,float('inf'))
+
+
+class Metrics:
+    """
+    Thread-safe timers, counters and histograms of a crawl. Timers sum up the busy time of each stage over all
+    threads, histograms count observations (e.g. request latencies) per label in LATENCY_BUCKETS.
+    Snapshots are exported to sinks (see JsonLinesSink, PrometheusSink) at most every interval seconds.
+
+    Args:
+        sinks (list): Objects with a write(snapshot) method.
+
+        interval (float): Minimal time between two exports in seconds.
+    """
+    def __init__(self,sinks=None,interval=30):
+        self.sinks = list(sinks) if sinks else []
+        self.interval = interval
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time()
+            self.timers = {}
+            self.counters = {}
+            self.histograms = {}
+            self._exported = 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self,state):
+        self.__dict__.update(state)
+        self._lock = Lock()
+
+    def add(self,stage,seconds):
+        with self._lock:
+            timer = self.timers.setdefault(stage,[0,0.0])
+            timer[0] += 1
+            timer[1] += seconds
+
+    @contextmanager
+    def timer(self,stage):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage,perf_counter()-start)
+
+    def count(self,name,n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name,0)+n
+
+    def observe(self,name,value,label=''):
+        with self._lock:
+            histogram = self.histograms.setdefault((name,label),[0]*len(LATENCY_BUCKETS)+[0.0])
+            for i,bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    histogram[i] += 1
+                    break
+            histogram[-1] += value
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: time, elapsed seconds, timers (stage : calls, seconds), counters and histograms
+                (name : label : bucket counts, sum)
+        """
+        with self._lock:
+            histograms = {}
+            for (name,label),values in self.histograms.items():
+                histograms.setdefault(name,{})[label] = {'buckets':values[:-1],'sum':values[-1]}
+            return {'time':time(),'elapsed':time()-self.started,
+                    'timers':{stage:{'calls':calls,'seconds':seconds} for stage,(calls,seconds) in self.timers.items()},
+                    'counters':dict(self.counters),'histograms':histograms}
+
+    def export(self,force=False):
+        """
+        Write a snapshot to all sinks if interval seconds passed since the last export.
+        """
+        if len(self.sinks) == 0 or (not force and time()-self._exported < self.interval):
+            return
+        self._exported = time()
+        snapshot = self.snapshot()
+        for sink in self.sinks:
+            sink.write(snapshot)
+
+    def summary(self):
+        """
+        Lines of text with the time per stage, counters and mean latencies.
+        """
+        snapshot = self.snapshot()
+        lines = ['Metrics after %.1f s:'%snapshot['elapsed']]
+        for stage,timer in sorted(snapshot['timers'].items(),key=lambda x:-x[1]['seconds']):
+            lines.append('  %-22s %8d calls %10.3f s %10.2f ms/call'%(stage,timer['calls'],timer['seconds'],
+                                                                     1000*timer['seconds']/max(1,timer['calls'])))
+        for name,value in sorted(snapshot['counters'].items()):
+            lines.append('  %-22s %8d'%(name,value))
+        for name,labels in snapshot['histograms'].items():
+            for label,histogram in sorted(labels.items()):
+                n = sum(histogram['buckets'])
+                lines.append('  %-22s %8d obs. %10.2f ms mean  %s'%(name,n,1000*histogram['sum']/max(1,n),label))
+        return lines
+
+
+def timed(stage):
+    """
+    Add the time of a method of a KnowledgeNet to the timer stage of its metrics.
+    """
+    def inner(function):
+        @wraps(function)
+        def wrapped_function(self,*args,**kwargs):
+            start = perf_counter()
+            try:
+                return function(self,*args,**kwargs)
+            finally:
+                self.metrics.add(stage,perf_counter()-start)
+        return wrapped_function
+    return inner
+
+
+class JsonLinesSink:
+    """
+    Append each snapshot as one json line to a file.
+    """
+    def __init__(self,path):
+        self.path = path
+
+    def write(self,snapshot):
+        with open(self.path,'a',encoding='utf-8') as fp:
+            fp.write(json.dumps(snapshot)+'\n')
+
+
+class PrometheusSink:
+    """
+    Write the latest snapshot in the Prometheus text format to a file (e.g. for the textfile collector of the node
+    exporter).
+
+    Args:
+        path (str): File name, should end with .prom.
+
+        prefix (str): Prefix of the metric names.
+    """
+    def __init__(self,path,prefix='wikicrawler'):
+        self.path = path
+        self.prefix = prefix
+
+    def write(self,snapshot):
+        p = self.prefix
+        lines = ['# TYPE %s_stage_seconds_total counter'%p]
+        lines += ['%s_stage_seconds_total{stage="%s"} %f'%(p,stage,t['seconds']) for stage,t in snapshot['timers'].items()]
+        lines += ['# TYPE %s_stage_calls_total counter'%p]
+        lines += ['%s_stage_calls_total{stage="%s"} %d'%(p,stage,t['calls']) for stage,t in snapshot['timers'].items()]
+        for name,value in snapshot['counters'].items():
+            lines += ['# TYPE %s_%s_total counter'%(p,name),'%s_%s_total %d'%(p,name,value)]
+        for name,labels in snapshot['histograms'].items():
+            lines.append('# TYPE %s_%s histogram'%(p,name))
+            for label,histogram in labels.items():
+                cumulative = 0
+                for bound,n in zip(LATENCY_BUCKETS,histogram['buckets']):
+                    cumulative += n
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append('%s_%s_bucket{kind="%s",le="%s"} %d'%(p,name,label,le,cumulative))
+                lines.append('%s_%s_sum{kind="%s"} %f'%(p,name,label,histogram['sum']))
+                lines.append('%s_%s_count{kind="%s"} %d'%(p,name,label,cumulative))
+        with open(self.path+'.tmp','w',encoding='utf-8') as fp:
+            fp.write('\n'.join(lines)+'\n')
+        os.replace(self.path+'.tmp',self.path)
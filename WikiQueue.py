@@ -0,0 +1,338 @@
+import os
+import random
+import socket
+import sqlite3
+import dill as pkl
+from time import time
+from threading import Lock
+
+
+class TaskFailed(Exception):
+    """
+    Result of a task whose lease expired max_attempts times (e.g. because the workers crashed).
+    """
+    pass
+
+
+def workerName():
+    return '%s-%d'%(socket.gethostname(),os.getpid())
+
+
+class Lease:
+    """
+    A task handed out to a worker until expires. Only the holder of the current token can complete it: when the lease
+    expired and the task was handed out again, the result of the former holder is dropped.
+    """
+    def __init__(self,queue,task,job,seq,kind,payload,token,expires):
+        self.queue = queue
+        self.task = task
+        self.job = job
+        self.seq = seq
+        self.kind = kind
+        self.payload = payload
+        self.token = token
+        self.expires = expires
+
+    def renew(self,seconds):
+        """
+        Extend the lease by seconds from now.
+
+        Returns:
+            bool: False if the lease was lost
+        """
+        return self.queue.renew(self,seconds)
+
+    def complete(self,result):
+        """
+        Returns:
+            bool: False if the lease was lost and the result was dropped
+        """
+        return self.queue.complete(self,result)
+
+
+class SqliteQueue:
+    """
+    Lease queue in a sqlite file, for workers on one host or on hosts sharing a disk with working file locks.
+    A job is a list of tasks that are leased one by one. Leases that are not completed in time are handed out again;
+    after max_attempts expired leases the task fails with TaskFailed.
+
+    Args:
+        path (str): File name of the database.
+
+        max_attempts (int): Leases of a task before it fails.
+    """
+    def __init__(self,path,max_attempts=3):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._lock = Lock()
+        self.db = sqlite3.connect(path,timeout=60,isolation_level=None,check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS tasks (id INTEGER PRIMARY KEY AUTOINCREMENT, job TEXT, seq INTEGER, '
+                        'kind TEXT, payload BLOB, state INTEGER DEFAULT 0, worker TEXT, token INTEGER, expires REAL, '
+                        'attempts INTEGER DEFAULT 0, result BLOB, UNIQUE(job,seq))')
+        self.db.execute('CREATE INDEX IF NOT EXISTS task_state ON tasks (state,id)')
+
+    # task states
+    OPEN,LEASED,DONE = 0,1,2
+
+    def __getstate__(self):
+        return {'path':self.path,'max_attempts':self.max_attempts}
+
+    def __setstate__(self,state):
+        self.__init__(**state)
+
+    def submit(self,job,kind,payloads):
+        """
+        Add the tasks of a job. Submitting a job again (e.g. after a restart of the coordinator) keeps the tasks and
+        results that already exist.
+
+        Returns:
+            int: number of tasks of the job
+        """
+        with self._lock:
+            self.db.execute('BEGIN IMMEDIATE')
+            self.db.executemany('INSERT OR IGNORE INTO tasks (job,seq,kind,payload) VALUES (?,?,?,?)',
+                                ((job,seq,kind,pkl.dumps(payload)) for seq,payload in enumerate(payloads)))
+            self.db.execute('COMMIT')
+        return len(payloads)
+
+    def _expire(self,now):
+        expired = self.db.execute('SELECT id,attempts FROM tasks WHERE state=? AND expires<?',(self.LEASED,now)).fetchall()
+        for task,attempts in expired:
+            if attempts >= self.max_attempts:
+                error = TaskFailed('Lease expired %d times'%attempts)
+                self.db.execute('UPDATE tasks SET state=?,result=? WHERE id=?',(self.DONE,pkl.dumps(error),task))
+            else:
+                self.db.execute('UPDATE tasks SET state=? WHERE id=?',(self.OPEN,task))
+
+    def lease(self,worker=None,seconds=600):
+        """
+        Hand out the next open task (expired leases are opened again first).
+
+        Returns:
+            Lease / None: None if no task is open
+        """
+        now = time()
+        with self._lock:
+            self.db.execute('BEGIN IMMEDIATE')
+            try:
+                self._expire(now)
+                row = self.db.execute('SELECT id,job,seq,kind,payload FROM tasks WHERE state=? ORDER BY id LIMIT 1',
+                                      (self.OPEN,)).fetchone()
+                if type(row) == type(None):
+                    return None
+                token = random.getrandbits(62)
+                self.db.execute('UPDATE tasks SET state=?,worker=?,token=?,expires=?,attempts=attempts+1 WHERE id=?',
+                                (self.LEASED,worker if worker else workerName(),token,now+seconds,row[0]))
+            finally:
+                self.db.execute('COMMIT')
+        task,job,seq,kind,payload = row
+        return Lease(self,task,job,seq,kind,pkl.loads(payload),token,now+seconds)
+
+    def renew(self,lease,seconds):
+        expires = time()+seconds
+        with self._lock:
+            renewed = self.db.execute('UPDATE tasks SET expires=? WHERE id=? AND state=? AND token=?',
+                                      (expires,lease.task,self.LEASED,lease.token)).rowcount == 1
+        if renewed:
+            lease.expires = expires
+        return renewed
+
+    def complete(self,lease,result):
+        with self._lock:
+            return self.db.execute('UPDATE tasks SET state=?,result=? WHERE id=? AND state=? AND token=?',
+                                   (self.DONE,pkl.dumps(result),lease.task,self.LEASED,lease.token)).rowcount == 1
+
+    def results(self,job,skip=()):
+        """
+        Results of the finished tasks of a job.
+
+        Args:
+            skip (iterable of int): Tasks (seq) whose results are not read again.
+
+        Returns:
+            dict: seq : result
+        """
+        with self._lock:
+            self.db.execute('BEGIN IMMEDIATE')
+            self._expire(time())
+            self.db.execute('COMMIT')
+            done = [row[0] for row in self.db.execute('SELECT seq FROM tasks WHERE job=? AND state=?',(job,self.DONE))]
+            rows = [self.db.execute('SELECT seq,result FROM tasks WHERE job=? AND seq=?',(job,seq)).fetchone()
+                    for seq in done if not seq in skip]
+        return {seq:pkl.loads(result) for seq,result in rows}
+
+    def progress(self,job):
+        """
+        Returns:
+            dict: 'open', 'leased', 'done' : number of tasks
+        """
+        with self._lock:
+            rows = self.db.execute('SELECT state,COUNT(*) FROM tasks WHERE job=? GROUP BY state',(job,)).fetchall()
+        counts = dict(rows)
+        return {'open':counts.get(self.OPEN,0),'leased':counts.get(self.LEASED,0),'done':counts.get(self.DONE,0)}
+
+    def remove(self,job):
+        with self._lock:
+            self.db.execute('DELETE FROM tasks WHERE job=?',(job,))
+
+    def close(self):
+        self.db.close()
+
+
+class FileQueue:
+    """
+    Lease queue in a directory, for workers on hosts that share a file system with atomic renames (e.g. NFS).
+    Every task is a file that moves from open/ to leased/ to done/ by renaming; the name of a leased file holds the
+    token and the expiry of the lease, so that any worker or the coordinator can open expired leases again.
+
+    Args:
+        path (str): Directory of the queue.
+
+        max_attempts (int): Leases of a task before it fails.
+    """
+    def __init__(self,path,max_attempts=3):
+        self.path = path
+        self.max_attempts = max_attempts
+        os.makedirs(path,exist_ok=True)
+
+    def _folder(self,job,state):
+        return os.path.join(self.path,job,state)
+
+    @staticmethod
+    def _write(file_name,value):
+        with open(file_name+'.tmp','wb') as fp:
+            pkl.dump(value,fp)
+        os.replace(file_name+'.tmp',file_name)
+
+    @staticmethod
+    def _read(file_name):
+        with open(file_name,'rb') as fp:
+            return pkl.load(fp)
+
+    def jobs(self):
+        return sorted(job for job in os.listdir(self.path)
+                      if not job.startswith('.') and os.path.isdir(os.path.join(self.path,job)))
+
+    def submit(self,job,kind,payloads):
+        """
+        Add the tasks of a job (see SqliteQueue.submit).
+        """
+        staging = os.path.join(self.path,'.'+job)
+        if os.path.exists(os.path.join(self.path,job)):
+            return len(payloads)
+        os.makedirs(staging,exist_ok=True)
+        for state in ['open','leased','done']:
+            os.makedirs(os.path.join(staging,state),exist_ok=True)
+        for seq,payload in enumerate(payloads):
+            self._write(os.path.join(staging,'open','%08d~0'%seq),(kind,payload))
+        try:
+            os.rename(staging,os.path.join(self.path,job))
+        except OSError:
+            pass
+        return len(payloads)
+
+    def _expire(self,job,now):
+        for name in os.listdir(self._folder(job,'leased')):
+            seq,attempts,token,expires = name.split('~')
+            if float(expires) >= now:
+                continue
+            leased = os.path.join(self._folder(job,'leased'),name)
+            attempts = int(attempts)+1
+            try:
+                if attempts >= self.max_attempts:
+                    failed = os.path.join(self._folder(job,'done'),'%s.failed'%seq)
+                    os.rename(leased,failed)
+                    self._write(os.path.join(self._folder(job,'done'),'%s.result'%seq),
+                                TaskFailed('Lease expired %d times'%attempts))
+                else:
+                    os.rename(leased,os.path.join(self._folder(job,'open'),'%s~%d'%(seq,attempts)))
+            except FileNotFoundError:
+                pass
+
+    def lease(self,worker=None,seconds=600):
+        """
+        Hand out the next open task (see SqliteQueue.lease).
+        """
+        now = time()
+        for job in self.jobs():
+            try:
+                self._expire(job,now)
+                names = sorted(os.listdir(self._folder(job,'open')))
+            except FileNotFoundError:
+                # the job was removed meanwhile
+                continue
+            for name in names:
+                if name.endswith('.tmp'):
+                    continue
+                seq,attempts = name.split('~')
+                token = random.getrandbits(62)
+                leased = os.path.join(self._folder(job,'leased'),'%s~%s~%d~%f'%(seq,attempts,token,now+seconds))
+                try:
+                    os.rename(os.path.join(self._folder(job,'open'),name),leased)
+                except FileNotFoundError:
+                    continue
+                kind,payload = self._read(leased)
+                return Lease(self,leased,job,int(seq),kind,payload,token,now+seconds)
+        return None
+
+    def renew(self,lease,seconds):
+        seq,attempts,token,expires = os.path.basename(lease.task).split('~')
+        expires = time()+seconds
+        renewed = os.path.join(os.path.dirname(lease.task),'%s~%s~%s~%f'%(seq,attempts,token,expires))
+        try:
+            os.rename(lease.task,renewed)
+        except FileNotFoundError:
+            return False
+        lease.task = renewed
+        lease.expires = expires
+        return True
+
+    def complete(self,lease,result):
+        done = self._folder(lease.job,'done')
+        partial = os.path.join(done,'.%08d-%d'%(lease.seq,lease.token))
+        self._write(partial,result)
+        try:
+            os.rename(lease.task,os.path.join(done,'%08d.task'%lease.seq))
+        except FileNotFoundError:
+            os.remove(partial)
+            return False
+        os.rename(partial,os.path.join(done,'%08d.result'%lease.seq))
+        return True
+
+    def results(self,job,skip=()):
+        """
+        Results of the finished tasks of a job (see SqliteQueue.results).
+        """
+        self._expire(job,time())
+        results = {}
+        for name in os.listdir(self._folder(job,'done')):
+            if name.endswith('.result') and not int(name.split('.')[0]) in skip:
+                results[int(name.split('.')[0])] = self._read(os.path.join(self._folder(job,'done'),name))
+        return results
+
+    def progress(self,job):
+        return {'open':len(os.listdir(self._folder(job,'open'))),'leased':len(os.listdir(self._folder(job,'leased'))),
+                'done':len([n for n in os.listdir(self._folder(job,'done')) if n.endswith('.result')])}
+
+    def remove(self,job):
+        removed = os.path.join(self.path,'.removed-'+job)
+        os.rename(os.path.join(self.path,job),removed)
+        for root,folders,files in os.walk(removed,topdown=False):
+            for name in files:
+                os.remove(os.path.join(root,name))
+            for name in folders:
+                os.rmdir(os.path.join(root,name))
+        os.rmdir(removed)
+
+    def close(self):
+        pass
+
+
+def openQueue(path,max_attempts=3):
+    """
+    SqliteQueue for files ending with .db or .sqlite, otherwise FileQueue.
+    """
+    if path.endswith(('.db','.sqlite')):
+        return SqliteQueue(path,max_attempts)
+    return FileQueue(path,max_attempts)
@@ -0,0 +1,608 @@
+import os
+import sqlite3
+import mmap
+import hashlib
+from array import array
+from threading import Lock
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+
+SQLITE_HEADER = b'SQLite format 3\x00'
+
+
+def isStateStore(file_name):
+    """
+    True if the file is a sqlite state store (and not a dill file).
+    """
+    if not os.path.isfile(file_name):
+        return False
+    with open(file_name,'rb') as fp:
+        return fp.read(len(SQLITE_HEADER)) == SQLITE_HEADER
+
+
+class StateStore:
+    """
+    Incremental persistence of a DynamicClass in one sqlite file. Small variables are saved as one dill blob each and
+    only rewritten when they changed; variables with a version counter (e.g. OpenCategories) are not even pickled
+    while their version is unchanged. Large maps (see StoredDict) and the log (see StoredLog) are saved row by row,
+    so a checkpoint only writes the entries that were changed since the last one. Deleted rows are reclaimed by a
+    VACUUM once they make up more than a quarter of the file.
+
+    Args:
+        path (str): sqlite file.
+    """
+    def __init__(self,path):
+        self.path = path
+        self.hashes = {}
+        # name : (value, version) of the saved variables that count their changes
+        self.versions = {}
+        self._lock = Lock()
+        self.connect()
+
+    def connect(self):
+        self.db = sqlite3.connect(self.path,check_same_thread=False,isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS variables (name TEXT PRIMARY KEY, value BLOB)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS entries (map TEXT, seq INTEGER PRIMARY KEY AUTOINCREMENT, '
+                        'key TEXT, value BLOB, UNIQUE (map,key))')
+        self.db.execute('CREATE TABLE IF NOT EXISTS log (seq INTEGER PRIMARY KEY, value BLOB)')
+
+    def close(self):
+        with self._lock:
+            self.db.close()
+
+    def variables(self):
+        """
+        Names of the saved small variables and maps.
+        """
+        names = [row[0] for row in self.db.execute('SELECT name FROM variables')]
+        maps = [row[0] for row in self.db.execute('SELECT DISTINCT map FROM entries')]
+        return names,maps
+
+    def loadVariable(self,name):
+        import dill as pkl
+        with self._lock:
+            blob = self.db.execute('SELECT value FROM variables WHERE name=?',(name,)).fetchone()[0]
+        self.hashes[name] = hashlib.md5(blob).digest()
+        value = pkl.loads(blob)
+        self._saved(name,value)
+        return value
+
+    def _saved(self,name,value):
+        version = getattr(value,'version',None)
+        if type(version) == int:
+            self.versions[name] = (value,version)
+        else:
+            self.versions.pop(name,None)
+
+    def _unchanged(self,name,value):
+        saved,version = self.versions.get(name,(None,None))
+        return saved is value and getattr(value,'version',None) == version
+
+    def writeVariables(self,values):
+        """
+        Save the variables whose pickled value changed since the last save. Variables with an int attribute version
+        that is counted up on every change are skipped without pickling while they keep object and version.
+
+        Returns:
+            int: number of written variables
+        """
+        import dill as pkl
+        rows = []
+        for name,value in values.items():
+            if self._unchanged(name,value):
+                continue
+            blob = pkl.dumps(value)
+            digest = hashlib.md5(blob).digest()
+            if not self.hashes.get(name) == digest:
+                rows.append((name,blob))
+                self.hashes[name] = digest
+            self._saved(name,value)
+        with self._lock:
+            self.db.execute('BEGIN')
+            self.db.executemany('INSERT OR REPLACE INTO variables (name,value) VALUES (?,?)',rows)
+            self.db.execute('COMMIT')
+        return len(rows)
+
+    def removeVariable(self,name):
+        """
+        Delete a saved variable (e.g. a map that is saved row by row from now on).
+        """
+        with self._lock:
+            self.db.execute('DELETE FROM variables WHERE name=?',(name,))
+        self.hashes.pop(name,None)
+        self.versions.pop(name,None)
+
+    def removeMap(self,name):
+        """
+        Delete all rows of a map (e.g. a map that is saved as a variable from now on).
+        """
+        with self._lock:
+            self.db.execute('DELETE FROM entries WHERE map=?',(name,))
+
+    def compact(self,force=False):
+        """
+        VACUUM the file if more than a quarter of its pages are unused.
+        """
+        with self._lock:
+            free = self.db.execute('PRAGMA freelist_count').fetchone()[0]
+            total = self.db.execute('PRAGMA page_count').fetchone()[0]
+            if force or (total > 0 and free > total/4):
+                self.db.execute('VACUUM')
+                return True
+        return False
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['db']
+        del state['_lock']
+        del state['versions']
+        return state
+
+    def __setstate__(self,state):
+        self.__dict__.update(state)
+        self.versions = {}
+        self._lock = Lock()
+        self.connect()
+
+
+class StoredDict(MutableMapping):
+    """
+    Dict that lives in a StateStore. The keys (in insertion order) are held in memory, values are read from the store
+    when they are accessed, with a small cache of recently used values. Assignments are kept in memory until commit(),
+    which writes only these changes. Values must be assigned again after changing them in place.
+
+    Args:
+        store (StateStore): Store of the map.
+
+        name (str): Name of the map (attribute name).
+
+        cache_size (int): Number of values kept in memory after reading them. None keeps all values in memory, they
+            are read with one query when the first value is accessed (for maps that are read as a whole).
+    """
+    def __init__(self,store,name,cache_size=1024):
+        import dill as pkl
+        self.store = store
+        self.name = name
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        # all values are in cache or dirty (cache_size None, after the first access)
+        self.complete = False
+        self.dirty = {}
+        self.deleted = set()
+        with store._lock:
+            rows = store.db.execute('SELECT key FROM entries WHERE map=? ORDER BY seq',(name,)).fetchall()
+        self.index = dict.fromkeys(pkl.loads(row[0]) if type(row[0]) == bytes else row[0] for row in rows)
+
+    @staticmethod
+    def create(store,name,items,cache_size=1024):
+        """
+        Replace the map in the store with items and open it.
+        """
+        import dill as pkl
+        with store._lock:
+            store.db.execute('BEGIN')
+            store.db.execute('DELETE FROM entries WHERE map=?',(name,))
+            store.db.executemany('INSERT INTO entries (map,key,value) VALUES (?,?,?)',
+                                 ((name,StoredDict._key(key),pkl.dumps(value)) for key,value in items))
+            store.db.execute('COMMIT')
+        return StoredDict(store,name,cache_size=cache_size)
+
+    @staticmethod
+    def _key(key):
+        if type(key) == str:
+            return key
+        import dill as pkl
+        return pkl.dumps(key)
+
+    def _read(self,key):
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        if type(self.cache_size) == type(None):
+            self.cache.update((k,value) for k,value in self.items() if not k in self.dirty)
+            self.complete = True
+            return self.cache[key]
+        import dill as pkl
+        with self.store._lock:
+            row = self.store.db.execute('SELECT value FROM entries WHERE map=? AND key=?',
+                                        (self.name,self._key(key))).fetchone()
+        value = pkl.loads(row[0])
+        self.cache[key] = value
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return value
+
+    def __getitem__(self,key):
+        if key in self.dirty:
+            return self.dirty[key]
+        if not key in self.index:
+            raise KeyError(key)
+        return self._read(key)
+
+    def __setitem__(self,key,value):
+        # a deleted key stays in deleted, so that commit() removes the old row before the new one is appended
+        self.index[key] = None
+        self.dirty[key] = value
+        self.cache.pop(key,None)
+
+    def __delitem__(self,key):
+        if not key in self.index:
+            raise KeyError(key)
+        del self.index[key]
+        self.dirty.pop(key,None)
+        self.cache.pop(key,None)
+        self.deleted.add(key)
+
+    def __contains__(self,key):
+        return key in self.index
+
+    def __iter__(self):
+        return iter(list(self.index))
+
+    def __len__(self):
+        return len(self.index)
+
+    def _rows(self,batch_size=1024):
+        # stored (key, pickled value) in the order of the rows, read in batches
+        import dill as pkl
+        seq = -1
+        while True:
+            with self.store._lock:
+                rows = self.store.db.execute('SELECT seq,key,value FROM entries WHERE map=? AND seq>? ORDER BY seq '
+                                             'LIMIT ?',(self.name,seq,batch_size)).fetchall()
+            for seq,key,value in rows:
+                yield (pkl.loads(key) if type(key) == bytes else key),value
+            if len(rows) < batch_size:
+                return
+
+    def items(self):
+        """
+        All items in insertion order. The stored values are read in batches of rows, so that only one batch is in
+        memory at a time.
+        """
+        if self.complete:
+            for key in list(self.index):
+                yield key,self[key]
+            return
+        import dill as pkl
+        rows = self._rows()
+        # stored keys that are neither changed nor deleted are in the index in the order of their rows
+        for key in list(self.index):
+            if key in self.dirty:
+                yield key,self.dirty[key]
+                continue
+            for stored,value in rows:
+                if stored == key:
+                    yield key,pkl.loads(value)
+                    break
+
+    def values(self):
+        for _,value in self.items():
+            yield value
+
+    def commit(self):
+        """
+        Write the changes since the last commit.
+
+        Returns:
+            int: number of written or deleted entries
+        """
+        import dill as pkl
+        changes = len(self.dirty)+len(self.deleted)
+        if changes == 0:
+            return 0
+        dirty,deleted = self.dirty,self.deleted
+        self.dirty,self.deleted = {},set()
+        with self.store._lock:
+            self.store.db.execute('BEGIN')
+            self.store.db.executemany('DELETE FROM entries WHERE map=? AND key=?',
+                                      ((self.name,self._key(key)) for key in deleted))
+            # keys that were deleted and assigned again move to the end, like in a dict
+            self.store.db.executemany('INSERT INTO entries (map,key,value) VALUES (?,?,?) ON CONFLICT (map,key) '
+                                      'DO UPDATE SET value=excluded.value',
+                                      ((self.name,self._key(key),pkl.dumps(value)) for key,value in dirty.items()))
+            self.store.db.execute('COMMIT')
+        if self.complete:
+            self.cache.update(dirty)
+        return changes
+
+    def __reduce__(self):
+        # pickled as a plain dict (e.g. when saving to a dill file)
+        return (dict,(list(self.items()),))
+
+    def __repr__(self):
+        return 'StoredDict(%s, %d entries)'%(self.name,len(self))
+
+
+class StoredLog:
+    """
+    List of log entries that lives in a StateStore. Entries are read when they are accessed, appended entries are
+    written by commit(), which also deletes the entries beyond the latest capacity ones. Like a LogBuffer, indices
+    count all entries ever appended and dropped entries are left out of slices.
+
+    Args:
+        store (StateStore): Store of the log.
+
+        capacity (int / None): Maximal number of entries kept, None keeps all.
+    """
+    def __init__(self,store,capacity=None):
+        self.store = store
+        self.capacity = capacity
+        self.pending = []
+        with store._lock:
+            first,last = store.db.execute('SELECT MIN(seq),MAX(seq) FROM log').fetchone()
+        # rows are numbered by their index in the whole log
+        self.dropped = 0 if type(first) == type(None) else first
+        self.stored = 0 if type(last) == type(None) else last+1
+
+    @staticmethod
+    def create(store,entries,capacity=None):
+        import dill as pkl
+        # the entries dropped by a LogBuffer keep their place in the numbering
+        dropped = getattr(entries,'dropped',0)
+        with store._lock:
+            store.db.execute('BEGIN')
+            store.db.execute('DELETE FROM log')
+            store.db.executemany('INSERT INTO log (seq,value) VALUES (?,?)',
+                                 ((dropped+i,pkl.dumps(entry)) for i,entry in enumerate(entries)))
+            store.db.execute('COMMIT')
+        log = StoredLog(store,capacity)
+        if dropped > 0 and log.stored == 0:
+            log.dropped = log.stored = dropped
+        log.commit()
+        return log
+
+    def append(self,entry):
+        self.pending.append(entry)
+
+    def __len__(self):
+        return self.stored+len(self.pending)
+
+    def __getitem__(self,index):
+        import dill as pkl
+        if type(index) == slice:
+            start,stop,step = index.indices(len(self))
+            start = max(start,self.dropped)
+            with self.store._lock:
+                rows = self.store.db.execute('SELECT value FROM log WHERE seq>=? AND seq<? ORDER BY seq',
+                                             (start,min(stop,self.stored))).fetchall()
+            entries = [pkl.loads(row[0]) for row in rows]+self.pending[max(0,start-self.stored):max(0,stop-self.stored)]
+            return entries[::step]
+        if index < 0:
+            index += len(self)
+        if index < self.dropped or index >= len(self):
+            raise IndexError('log index out of range')
+        if index >= self.stored:
+            return self.pending[index-self.stored]
+        with self.store._lock:
+            return pkl.loads(self.store.db.execute('SELECT value FROM log WHERE seq=?',(index,)).fetchone()[0])
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def commit(self):
+        """
+        Write the appended entries and delete the entries beyond the capacity.
+
+        Returns:
+            int: number of written entries
+        """
+        import dill as pkl
+        pending = self.pending
+        self.pending = []
+        dropped = self.dropped
+        if self.capacity:
+            dropped = max(dropped,self.stored+len(pending)-self.capacity)
+        if len(pending) == 0 and dropped == self.dropped:
+            return 0
+        with self.store._lock:
+            self.store.db.execute('BEGIN')
+            self.store.db.executemany('INSERT INTO log (seq,value) VALUES (?,?)',
+                                      ((self.stored+i,pkl.dumps(entry)) for i,entry in enumerate(pending)
+                                       if self.stored+i >= dropped))
+            self.store.db.execute('DELETE FROM log WHERE seq<?',(dropped,))
+            self.store.db.execute('COMMIT')
+        self.stored += len(pending)
+        self.dropped = dropped
+        return len(pending)
+
+    def __reduce__(self):
+        return (list,(self[:],))
+
+    def __repr__(self):
+        return 'StoredLog(%d entries)'%len(self)
+
+
+def encodeValue(value):
+    """
+    Bytes of a value of a MappedStore: lists of str (links, paragraphs) as lines, ints as text, everything else
+    pickled.
+    """
+    if type(value) == list and all(type(v) == str and not '\n' in v for v in value):
+        return b'L'+'\n'.join(value).encode()
+    if type(value) == int:
+        return b'I'+str(value).encode()
+    import dill as pkl
+    return b'P'+pkl.dumps(value)
+
+
+def decodeValue(data):
+    kind,data = data[:1],data[1:]
+    if kind == b'L':
+        return data.decode().split('\n') if len(data) > 0 else []
+    if kind == b'I':
+        return int(data)
+    import dill as pkl
+    return pkl.loads(data)
+
+
+class MappedStore(MutableMapping):
+    """
+    Out-of-core dict for links and texts of articles. Values are appended to a data file (name.dat) and read
+    through a memory map, the offset index is kept as an append-only file (name.idx, one line "offset length title"
+    per assignment). Only the titles and offsets are held in memory, so reading pages[title] or links[title] fetches
+    just that article. Assigning a title again appends the new value; compact() drops the old ones.
+
+    When pickled (e.g. by save), only the absolute directory and name are saved and the store is opened again on
+    load. Opening checks that the index only refers to data in name.dat: after a crash, index lines beyond the data
+    (or a torn last line) are cut off together with data that no index line refers to.
+
+    Args:
+        path (str): Directory of the files.
+
+        name (str): Name of the store (e.g. 'links').
+    """
+    def __init__(self,path,name):
+        self.path = os.path.abspath(path)
+        self.name = name
+        self._lock = Lock()
+        os.makedirs(path,exist_ok=True)
+        self.data_path = os.path.join(path,name+'.dat')
+        self.index_path = os.path.join(path,name+'.idx')
+        self.open()
+
+    def open(self):
+        self.slots = {}
+        self.offsets = array('q')
+        self.lengths = array('q')
+        size = os.path.getsize(self.data_path) if os.path.exists(self.data_path) else 0
+        valid = 0
+        end = 0
+        if os.path.exists(self.index_path):
+            with open(self.index_path,'rb') as fp:
+                for line in fp:
+                    try:
+                        offset,length,title = line.decode('utf-8').rstrip('\n').split('\t',2)
+                        offset,length = int(offset),int(length)
+                    except ValueError:
+                        break
+                    if not line.endswith(b'\n') or offset+length > size:
+                        break
+                    if length < 0:
+                        self.slots.pop(title,None)
+                    else:
+                        self._setSlot(title,offset,length)
+                        end = max(end,offset+length)
+                    valid += len(line)
+            if valid < os.path.getsize(self.index_path):
+                os.truncate(self.index_path,valid)
+        if end < size:
+            os.truncate(self.data_path,end)
+        self.data = open(self.data_path,'ab')
+        self.index = open(self.index_path,'a',encoding='utf-8')
+        self.size = self.data.tell()
+        self.map = None
+
+    def _setSlot(self,title,offset,length):
+        if title in self.slots:
+            slot = self.slots[title]
+            self.offsets[slot] = offset
+            self.lengths[slot] = length
+        else:
+            self.slots[title] = len(self.offsets)
+            self.offsets.append(offset)
+            self.lengths.append(length)
+
+    def flush(self):
+        with self._lock:
+            self.data.flush()
+            self.index.flush()
+
+    def _read(self,offset,length):
+        if type(self.map) == type(None) or offset+length > len(self.map):
+            self.data.flush()
+            if not type(self.map) == type(None):
+                self.map.close()
+            self.map = b''
+            if self.size > 0:
+                fd = os.open(self.data_path,os.O_RDONLY)
+                try:
+                    self.map = mmap.mmap(fd,0,access=mmap.ACCESS_READ)
+                finally:
+                    os.close(fd)
+        return self.map[offset:offset+length]
+
+    def __getitem__(self,title):
+        with self._lock:
+            slot = self.slots[title]
+            return decodeValue(self._read(self.offsets[slot],self.lengths[slot]))
+
+    def __setitem__(self,title,value):
+        data = encodeValue(value)
+        with self._lock:
+            offset = self.size
+            self.data.write(data)
+            self.size += len(data)
+            self.index.write('%d\t%d\t%s\n'%(offset,len(data),title))
+            self._setSlot(title,offset,len(data))
+
+    def __delitem__(self,title):
+        with self._lock:
+            del self.slots[title]
+            self.index.write('-1\t-1\t%s\n'%title)
+
+    def __contains__(self,title):
+        return title in self.slots
+
+    def __iter__(self):
+        return iter(list(self.slots))
+
+    def __len__(self):
+        return len(self.slots)
+
+    def items(self):
+        for title in list(self.slots):
+            try:
+                yield title,self[title]
+            except KeyError:
+                pass
+
+    def values(self):
+        for _,value in self.items():
+            yield value
+
+    def clear(self):
+        """
+        Remove all entries (truncates the files).
+        """
+        self.close()
+        for path in [self.data_path,self.index_path]:
+            if os.path.exists(path):
+                os.remove(path)
+        self.open()
+
+    def compact(self):
+        """
+        Rewrite the files with only the current value of each title.
+        """
+        with self._lock:
+            self.data.flush()
+            with open(self.data_path+'.tmp','wb') as data,open(self.index_path+'.tmp','w',encoding='utf-8') as index:
+                offset = 0
+                for title,slot in self.slots.items():
+                    value = self._read(self.offsets[slot],self.lengths[slot])
+                    data.write(value)
+                    index.write('%d\t%d\t%s\n'%(offset,len(value),title))
+                    offset += len(value)
+        self.close()
+        os.replace(self.data_path+'.tmp',self.data_path)
+        os.replace(self.index_path+'.tmp',self.index_path)
+        self.open()
+
+    def close(self):
+        with self._lock:
+            if not type(self.map) == type(None) and not type(self.map) == bytes:
+                self.map.close()
+            self.map = None
+            self.data.close()
+            self.index.close()
+
+    def __reduce__(self):
+        self.flush()
+        return (MappedStore,(self.path,self.name))
+
+    def __repr__(self):
+        return 'MappedStore(%s, %d entries)'%(os.path.join(self.path,self.name),len(self))
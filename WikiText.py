@@ -0,0 +1,192 @@
+import re
+from html.parser import HTMLParser
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+
+# sections without running text, compared case-insensitive with the heading
+DEFAULT_SKIP_SECTIONS = ('See also','References','Notes','Sources','Further reading','External links','Bibliography',
+                         'Citations','Footnotes','Siehe auch','Literatur','Weblinks','Einzelnachweise','Anmerkungen',
+                         'Quellen')
+
+HEADINGS = {'h1':1,'h2':2,'h3':3,'h4':4,'h5':5,'h6':6}
+# a new block element ends an open paragraph (unclosed <p> tags)
+BLOCKS = {'p','div','table','ul','ol','dl','blockquote','pre','h1','h2','h3','h4','h5','h6'}
+SKIP_TAGS = {'script','style','noscript'}
+SKIP_CLASSES = {'reference','mw-ref','mw-editsection','noprint','mw-empty-elt'}
+# elements without content and end tag (html.parser reports no end for <img ...>), never skipped by their class
+VOID_TAGS = {'area','base','br','col','embed','hr','img','input','link','meta','param','source','track','wbr'}
+
+
+class ParagraphCollector:
+    """
+    Event handler of the streaming extraction: collects the text of all paragraphs in one pass over the html.
+    Citation superscripts (<sup class="reference">[1]</sup>), scripts, styles and the paragraphs of skipped sections are
+    dropped. Entities are already decoded and tag names lower-cased by the parser.
+
+    Args:
+        skip_sections (iterable of str): Headings of sections whose paragraphs are not collected.
+
+        min_length (int): Shorter paragraphs are dropped.
+    """
+    def __init__(self,skip_sections=DEFAULT_SKIP_SECTIONS,min_length=4):
+        self.skip_sections = set(s.strip().lower() for s in skip_sections)
+        self.min_length = min_length
+        self.lines = []
+        self.paragraph = None
+        self.skip_tag = None
+        self.skip_depth = 0
+        self.heading = None
+        self.heading_level = 0
+        self.section_skip_level = 0
+
+    def start(self,tag,classes=None):
+        if self.skip_depth > 0:
+            if tag == self.skip_tag:
+                self.skip_depth += 1
+            return
+        if tag in SKIP_TAGS or (classes and not tag in VOID_TAGS and not SKIP_CLASSES.isdisjoint(classes.split())):
+            self.skip_tag = tag
+            self.skip_depth = 1
+            return
+        if tag in BLOCKS:
+            self.endParagraph()
+        if tag in HEADINGS:
+            self.heading = []
+            self.heading_level = HEADINGS[tag]
+        elif tag == 'p' and self.section_skip_level == 0:
+            self.paragraph = []
+        elif tag == 'br' and not type(self.paragraph) == type(None):
+            self.paragraph.append(' ')
+
+    def end(self,tag):
+        if self.skip_depth > 0:
+            if tag == self.skip_tag:
+                self.skip_depth -= 1
+            return
+        if tag in HEADINGS and not type(self.heading) == type(None):
+            title = ' '.join(''.join(self.heading).split()).lower()
+            if self.section_skip_level and self.heading_level <= self.section_skip_level:
+                self.section_skip_level = 0
+            if not self.section_skip_level and title in self.skip_sections:
+                self.section_skip_level = self.heading_level
+            self.heading = None
+        elif tag == 'p':
+            self.endParagraph()
+
+    def data(self,text):
+        if self.skip_depth > 0:
+            return
+        if not type(self.heading) == type(None):
+            self.heading.append(text)
+        elif not type(self.paragraph) == type(None):
+            self.paragraph.append(text)
+
+    def endParagraph(self):
+        if type(self.paragraph) == type(None):
+            return
+        line = ' '.join(''.join(self.paragraph).split())
+        if len(line) >= self.min_length:
+            self.lines.append(line)
+        self.paragraph = None
+
+    def close(self):
+        self.endParagraph()
+        return self.lines
+
+
+class _StdlibParser(HTMLParser):
+    def __init__(self,collector):
+        super().__init__(convert_charrefs=True)
+        self.collector = collector
+
+    @staticmethod
+    def classes(attrs):
+        for name,value in attrs:
+            if name == 'class':
+                return value
+        return None
+
+    def handle_starttag(self,tag,attrs):
+        self.collector.start(tag,self.classes(attrs) if attrs else None)
+
+    def handle_startendtag(self,tag,attrs):
+        self.collector.start(tag,self.classes(attrs) if attrs else None)
+        if not tag in VOID_TAGS:
+            self.collector.end(tag)
+
+    def handle_endtag(self,tag):
+        self.collector.end(tag)
+
+    def handle_data(self,data):
+        self.collector.data(data)
+
+
+class _LxmlTarget:
+    def __init__(self,collector):
+        self.collector = collector
+
+    def start(self,tag,attrib):
+        self.collector.start(tag,attrib.get('class'))
+
+    def end(self,tag):
+        self.collector.end(tag)
+
+    def data(self,data):
+        self.collector.data(data)
+
+    def comment(self,text):
+        pass
+
+    def close(self):
+        return self.collector.close()
+
+
+def extractParagraphs(html,skip_sections=DEFAULT_SKIP_SECTIONS,parser='auto',min_length=4):
+    """
+    Extract the plain text paragraphs of an article in a single pass over its html.
+
+    Args:
+        html (str): Html of the article.
+
+        skip_sections (iterable of str): Headings of sections that are ignored (e.g. references, external links).
+
+        parser (str): 'lxml', 'html.parser', 'regex' (the former extraction, without entity decoding and section
+            filtering) or 'auto' (lxml if installed, otherwise html.parser).
+
+        min_length (int): Shorter paragraphs are dropped.
+
+    Returns:
+        list of str: one line per paragraph
+    """
+    if parser == 'regex':
+        return extractParagraphsRegex(html,min_length)
+    if len(html) == 0:
+        return []
+    collector = ParagraphCollector(skip_sections,min_length)
+    if parser == 'lxml' or (parser == 'auto' and not type(etree) == type(None)):
+        if type(etree) == type(None):
+            raise ImportError('lxml is not installed, use parser="html.parser"')
+        html_parser = etree.HTMLParser(target=_LxmlTarget(collector))
+        html_parser.feed(html)
+        return html_parser.close()
+    html_parser = _StdlibParser(collector)
+    html_parser.feed(html)
+    html_parser.close()
+    return collector.close()
+
+
+def extractParagraphsRegex(html,min_length=4):
+    """
+    Former regex based extraction: every <p> block with the tags removed.
+    """
+    lines = []
+    res = re.findall('<p[^>]*>.*?</p>',html,flags= re.IGNORECASE | re.DOTALL)
+    for p in res:
+        p = re.sub('<.*?>','',p)
+        p = re.sub(r'\s+',' ',p,)
+        lines.append(p.strip())
+    return [lns for lns in lines if len(lns) >= min_length]
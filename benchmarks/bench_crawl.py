@@ -0,0 +1,161 @@
+"""
+Measure crawling, collecting and the network analysis against a local mock MediaWiki server.
+
+Every scenario generates a synthetic wiki (SyntheticWiki), serves it with latency and injected errors from this
+process and runs the crawler in a fresh child process, so that CPU time and peak memory belong to the crawler alone.
+The phases startScan, crawlDeeper, collect, retrieveCategories and retrieveNetwork are reported with pages/s,
+requests per page, CPU time and the peak memory of the child process. Pages are the crawled categories in startScan
+and crawlDeeper and the articles in the other phases.
+
+Usage:
+    python benchmarks/bench_crawl.py [--scenarios baseline concurrent] [--depth 3] [--fan-out 4] [--latency 0.02]
+                                     [--errors 0.05] [--workers 8] [--json results.jsonl]
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import multiprocessing
+from time import time,perf_counter,process_time
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),'..'))
+from MockWiki import MockWikiServer,SyntheticWiki,DelayedResponses,FaultyResponses
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# name : settings, missing settings are taken from DEFAULTS
+SCENARIOS = {
+    'baseline':{},
+    'concurrent':{'workers':8},
+    'slow':{'latency':0.05,'workers':8},
+    'faulty':{'errors':0.05,'workers':8},
+    'rate-limited':{'workers':8,'max_rps':50},
+    'wide':{'depth':2,'fan_out':12,'articles':10,'workers':8},
+}
+DEFAULTS = {'depth':3,'fan_out':4,'articles':5,'links':20,'paragraphs':5,'latency':0.01,'errors':0.0,'workers':1,
+            'max_rps':None,'batch_size':50,'seed':0}
+
+
+def peakMemory():
+    """
+    Peak resident memory of this process in MB (None if unknown).
+    """
+    if type(resource) == type(None):
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak/2**20 if sys.platform == 'darwin' else peak/2**10
+
+
+def runScenario(url,settings,results):
+    """
+    Crawl the mock wiki in phases (runs in the child process).
+    """
+    from WikiCrawler import KnowledgeNet
+    net = KnowledgeNet()
+    net.setBackend(True,api_url=url,batch_size=settings['batch_size'])
+    net.setConcurrency(settings['workers'],max_rps=settings['max_rps'],burst=settings['workers'])
+    net.setRetries(max_retries=8,backoff={'network':(0.01,0.5),'server':(0.01,0.5)})
+
+    def phase(name,action,pages):
+        requests = net.requestStats()['requests']
+        start,cpu = perf_counter(),process_time()
+        action()
+        seconds,cpu = perf_counter()-start,process_time()-cpu
+        count = pages()
+        requests = net.requestStats()['requests']-requests
+        results.append({'phase':name,'pages':count,'seconds':seconds,'pages_per_second':count/max(seconds,1e-9),
+                        'requests':requests,'requests_per_page':requests/max(count,1),'cpu_seconds':cpu,
+                        'peak_mb':peakMemory()})
+
+    with tempfile.TemporaryDirectory() as folder:
+        phase('startScan',lambda:net.startScan('Category:Root',depth=max(1,settings['depth']),verbose=0),
+              lambda:len(net.closed_categories))
+        scanned = len(net.closed_categories)
+        phase('crawlDeeper',lambda:net.crawlDeeper(verbose=0),lambda:len(net.closed_categories)-scanned)
+        phase('collect',lambda:net.collect(links=True,text=True,archive_path=os.path.join(folder,'texts'),
+                                           zipped=True,verbose=0),lambda:net.collected)
+        phase('retrieveCategories',lambda:[net.retrieveCategories(a) for a in net.articles],lambda:len(net.articles))
+        phase('retrieveNetwork',net.retrieveNetwork,lambda:len(net.links))
+
+
+def _child(url,settings,queue):
+    results = []
+    try:
+        with open(os.devnull,'w') as devnull:
+            stdout,sys.stdout = sys.stdout,devnull
+            try:
+                runScenario(url,settings,results)
+            finally:
+                sys.stdout = stdout
+        queue.put({'results':results})
+    except Exception as e:
+        queue.put({'results':results,'error':repr(e)})
+
+
+def benchmark(name,settings):
+    """
+    Serve the wiki of a scenario and crawl it in a child process.
+
+    Returns:
+        dict: scenario, settings, size of the wiki, server requests and the measured phases
+    """
+    wiki = SyntheticWiki(depth=settings['depth']+1,fan_out=settings['fan_out'],
+                         articles_per_category=settings['articles'],links=settings['links'],
+                         paragraphs=settings['paragraphs'],seed=settings['seed'])
+    responder = DelayedResponses(wiki,latency=settings['latency'],seed=settings['seed'])
+    if settings['errors'] > 0:
+        rates = {'ratelimit':0.3,'unavailable':0.3,'disconnect':0.2,'maxlag':0.2}
+        responder = FaultyResponses(responder,{k:v*settings['errors'] for k,v in rates.items()},retry_after=0.05,
+                                    seed=settings['seed'])
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    with MockWikiServer(responder) as server:
+        child = context.Process(target=_child,args=(server.url,settings,queue))
+        child.start()
+        outcome = queue.get()
+        child.join()
+        requests = server.request_count
+    return dict(outcome,scenario=name,settings=settings,categories=len(wiki.categories),articles=len(wiki.articles),
+                server_requests=requests,time=time())
+
+
+def printResult(result):
+    print('\n%s: %d categories, %d articles, %d server requests'%(result['scenario'],result['categories'],
+                                                                    result['articles'],result['server_requests']))
+    print('  %-20s %8s %9s %10s %10s %9s %9s'%('phase','pages','seconds','pages/s','req./page','cpu s','peak MB'))
+    for r in result['results']:
+        peak = '%9.1f'%r['peak_mb'] if not type(r['peak_mb']) == type(None) else '%9s'%'-'
+        print('  %-20s %8d %9.3f %10.1f %10.3f %9.3f %s'%(r['phase'],r['pages'],r['seconds'],r['pages_per_second'],
+                                                          r['requests_per_page'],r['cpu_seconds'],peak))
+    if 'error' in result:
+        print('  failed: %s'%result['error'])
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--scenarios',nargs='+',default=list(SCENARIOS),choices=list(SCENARIOS))
+    for key,value in DEFAULTS.items():
+        arg_parser.add_argument('--'+key.replace('_','-'),type=int if key in ['depth','fan_out','articles','links',
+                                'paragraphs','workers','batch_size','seed'] else float,default=None,
+                                help='overrides the scenarios (default %s)'%value)
+    arg_parser.add_argument('--json',default=None,help='append the results as json lines to this file')
+    args = arg_parser.parse_args()
+
+    overrides = {key:getattr(args,key) for key in DEFAULTS if not type(getattr(args,key)) == type(None)}
+    for name in args.scenarios:
+        settings = dict(DEFAULTS,**SCENARIOS[name])
+        settings.update(overrides)
+        result = benchmark(name,settings)
+        printResult(result)
+        if args.json:
+            with open(args.json,'a',encoding='utf-8') as fp:
+                fp.write(json.dumps(result)+'\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Compare the streaming paragraph extraction with the former regex extraction on saved article html.
+
+Usage:
+    python benchmarks/bench_extract.py [--repeat 200] [--fixtures benchmarks/fixtures]
+"""
+import os
+import sys
+import glob
+import argparse
+from time import perf_counter
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),'..'))
+from WikiText import extractParagraphs,etree
+
+
+def timeParser(documents,parser,repeat):
+    start = perf_counter()
+    for _ in range(repeat):
+        for html in documents.values():
+            extractParagraphs(html,parser=parser)
+    return perf_counter()-start
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--repeat',type=int,default=200)
+    arg_parser.add_argument('--fixtures',default=os.path.join(os.path.dirname(os.path.abspath(__file__)),'fixtures'))
+    args = arg_parser.parse_args()
+
+    documents = {}
+    for file_name in sorted(glob.glob(os.path.join(args.fixtures,'*.html'))):
+        with open(file_name,'r',encoding='utf-8') as fp:
+            documents[os.path.basename(file_name)] = fp.read()
+    size = sum(len(html.encode()) for html in documents.values())*args.repeat
+    print('%d documents, %d repetitions, %.1f MB html'%(len(documents),args.repeat,size/1e6))
+
+    parsers = ['regex','html.parser']+(['lxml'] if not type(etree) == type(None) else [])
+    for parser in parsers:
+        seconds = timeParser(documents,parser,args.repeat)
+        print('%-12s %8.3f s %8.1f MB/s %8.0f pages/s'%(parser,seconds,size/1e6/seconds,
+                                                          len(documents)*args.repeat/seconds))
+
+    for name,html in documents.items():
+        old = extractParagraphs(html,parser='regex')
+        new = extractParagraphs(html,parser='auto')
+        print('%-20s regex: %3d lines %6d chars | streaming: %3d lines %6d chars'%(
+            name,len(old),sum(map(len,old)),len(new),sum(map(len,new))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Measure the start-up latency of WikiCrawler: the time to import the module in a fresh interpreter and the time until
+a spawned worker process has imported it (as for KnowledgeNet.work on a new host or a multiprocessing pool).
+
+The benchmark fails (exit code 1) when the median import time exceeds --max-ms or when importing WikiCrawler loads
+one of the heavy modules that are only needed by some features (--heavy), so it can guard the start-up time in CI.
+
+Usage:
+    python benchmarks/bench_import.py [--repeat 10] [--max-ms 300] [--profile 15] [--json results.jsonl]
+"""
+import os
+import sys
+import json
+import argparse
+import compileall
+import subprocess
+import multiprocessing
+from time import time,perf_counter
+from statistics import median
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)),'..')
+
+# modules that must not be loaded by "import WikiCrawler"
+HEAVY = ['IPython','matplotlib','numpy','dill','wikipediaapi','requests','lxml','zstandard']
+
+MEASURE = """
+import sys,json
+from time import perf_counter
+start = perf_counter()
+import {module}
+seconds = perf_counter()-start
+print(json.dumps({{'seconds':seconds,'loaded':[m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def importTime(module,heavy):
+    """
+    Import a module in a fresh interpreter.
+
+    Returns:
+        dict: seconds of the import, seconds until the interpreter exited, loaded heavy modules
+    """
+    start = perf_counter()
+    output = subprocess.run([sys.executable,'-c',MEASURE.format(module=module,heavy=heavy)],cwd=ROOT,check=True,
+                            capture_output=True,text=True).stdout
+    return dict(json.loads(output.strip().splitlines()[-1]),process_seconds=perf_counter()-start)
+
+
+def _worker(queue):
+    import WikiCrawler
+    queue.put(perf_counter())
+
+
+def spawnTime():
+    """
+    Seconds from starting a spawned process until it imported WikiCrawler.
+    """
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    start = perf_counter()
+    process = context.Process(target=_worker,args=(queue,))
+    process.start()
+    ready = queue.get()
+    process.join()
+    return ready-start
+
+
+def profile(module,top):
+    """
+    Modules with the largest cumulative import time (python -X importtime).
+    """
+    output = subprocess.run([sys.executable,'-X','importtime','-c','import '+module],cwd=ROOT,check=True,
+                            capture_output=True,text=True).stderr
+    rows = []
+    for line in output.splitlines():
+        if line.startswith('import time:') and not 'cumulative' in line:
+            own,cumulative,name = line[len('import time:'):].split('|')
+            rows.append((int(cumulative),int(own),name.rstrip()))
+    return sorted(rows,reverse=True)[:top]
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--module',default='WikiCrawler')
+    arg_parser.add_argument('--repeat',type=int,default=10)
+    arg_parser.add_argument('--max-ms',type=float,default=300,help='maximal median import time')
+    arg_parser.add_argument('--heavy',nargs='*',default=HEAVY,help='modules that must not be loaded by the import')
+    arg_parser.add_argument('--profile',type=int,default=0,help='show the modules with the largest import times')
+    arg_parser.add_argument('--json',default=None,help='append the results as json lines to this file')
+    args = arg_parser.parse_args()
+    sys.path.insert(0,ROOT)
+
+    # measure with byte code, as after an installation (also when PYTHONDONTWRITEBYTECODE is set)
+    compileall.compile_dir(ROOT,maxlevels=0,quiet=1)
+    runs = [importTime(args.module,args.heavy) for _ in range(args.repeat)]
+    imports = [1000*r['seconds'] for r in runs]
+    processes = [1000*r['process_seconds'] for r in runs]
+    spawns = [1000*spawnTime() for _ in range(max(1,args.repeat//2))] if args.module == 'WikiCrawler' else []
+    loaded = sorted(set(m for r in runs for m in r['loaded']))
+
+    print('import %s: median %.1f ms, min %.1f ms, max %.1f ms'%(args.module,median(imports),min(imports),max(imports)))
+    print('interpreter with import: median %.1f ms'%median(processes))
+    if len(spawns) > 0:
+        print('spawned worker ready: median %.1f ms'%median(spawns))
+    for cumulative,own,name in profile(args.module,args.profile) if args.profile else []:
+        print('  %8.1f ms %8.1f ms  %s'%(cumulative/1000,own/1000,name))
+
+    failures = []
+    if median(imports) > args.max_ms:
+        failures.append('median import time %.1f ms exceeds %.1f ms'%(median(imports),args.max_ms))
+    if len(loaded) > 0:
+        failures.append('heavy modules loaded on import: %s'%', '.join(loaded))
+    for failure in failures:
+        print('FAILED: '+failure)
+
+    if args.json:
+        with open(args.json,'a',encoding='utf-8') as fp:
+            fp.write(json.dumps({'module':args.module,'time':time(),'import_ms':imports,'process_ms':processes,
+                                 'spawn_ms':spawns,'loaded':loaded,'failures':failures})+'\n')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""
+Compare the size, write time and random reads of the archive formats (directory, zip, paragraph store) on a corpus
+built from the paragraphs of the saved article html.
+
+Every article gets label lines from a few category sets and a random selection of paragraphs of the fixtures, so
+paragraphs and boilerplate recur across articles as they do in large crawls (share of shared paragraphs: --shared).
+
+Usage:
+    python benchmarks/bench_storage.py [--articles 5000] [--paragraphs 8] [--shared 0.3] [--flush 100]
+                                       [--fixtures benchmarks/fixtures]
+"""
+import os
+import sys
+import glob
+import random
+import argparse
+import tempfile
+from time import perf_counter
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),'..'))
+from WikiText import extractParagraphs
+from WikiArchive import ArchiveWriter,entryName,_readEntry
+from WikiBlocks import STORE_SUFFIX,openStore,closeStore
+
+
+def buildCorpus(fixtures,articles,paragraphs,shared,seed=0):
+    """
+    Returns:
+        dict: title : text (label lines and paragraphs)
+    """
+    pool = []
+    for file_name in sorted(glob.glob(os.path.join(fixtures,'*.html'))):
+        with open(file_name,'r',encoding='utf-8') as fp:
+            pool += extractParagraphs(fp.read())
+    rnd = random.Random(seed)
+    boilerplate = rnd.sample(pool,min(len(pool),20))
+    labels = [', '.join(rnd.sample(['Physics','Biology','History','Mathematics','Computer science','Chemistry',
+                                    'Geography','Philosophy'],3)) for _ in range(10)]
+    corpus = {}
+    for i in range(articles):
+        lines = [rnd.choice(labels),rnd.choice(labels)]
+        for _ in range(paragraphs):
+            if rnd.random() < shared:
+                lines.append(rnd.choice(boilerplate))
+            else:
+                # unique paragraph: a fixture paragraph with a few words of the article
+                words = rnd.choice(pool).split(' ')
+                words.insert(rnd.randrange(len(words)+1),'Article%d'%i)
+                lines.append(' '.join(words))
+        corpus['Article %d'%i] = '\n'.join(lines)
+    return corpus
+
+
+def diskSize(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root,name)) for root,_,names in os.walk(path) for name in names)
+
+
+def measure(path,corpus,flush,reads=1000):
+    if not path.endswith(('.zip',STORE_SUFFIX)):
+        os.mkdir(path)
+    start = perf_counter()
+    with ArchiveWriter(path,buffer_size=flush) as writer:
+        for title,text in corpus.items():
+            writer.write(entryName(title),text,title=title)
+    seconds = perf_counter()-start
+    titles = random.Random(1).sample(list(corpus),min(reads,len(corpus)))
+    start = perf_counter()
+    for title in titles:
+        _readEntry(path,entryName(title))
+    read = perf_counter()-start
+    result = {'bytes':diskSize(path),'seconds':seconds,'read_ms':1000*read/max(1,len(titles))}
+    if path.endswith(STORE_SUFFIX):
+        result['stats'] = openStore(path).stats()
+        closeStore(path)
+    return result
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--articles',type=int,default=5000)
+    arg_parser.add_argument('--paragraphs',type=int,default=8)
+    arg_parser.add_argument('--shared',type=float,default=0.3,help='share of recurring paragraphs')
+    arg_parser.add_argument('--flush',type=int,default=100,help='articles per flush (save_interval of collect)')
+    arg_parser.add_argument('--fixtures',default=os.path.join(os.path.dirname(os.path.abspath(__file__)),'fixtures'))
+    args = arg_parser.parse_args()
+
+    corpus = buildCorpus(args.fixtures,args.articles,args.paragraphs,args.shared)
+    size = sum(len(text.encode()) for text in corpus.values())
+    print('%d articles, %.1f MB text'%(len(corpus),size/1e6))
+    print('  %-12s %10s %8s %10s %12s'%('format','MB','ratio','write s','read ms/art.'))
+    with tempfile.TemporaryDirectory() as folder:
+        for name in ['directory','texts.zip','texts'+STORE_SUFFIX]:
+            result = measure(os.path.join(folder,name),corpus,args.flush)
+            print('  %-12s %10.2f %8.2f %10.3f %12.3f'%(name.split('.')[-1] if '.' in name else name,
+                                                      result['bytes']/1e6,size/result['bytes'],result['seconds'],
+                                                      result['read_ms']))
+            if 'stats' in result:
+                stats = result['stats']
+                print('  %d of %d paragraphs distinct, %d blocks, codec %s, dictionary %s'%(
+                      stats['paragraphs'],stats['references'],stats['blocks'],stats['codec'],stats['dictionary']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+from threading import Thread
+
+from WikiCrawler import AncestorIndex
+
+
+TREE = {'Category:R':[],'Category:A':['Category:R'],'Category:B':['Category:A','Category:C'],
+        'Category:C':['Category:B'],'Category:D':['Category:D','Category:R'],
+        'X':['Category:B'],'Y':['Category:C','Category:D'],'Z':['Category:A']}
+
+
+def test_cycles():
+    index = AncestorIndex()
+    # B and C are parents of each other, D is its own parent
+    assert index.ancestors(TREE,'X') == ['Category:A','Category:B','Category:C','Category:R']
+    assert index.ancestors(TREE,'Y') == ['Category:A','Category:B','Category:C','Category:D','Category:R']
+    assert index.ancestors(TREE,'Category:B') == ['Category:A','Category:B','Category:C','Category:R']
+
+
+def test_max_depth():
+    index = AncestorIndex()
+    assert index.ancestors(TREE,'X',max_depth=1) == ['Category:B']
+    assert index.ancestors(TREE,'X',max_depth=2) == ['Category:A','Category:B','Category:C']
+    assert index.ancestors(TREE,'X',max_depth=3) == ['Category:A','Category:B','Category:C','Category:R']
+    assert index.ancestors(TREE,'X',max_depth=3) == index.ancestors(TREE,'X')
+
+
+def test_order_does_not_depend_on_lookups():
+    first,second = AncestorIndex(),AncestorIndex()
+    first.ancestors(TREE,'Z')
+    second.ancestors(TREE,'Y')
+    for name in ['X','Y','Z']:
+        assert first.ancestors(TREE,name) == second.ancestors(TREE,name)
+
+
+def test_concurrent_lookups():
+    tree = {'Category:0':[]}
+    for i in range(1,300):
+        tree['Category:%d'%i] = ['Category:%d'%(i-1),'Category:%d'%(i//2)]
+    titles = ['Category:%d'%i for i in range(299,0,-1)]
+    expected = {t:AncestorIndex().ancestors(tree,t) for t in titles}
+    index = AncestorIndex()
+    results = [{} for _ in range(4)]
+
+    def lookup(result,names):
+        for name in names:
+            result[name] = index.ancestors(tree,name)
+
+    threads = [Thread(target=lookup,args=(results[i],titles[i::2]+titles)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for result in results:
+        assert all(result[t] == expected[t] for t in result)
@@ -0,0 +1,61 @@
+from math import ceil
+
+from MockWiki import MockWikiServer,SyntheticWiki,RecordedResponses
+from WikiApi import MediaWikiApi
+
+
+def makeWiki(**kwargs):
+    return SyntheticWiki(**dict(dict(depth=1,fan_out=3,articles_per_category=6,links=8,paragraphs=1,shared=0.5,
+                                     seed=4),**kwargs))
+
+
+def test_batches_of_titles():
+    wiki = makeWiki()
+    titles = sorted(wiki.articles)+sorted(wiki.categories)
+    with MockWikiServer(wiki) as server:
+        api = MediaWikiApi(api_url=server.url,batch_size=10)
+        pages = api.loadPages(titles+['Missing page'],['pageid'])
+    assert api.request_count == server.request_count == ceil((len(titles)+1)/10)
+    assert {title:data['pageid'] for title,data in pages.items()} == dict({t:wiki.ids[t] for t in titles},
+                                                                          **{'Missing page':0})
+
+
+def test_continuation_is_merged():
+    wiki = makeWiki(limit=7)
+    titles = sorted(wiki.articles)[:12]
+    with MockWikiServer(wiki) as server:
+        api = MediaWikiApi(api_url=server.url,batch_size=50)
+        pages = api.loadPages(titles,['categories','links'])
+    for title in titles:
+        assert pages[title]['categories'] == wiki.articles[title]['categories']
+        assert pages[title]['links'] == wiki.articles[title]['links']
+    # categories and links continue in the same responses
+    categories = sum(len(wiki.articles[t]['categories']) for t in titles)
+    links = sum(len(wiki.articles[t]['links']) for t in titles)
+    assert api.request_count == max(ceil(categories/7),ceil(links/7))
+
+
+def test_extracts_take_one_request_per_title():
+    wiki = makeWiki()
+    titles = sorted(wiki.articles)[:5]
+    with MockWikiServer(wiki) as server:
+        api = MediaWikiApi(api_url=server.url,record=True)
+        pages = api.loadPages(titles,['categories','extract'])
+    assert [pages[t]['extract'] for t in titles] == [wiki.articles[t]['text'] for t in titles]
+    assert api.request_count == len(titles)
+    assert all('exlimit=max' in key for key in api.recorded)
+
+
+def test_recorded_responses_are_replayed():
+    wiki = makeWiki(limit=5)
+    titles = sorted(wiki.articles)[:8]
+    with MockWikiServer(wiki) as server:
+        api = MediaWikiApi(api_url=server.url,record=True)
+        pages = api.loadPages(titles,['pageid','categories','links'])
+        members = api.categoryMembers('Category:Root')
+
+    with MockWikiServer(RecordedResponses(api.recorded)) as server:
+        replay = MediaWikiApi(api_url=server.url)
+        assert replay.loadPages(titles,['pageid','categories','links']) == pages
+        assert replay.categoryMembers('Category:Root') == members
+        assert replay.request_count == api.request_count
@@ -0,0 +1,135 @@
+import os
+import random
+import zipfile
+
+import pytest
+
+from WikiArchive import ArchiveWriter,ArchiveManifest,CorpusReader,entryName,removeEntries,archiveFiles
+
+
+def writeArticles(path,titles):
+    with ArchiveWriter(path) as writer:
+        for title in titles:
+            writer.write(entryName(title),'Physics\n\n%s text'%title,title=title)
+
+
+def readTitles(path,titles):
+    return sorted(record.title for record in CorpusReader(path,titles=titles))
+
+
+def test_reader_sees_appended_and_removed_entries(tmp_path):
+    path = str(tmp_path/'texts.zip')
+    titles = ['A','B','C','D']
+    writeArticles(path,titles[:2])
+    assert readTitles(path,titles) == ['A','B']
+
+    writeArticles(path,titles[2:])
+    assert readTitles(path,titles) == ['A','B','C','D']
+
+    removeEntries(path,{entryName('B')})
+    assert readTitles(path,titles) == ['A','C','D']
+
+
+def test_writer_rebuilds_missing_manifest(tmp_path):
+    path = str(tmp_path/'texts.zip')
+    # archive of an older version: entries without manifest
+    with ArchiveWriter(path) as writer:
+        writer.write(entryName('A'),'Physics\n\nA text')
+    assert not ArchiveManifest(path).exists()
+
+    with ArchiveWriter(path,titles=['A','B']) as writer:
+        writer.write(entryName('B'),'Physics\n\nB text',title='B')
+    manifest = ArchiveManifest(path)
+    assert 'A' in manifest and 'B' in manifest
+    assert manifest.missing(['A','B']) == []
+
+
+def test_reader_with_workers_twice(tmp_path):
+    path = str(tmp_path/'texts.zip')
+    titles = ['Article %d'%i for i in range(3000)]
+    with ArchiveWriter(path,buffer_size=500) as writer:
+        for title in titles:
+            writer.write(entryName(title),'Physics\n\n%s\n%s'%(title,' '.join([title]*50)),title=title)
+    reader = CorpusReader(path,titles=titles,workers=4,chunk_size=32)
+    for _ in range(2):
+        assert len(reader) == 3000
+        assert sorted(record.title for record in reader) == sorted(titles)
+
+
+def test_category_filter_uses_manifest_labels(tmp_path,monkeypatch):
+    import WikiArchive
+    path = str(tmp_path/'texts.zip')
+    with ArchiveWriter(path) as writer:
+        writer.write(entryName('A'),'Physics, Science\nMechanics\nA text',title='A')
+        writer.write(entryName('B'),'Biology\nGenetics\nB text',title='B')
+        writer.write(entryName('C'),'Chemistry\nPhysics\nC text',title='C')
+    read = []
+    readEntry = WikiArchive._readEntry
+    monkeypatch.setattr(WikiArchive,'_readEntry',lambda source,name,*args:read.append(name) or readEntry(source,name,*args))
+
+    records = list(CorpusReader(path,titles=['A','B','C'],categories=['Physics']))
+    assert [r.title for r in records] == ['A']
+    assert read == [entryName('A')]
+    records = list(CorpusReader(path,titles=['A','B','C'],categories=['Physics'],match_direct=True))
+    assert [r.title for r in records] == ['A','C']
+
+
+def test_shard_mb_is_checked_per_entry(tmp_path):
+    path = str(tmp_path/'texts.zip')
+    rand = random.Random(1)
+    titles = ['Article %d'%i for i in range(60)]
+    # incompressible texts of about 2 kB
+    texts = {t:'Physics\n\n'+''.join(rand.choice('abcdefghijklmnopqrstuvwxyz0123456789') for _ in range(2000))
+             for t in titles}
+    with ArchiveWriter(path,buffer_size=100,shard_mb=0.01) as writer:
+        for title in titles:
+            writer.write(entryName(title),texts[title],title=title)
+    shards = archiveFiles(path)
+    assert len(shards) > 5
+    for shard in shards:
+        with zipfile.ZipFile(shard,'r') as zf:
+            entries = len(zf.namelist())
+        # one entry beyond the limit at most (plus its central directory record)
+        assert os.path.getsize(shard) < 0.01e6+2*2200+entries*100
+    assert readTitles(path,titles) == sorted(titles)
+
+
+@pytest.mark.parametrize('shard_articles',[None,3])
+def test_interrupted_flush_keeps_manifest_and_archive_consistent(tmp_path,monkeypatch,shard_articles):
+    path = str(tmp_path/'texts.zip')
+    titles = ['Article %d'%i for i in range(10)]
+    writer = ArchiveWriter(path,buffer_size=100,shard_articles=shard_articles)
+    for title in titles:
+        writer.write(entryName(title),'Physics\n\n%s text'%title,title=title)
+
+    writestr = zipfile.ZipFile.writestr
+    calls = []
+    def interrupted(zf,*args,**kwargs):
+        calls.append(None)
+        if len(calls) == 5:
+            raise KeyboardInterrupt()
+        return writestr(zf,*args,**kwargs)
+    monkeypatch.setattr(zipfile.ZipFile,'writestr',interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        writer.flush()
+    monkeypatch.undo()
+
+    def stored():
+        names = set()
+        for shard in archiveFiles(path):
+            with zipfile.ZipFile(shard,'r') as zf:
+                assert zf.testzip() is None
+                names.update(zf.namelist())
+        return names
+    manifest = ArchiveManifest(path)
+    assert sorted(manifest.entries) == sorted(titles[:4])
+    assert set(record['key'] for record in manifest.entries.values()) == stored()
+    assert readTitles(path,titles) == sorted(titles[:4])
+
+    # the entries that were not written stay buffered and are written by the next flush
+    assert len(writer.buffer) == 6
+    writer.close()
+    manifest = ArchiveManifest(path)
+    assert sorted(manifest.entries) == sorted(titles)
+    assert set(record['key'] for record in manifest.entries.values()) == stored()
+    assert readTitles(path,titles) == sorted(titles)
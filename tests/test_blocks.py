@@ -0,0 +1,101 @@
+import random
+
+import pytest
+
+from WikiBlocks import ParagraphStore,zstandard
+
+WORDS = ('network','history','theory','city','river','language','science','system','music','century')
+
+
+@pytest.fixture(params=['zlib','zstd'])
+def codec(request):
+    if request.param == 'zstd' and zstandard is None:
+        pytest.skip('zstandard is not installed')
+    return request.param
+
+
+def makeTexts(n=40,seed=1):
+    rand = random.Random(seed)
+    shared = [' '.join(rand.choice(WORDS) for _ in range(30)) for _ in range(5)]
+    texts = {}
+    for i in range(n):
+        own = [' '.join(rand.choice(WORDS) for _ in range(rand.randint(10,40))) for _ in range(3)]
+        texts['Article %d'%i] = '\n'.join(['Physics, Science','Mechanics']+own+rand.sample(shared,2))
+    return texts
+
+
+def distinct(texts):
+    return len(set(line for text in texts for line in text.split('\n')))
+
+
+def openStore(path,codec,create=True):
+    return ParagraphStore(str(path),create=create,codec=codec,block_size=2000,train_bytes=3000,dict_size=2000)
+
+
+def test_round_trip_and_reopen(tmp_path,codec):
+    texts = makeTexts()
+    store = openStore(tmp_path/'texts.wds',codec)
+    for name,text in texts.items():
+        store.add(name,text)
+    # pending and flushed articles read the same
+    assert store.get('Article 0') == texts['Article 0']
+    store.close()
+
+    store = openStore(tmp_path/'texts.wds',codec,create=False)
+    assert store.names() == list(texts)
+    assert all(store.get(name) == text for name,text in texts.items())
+    stats = store.stats()
+    assert stats['codec'] == codec and stats['dictionary'] and stats['blocks'] > 1
+    assert stats['references'] == sum(len(text.split('\n')) for text in texts.values())
+    # label lines and shared paragraphs are stored once
+    assert stats['paragraphs'] == distinct(texts.values())
+    store.close()
+
+
+def test_replaced_article_reads_the_new_text(tmp_path,codec):
+    store = openStore(tmp_path/'texts.wds',codec)
+    store.add('A','Physics\n\nfirst text')
+    store.flush()
+    store.add('A','Physics\n\nsecond text')
+    store.close()
+    store = openStore(tmp_path/'texts.wds',codec,create=False)
+    assert len(store) == 1 and store.get('A') == 'Physics\n\nsecond text'
+
+
+def test_remove_and_compact(tmp_path,codec):
+    texts = makeTexts()
+    store = openStore(tmp_path/'texts.wds',codec)
+    for name,text in texts.items():
+        store.add(name,text)
+    removed = ['Article %d'%i for i in range(0,40,2)]
+    store.remove(removed)
+    before = store.stats()
+    assert before['articles'] == 20 and before['paragraphs'] == distinct(texts.values())
+
+    store.compact()
+    kept = {name:text for name,text in texts.items() if not name in removed}
+    after = store.stats()
+    assert after['articles'] == 20 and after['paragraphs'] == distinct(kept.values())
+    assert after['bytes'] < before['bytes']
+    assert all(store.get(name) == text for name,text in kept.items())
+    store.close()
+
+    store = openStore(tmp_path/'texts.wds',codec,create=False)
+    assert store.names() == list(kept)
+    assert not any(name in store for name in removed)
+    store.close()
+
+
+def test_partially_written_index_is_ignored(tmp_path,codec):
+    store = openStore(tmp_path/'texts.wds',codec)
+    store.add('A','Physics\n\nA text')
+    store.close()
+    # a crash during a flush leaves a torn line
+    with open(str(tmp_path/'texts.wds'/'articles.idx'),'ab') as fp:
+        fp.write(b'123\t4\tB')
+    store = openStore(tmp_path/'texts.wds',codec,create=False)
+    assert store.names() == ['A']
+    store.add('C','Physics\n\nC text')
+    store.close()
+    store = openStore(tmp_path/'texts.wds',codec,create=False)
+    assert store.names() == ['A','C'] and store.get('C') == 'Physics\n\nC text'
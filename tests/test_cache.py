@@ -0,0 +1,66 @@
+import pytest
+
+import WikiApi
+from MockWiki import MockWikiServer,SyntheticWiki
+from WikiApi import MediaWikiApi,ResponseCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(WikiApi,'time',lambda: now[0])
+    return now
+
+
+def test_entries_expire_after_ttl(tmp_path,clock):
+    cache = ResponseCache(str(tmp_path/'cache.db'),ttl=60)
+    cache.put('en','A','categories',['Category:X'])
+    clock[0] += 30
+    assert cache.get('en','A','categories') == ['Category:X']
+    clock[0] += 31
+    assert cache.get('en','A','categories') is None
+    assert cache.info()['stale'] == 1 and cache.info()['hits'] == 1
+    assert cache.purge() == 1
+    assert cache.info()['entries'] == 0
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path,clock):
+    cache = ResponseCache(str(tmp_path/'cache.db'),max_mb=0.001)
+    # 300 bytes per entry: the fourth entry exceeds 1000 bytes, eviction goes down to 900
+    value = 'x'*298
+    for title in ['A','B','C']:
+        cache.put('en',title,'extract',value)
+        clock[0] += 1
+    # A is used again, so B is the least recently used entry
+    assert cache.get('en','A','extract') == value
+    clock[0] += 1
+    cache.put('en','D','extract',value)
+    assert cache.get('en','B','extract') is None
+    assert all(cache.get('en',title,'extract') == value for title in ['A','C','D'])
+    info = cache.info()
+    assert info['evicted'] == 1 and info['entries'] == 3
+    assert info['size_mb'] <= 0.001
+
+
+def test_revalidation_by_revision(tmp_path):
+    wiki = SyntheticWiki(depth=1,fan_out=2,articles_per_category=3,links=2,paragraphs=1,seed=1)
+    titles = sorted(wiki.articles)
+    with MockWikiServer(wiki) as server:
+        cache = ResponseCache(str(tmp_path/'cache.db'),revalidate=True)
+        api = MediaWikiApi(api_url=server.url,cache=cache)
+        first = api.loadPages(titles,['categories'])
+        assert api.request_count == 2
+
+        # only the revisions are requested again
+        assert api.loadPages(titles,['categories']) == first
+        assert api.request_count == 3
+        assert cache.get('en',titles[0],'categories',revid=first[titles[0]]['lastrevid']) == \
+            first[titles[0]]['categories']
+
+        wiki.articles[titles[0]]['categories'] = ['Category:Root-1']
+        wiki.edit([titles[0]])
+        second = api.loadPages(titles,['categories'])
+        assert api.request_count == 5
+        assert second[titles[0]]['categories'] == ['Category:Root-1']
+        assert second[titles[0]]['lastrevid'] == first[titles[0]]['lastrevid']+1
+        assert {t:second[t] for t in titles[1:]} == {t:first[t] for t in titles[1:]}
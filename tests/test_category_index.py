@@ -0,0 +1,35 @@
+from WikiCrawler import AncestorIndex,CategoryIndex
+
+
+def subtreeCounts(tree,articles):
+    index = CategoryIndex()
+    index.build(tree,articles,'Category')
+    ancestors = AncestorIndex()
+    return {name:index.subtreeCounts(name,ancestors) for name in tree}
+
+
+def test_deep_chain():
+    depth = 2000
+    tree = {'Category:0':[]}
+    articles = {}
+    for i in range(1,depth):
+        tree['Category:%d'%i] = ['Category:%d'%(i-1)]
+    for i in range(depth):
+        tree['A%d'%i] = ['Category:%d'%i]
+        articles['A%d'%i] = 'Category:%d'%i
+    counts = subtreeCounts(tree,articles)
+    assert counts['Category:0'] == (depth-1,depth)
+    assert counts['Category:1500'] == (depth-1501,depth-1500)
+
+
+def test_shared_entries_and_cycles():
+    tree = {'Category:R':[],'Category:A':['Category:R'],'Category:B':['Category:R','Category:C'],
+            'Category:C':['Category:B'],'Category:D':['Category:D','Category:A'],
+            'X':['Category:A','Category:B'],'Y':['Category:C'],'Z':['Category:D']}
+    counts = subtreeCounts(tree,{'X':'Category:A','Y':'Category:C','Z':'Category:D'})
+    assert counts['Category:R'] == (4,3)
+    assert counts['Category:A'] == (1,2)
+    # B and C are below each other, but not below themselves
+    assert counts['Category:B'] == (1,2)
+    assert counts['Category:C'] == (1,2)
+    assert counts['Category:D'] == (0,1)
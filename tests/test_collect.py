@@ -0,0 +1,52 @@
+import os
+import zipfile
+
+import pytest
+
+from MockWiki import MockWikiServer,SyntheticWiki
+from WikiArchive import CorpusReader
+from WikiCrawler import KnowledgeNet
+
+
+@pytest.fixture(scope='module')
+def wiki():
+    wiki = SyntheticWiki(depth=2,fan_out=3,articles_per_category=4,links=3,paragraphs=2,shared=0.5,seed=3)
+    with MockWikiServer(wiki) as server:
+        wiki.url = server.url
+        yield wiki
+
+
+def collectedNet(wiki,path,workers,**kwargs):
+    net = KnowledgeNet()
+    net.setDisplay('none')
+    net.setBackend(True,api_url=wiki.url)
+    net.startScan('Category:Root',depth=3,verbose=0)
+    net.collect(links=True,text=True,archive_path=path,workers=workers,verbose=0,**kwargs)
+    return net
+
+
+def zipContents(path):
+    with zipfile.ZipFile(path) as zf:
+        return [(name,zf.read(name)) for name in zf.namelist()]
+
+
+def directoryContents(path):
+    contents = {}
+    for name in os.listdir(path):
+        with open(os.path.join(path,name),'rb') as fp:
+            contents[name] = fp.read()
+    return contents
+
+
+def storeContents(path):
+    return [tuple(record) for record in CorpusReader(path)]
+
+
+@pytest.mark.parametrize('kwargs,suffix,contents',[({'zipped':True},'.zip',zipContents),({},'',directoryContents),
+                                                   ({'deduplicated':True},'.wds',storeContents)])
+def test_pipelined_archive_equals_sequential(wiki,tmp_path,kwargs,suffix,contents):
+    sequential = collectedNet(wiki,str(tmp_path/'sequential'),1,**kwargs)
+    pipelined = collectedNet(wiki,str(tmp_path/'pipelined'),4,**kwargs)
+    assert contents(str(tmp_path/'sequential')+suffix) == contents(str(tmp_path/'pipelined')+suffix)
+    assert list(sequential.links.items()) == list(pipelined.links.items())
+    assert list(sequential.article_categories.items()) == list(pipelined.article_categories.items())
@@ -0,0 +1,63 @@
+import dill
+
+from MockWiki import MockWikiServer,SyntheticWiki
+from WikiCrawler import KnowledgeNet,OpenCategories,ClosedCategories
+
+
+def test_open_categories_by_level():
+    frontier = OpenCategories({'Category:A':1,'Category:B':2,'Category:C':1})
+    assert frontier.minLevel() == 1
+    assert frontier.atLevel(1) == ['Category:A','Category:C']
+    # found again on another level: moves to the end of that level
+    frontier['Category:A'] = 2
+    assert frontier.atLevel(1) == ['Category:C'] and frontier.atLevel(2) == ['Category:B','Category:A']
+    assert frontier.pop('Category:C') == 1
+    assert frontier.minLevel() == 2 and frontier.atLevel(1) == []
+    del frontier['Category:B']
+    assert dict(frontier) == {'Category:A':2} and frontier.levels == {2:{'Category:A':None}}
+    assert frontier.pop('Category:X',None) is None
+
+    loaded = dill.loads(dill.dumps(frontier))
+    assert dict(loaded) == dict(frontier) and loaded.levels == frontier.levels
+
+
+def test_closed_categories_keep_order():
+    closed = ClosedCategories(['Category:A','Category:B'])
+    closed.append('Category:C')
+    closed.append('Category:A')
+    assert list(closed) == ['Category:A','Category:B','Category:C'] and len(closed) == 3
+    assert 'Category:B' in closed and not 'Category:D' in closed
+    closed.remove('Category:B')
+    assert list(dill.loads(dill.dumps(closed))) == ['Category:A','Category:C']
+
+
+def test_nets_of_older_versions_are_converted(tmp_path):
+    net = KnowledgeNet()
+    net.setDisplay('none')
+    # the former plain list and dict, parents could be listed twice
+    net.closed_categories = ['Category:Root','Category:Root-0']
+    net.open_categories = {'Category:Root-1':1,'Category:Root-0-0':2}
+    net.category_tree = {'Category:Root-0':['Category:Root','Category:Root'],'A':['Category:Root-0']}
+    net.save(str(tmp_path/'net.pkl'))
+
+    loaded = KnowledgeNet.load(str(tmp_path/'net.pkl'))
+    assert isinstance(loaded.closed_categories,ClosedCategories)
+    assert list(loaded.closed_categories) == ['Category:Root','Category:Root-0']
+    assert isinstance(loaded.open_categories,OpenCategories) and loaded.open_categories.atLevel(2) == ['Category:Root-0-0']
+    assert dict(loaded.category_tree) == {'Category:Root-0':['Category:Root'],'A':['Category:Root-0']}
+
+
+def test_crawl_visits_levels_in_order():
+    wiki = SyntheticWiki(depth=2,fan_out=2,articles_per_category=2,links=1,paragraphs=1,shared=0.5,seed=2)
+    with MockWikiServer(wiki) as server:
+        net = KnowledgeNet()
+        net.setDisplay('none')
+        net.setBackend(True,api_url=server.url)
+        net.startScan('Category:Root',depth=2,verbose=0)
+        assert list(net.closed_categories) == ['Category:Root','Category:Root-0','Category:Root-1']
+        assert sorted(net.open_categories.atLevel(2)) == sorted(c for c in wiki.categories if c.count('-') == 2)
+        net.crawlDeeper(verbose=0)
+    levels = [c.count('-') for c in net.closed_categories]
+    assert levels == sorted(levels) and len(net.open_categories) == 0
+    assert all(len(parents) == len(set(parents)) for parents in net.category_tree.values())
+    assert sorted(net.articles) == sorted(wiki.articles)
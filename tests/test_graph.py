@@ -0,0 +1,54 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from WikiGraph import LinkGraph
+
+# A links to B, C and the outside title X; B to C; C to A; D has no links (dangling)
+LINKS = {'A':['B','C','X'],'B':['C'],'C':['A'],'D':[]}
+
+
+def test_csr_layout():
+    graph = LinkGraph.fromLinks(LINKS)
+    assert graph.n_inside == 4 and graph.n == 5
+    assert graph.titles() == ['A','B','C','D','X']
+    assert graph.indptr.tolist() == [0,3,4,5,5]
+    assert graph.indices.tolist() == [1,2,4,2,0]
+    assert graph.inDegree().tolist() == [1,1,2,0,1]
+    assert graph.outDegree().tolist() == [3,1,1,0]
+    assert graph.firstLinked().tolist() == [4,0,1,5,2]
+
+
+@pytest.mark.parametrize('mmap',[True,False])
+def test_csr_round_trip(tmp_path,mmap):
+    graph = LinkGraph.fromLinks(LINKS)
+    graph.save(str(tmp_path/'graph'))
+    loaded = LinkGraph.load(str(tmp_path/'graph'),mmap=mmap)
+    assert loaded.n_inside == graph.n_inside and loaded.n == graph.n
+    for name in LinkGraph.files:
+        assert np.array_equal(getattr(loaded,name),getattr(graph,name))
+    assert {title:loaded.links(title) for title in LINKS} == LINKS
+    assert loaded.links('X') == []
+
+
+def test_pagerank_of_a_cycle_is_uniform():
+    rank = LinkGraph.fromLinks({'A':['B'],'B':['C'],'C':['A']}).pageRank()
+    assert np.allclose(rank,[1/3,1/3,1/3])
+
+
+def test_pagerank_with_dangling_node():
+    damping = 0.85
+    rank = LinkGraph.fromLinks(LINKS).pageRank(damping=damping,tol=1e-12,max_iter=1000)
+    assert rank.sum() == pytest.approx(1)
+    # r = (1-d)/n + d*(M r + r_D/n) with the links inside: A->B, A->C, B->C, C->A, D dangling
+    n = 4
+    M = np.zeros((n,n))
+    M[1,0] = M[2,0] = 0.5
+    M[2,1] = 1
+    M[0,2] = 1
+    M[:,3] = 1/n
+    expected = np.linalg.solve(np.eye(n)-damping*M,np.full(n,(1-damping)/n))
+    assert np.allclose(rank,expected,atol=1e-9)
+    # C gets the links of A and B, the dangling D only the teleport and dangling share
+    assert list(np.argsort(-rank)) == [2,0,1,3]
+    assert rank[3] == pytest.approx((1-damping)/n+damping*rank[3]/n)
@@ -0,0 +1,32 @@
+from MockWiki import MockWikiServer,SyntheticWiki
+from WikiCrawler import MultiLanguageNet
+
+
+def test_languages_are_crawled_with_a_shared_scheduler():
+    en = SyntheticWiki(depth=1,fan_out=2,articles_per_category=3,links=2,paragraphs=1,seed=1)
+    de = SyntheticWiki(depth=1,fan_out=2,articles_per_category=3,links=2,paragraphs=1,seed=1,root='Kategorie:Wurzel')
+    # every English article except the last one has a German version
+    en_titles = sorted(en.articles)
+    en.langlinks = {title:{'de':title.replace('Root','Wurzel'),'fr':'Article'} for title in en_titles[:-1]}
+
+    with MockWikiServer(en) as en_server,MockWikiServer(de) as de_server:
+        nets = MultiLanguageNet(['en','de'],api_urls={'en':en_server.url,'de':de_server.url})
+        for net in nets.nets.values():
+            net.setDisplay('none')
+        assert nets['en'].scheduler is nets['de'].scheduler is nets.scheduler
+        # the category namespace of each language is taken from its siteinfo
+        assert nets['de'].categoryLabel() == 'Kategorie'
+
+        nets.startScan({'en':'Category:Root','de':'Kategorie:Wurzel'},depth=2)
+        assert sorted(nets['en'].articles) == en_titles
+        assert sorted(nets['de'].articles) == sorted(de.articles)
+        assert list(nets['de'].closed_categories)[0] == 'Kategorie:Wurzel'
+
+        assert nets.alignArticles('en') == {'de':len(en_titles)-1}
+        assert nets.aligned['en'][en_titles[0]] == {'de':en_titles[0].replace('Root','Wurzel')}
+        assert sorted(nets.parallelArticles('en','de')) == [(t,t.replace('Root','Wurzel')) for t in en_titles[:-1]]
+
+        stats = nets.stats()
+        assert stats['en']['requests'] == en_server.request_count
+        assert stats['de']['requests'] == de_server.request_count
+        assert stats['de']['articles'] == len(de.articles) and stats['de']['categories'] == 3
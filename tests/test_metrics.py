@@ -0,0 +1,69 @@
+import json
+
+from MockWiki import MockWikiServer,SyntheticWiki
+from WikiCrawler import KnowledgeNet
+from WikiMetrics import Metrics,JsonLinesSink,PrometheusSink
+
+
+def readJsonLines(path):
+    with open(path,'r',encoding='utf-8') as fp:
+        return [json.loads(line) for line in fp]
+
+
+def test_sinks_export_snapshots(tmp_path):
+    jsonl,prom = str(tmp_path/'metrics.jsonl'),str(tmp_path/'metrics.prom')
+    metrics = Metrics([JsonLinesSink(jsonl),PrometheusSink(prom)],interval=3600)
+    metrics.add('store',0.5)
+    metrics.add('store',0.25)
+    metrics.count('articles_collected',3)
+    for seconds in [0.005,0.02,0.02,3]:
+        metrics.observe('request_seconds',seconds,'categories')
+    metrics.export(force=True)
+    # within the interval nothing is exported
+    metrics.count('articles_collected')
+    metrics.export()
+
+    snapshots = readJsonLines(jsonl)
+    assert len(snapshots) == 1
+    assert snapshots[0]['timers'] == {'store':{'calls':2,'seconds':0.75}}
+    assert snapshots[0]['counters'] == {'articles_collected':3}
+    histogram = snapshots[0]['histograms']['request_seconds']['categories']
+    assert histogram['buckets'] == [1,2,0,0,0,0,0,0,1,0,0] and histogram['sum'] == 3.045
+
+    with open(prom,'r',encoding='utf-8') as fp:
+        lines = fp.read().splitlines()
+    assert 'wikicrawler_stage_seconds_total{stage="store"} 0.750000' in lines
+    assert 'wikicrawler_stage_calls_total{stage="store"} 2' in lines
+    assert 'wikicrawler_articles_collected_total 3' in lines
+    # buckets are cumulative
+    assert 'wikicrawler_request_seconds_bucket{kind="categories",le="0.025"} 3' in lines
+    assert 'wikicrawler_request_seconds_bucket{kind="categories",le="+Inf"} 4' in lines
+    assert 'wikicrawler_request_seconds_count{kind="categories"} 4' in lines
+
+    metrics.export(force=True)
+    assert readJsonLines(jsonl)[-1]['counters'] == {'articles_collected':4}
+
+
+def test_collect_reports_stages(tmp_path,capsys):
+    wiki = SyntheticWiki(depth=1,fan_out=2,articles_per_category=3,links=2,paragraphs=2,seed=1)
+    jsonl = str(tmp_path/'metrics.jsonl')
+    with MockWikiServer(wiki) as server:
+        net = KnowledgeNet()
+        net.setDisplay('none')
+        net.setBackend(True,api_url=server.url)
+        net.startScan('Category:Root',depth=2,verbose=0)
+        net.setMetrics(jsonl_path=jsonl,prometheus_path=str(tmp_path/'metrics.prom'),interval=3600)
+        scanned = server.request_count
+        net.collect(links=True,text=True,archive_path=str(tmp_path/'texts'),zipped=True,verbose=0)
+
+    snapshot = readJsonLines(jsonl)[-1]
+    assert snapshot['counters']['articles_collected'] == len(wiki.articles)
+    assert snapshot['counters']['bytes_written'] > 0 and snapshot['counters']['bytes_fetched'] > 0
+    assert {'fetch_page','extract_text','save_text','retrieve_categories'}.issubset(snapshot['timers'])
+    requests = sum(sum(h['buckets']) for h in snapshot['histograms']['request_seconds'].values())
+    # every request of the collection is in the latency histogram
+    assert requests == server.request_count-scanned > 0
+
+    capsys.readouterr()
+    net.printProtocol(level=0)
+    assert 'extract_text' in capsys.readouterr().out
@@ -0,0 +1,105 @@
+import threading
+from time import sleep
+
+import pytest
+
+from MockWiki import MockWikiServer,SyntheticWiki,FaultyResponses,DelayedResponses
+from WikiApi import RequestFailed
+from WikiCrawler import KnowledgeNet
+from WikiQueue import openQueue,TaskFailed
+
+FAST_BACKOFF = {'network':(0.001,0.01),'server':(0.001,0.01),'ratelimit':(0.001,0.01),'maxlag':(0.001,0.01)}
+
+
+@pytest.fixture(params=['queue.db','queue'])
+def queue(request,tmp_path):
+    queue = openQueue(str(tmp_path/request.param),max_attempts=2)
+    yield queue
+    queue.close()
+
+
+def test_expired_lease_is_handed_out_again(queue):
+    queue.submit('job','articles',['a','b'])
+    first = queue.lease('w1',seconds=0.05)
+    assert first.payload == 'a'
+    sleep(0.1)
+    again = queue.lease('w2',seconds=60)
+    assert again.seq == first.seq and again.payload == 'a'
+    # the former holder lost the lease: its renewal and its result are refused
+    assert not first.renew(60)
+    assert not first.complete('stale')
+    assert again.complete('fresh')
+    assert queue.results('job') == {0:'fresh'}
+    assert queue.progress('job')['done'] == 1
+
+
+def test_renewed_lease_does_not_expire(queue):
+    queue.submit('job','articles',['a'])
+    lease = queue.lease('w1',seconds=0.05)
+    assert lease.renew(60)
+    sleep(0.1)
+    assert type(queue.lease('w2',seconds=60)) == type(None)
+    assert lease.complete('done')
+    assert queue.results('job') == {0:'done'}
+
+
+def test_task_fails_after_max_attempts(queue):
+    queue.submit('job','articles',['a'])
+    for _ in range(2):
+        lease = queue.lease('w1',seconds=0.01)
+        assert lease.payload == 'a'
+        sleep(0.05)
+    assert type(queue.lease('w1',seconds=60)) == type(None)
+    assert not lease.complete('late')
+    result = queue.results('job')[0]
+    assert isinstance(result,TaskFailed)
+
+
+def startWorker(url,queue,**settings):
+    net = KnowledgeNet()
+    net.setDisplay('none')
+    net.setBackend(True,api_url=url)
+    net.setRetries(max_retries=1,backoff=FAST_BACKOFF)
+    for name,value in settings.items():
+        setattr(net,name,value)
+    thread = threading.Thread(target=net.work,args=(queue,),kwargs={'idle_timeout':1},daemon=True)
+    thread.start()
+    return net,thread
+
+
+def test_worker_failures_are_merged_into_skipped_by_problem(tmp_path):
+    responder = FaultyResponses(SyntheticWiki(depth=1,fan_out=2,articles_per_category=2,links=2,paragraphs=1,seed=1),
+                                {},retry_after=0.01,seed=2)
+    with MockWikiServer(responder) as server:
+        net = KnowledgeNet()
+        net.setDisplay('none')
+        net.setBackend(True,api_url=server.url)
+        net.startScan('Category:Root',depth=2,verbose=0)
+        assert len(net.articles) == 6
+
+        path = str(tmp_path/'queue')
+        net.setQueue(path,task_size=4,poll_interval=0.01)
+        worker,thread = startWorker(server.url,openQueue(path),poll_interval=0.01)
+        responder.rates = {'unavailable':1.0}
+        net.collect(links=True,text=False,verbose=0)
+        thread.join()
+    assert sorted(net.skipped_by_problem) == sorted(net.articles)
+    assert set(net.skipped_by_problem.values()) == {RequestFailed}
+
+
+def test_categories_task_renews_its_lease(tmp_path):
+    wiki = SyntheticWiki(depth=1,fan_out=6,articles_per_category=2,links=0,paragraphs=1,seed=1)
+    with MockWikiServer(DelayedResponses(wiki,latency=0.1,jitter=0,seed=1)) as server:
+        net = KnowledgeNet()
+        net.setDisplay('none')
+        net.setBackend(True,api_url=server.url)
+        net.lease_seconds = 0.3
+        queue = openQueue(str(tmp_path/'queue.db'))
+        categories = sorted(cat for cat in wiki.categories if not cat == 'Category:Root')
+        queue.submit('job','categories',[dict(net._taskSettings(),items=categories)])
+        lease = queue.lease('w1',seconds=net.lease_seconds)
+        result = net.runTask(lease)
+        # fetching the categories took longer than one lease, but it was not handed out again
+        assert sorted(result) == categories
+        assert type(queue.lease('w2',seconds=60)) == type(None)
+        assert lease.complete(result)
@@ -0,0 +1,43 @@
+import re
+
+from WikiCrawler import KnowledgeNet,RuleSet,ruleSet
+
+RULES = ['Category:Living','.*stub','Category:[0-9]+ births','Category:Living people']
+CATEGORIES = ['Category:Living people','Category:Physics stubs','Category:1950 births','Category:Physics',
+              'Category:People living in Berlin','Category:Births']
+
+
+def test_matches_like_single_rules():
+    rules = RuleSet(RULES)
+    for cat in CATEGORIES:
+        assert rules.matches(cat) == tuple(rule for rule in RULES if re.match(rule,cat))
+    assert rules.matches('Category:Living people') == ('Category:Living','Category:Living people')
+    assert rules.matches('Category:Physics') == ()
+    # verdicts are cached per category
+    assert set(rules.verdicts) == set(CATEGORIES)
+
+
+def test_rules_that_cannot_be_combined():
+    # group names must be unique in a combined pattern, so each rule is applied on its own
+    rules = RuleSet(['(?P<x>A).*','(?P<x>B).*'])
+    assert rules.combined is None
+    assert rules.matches('Apple') == ('(?P<x>A).*',)
+    assert rules.matches('Cherry') == ()
+    assert RuleSet([]).matches('Anything') == ()
+
+
+def test_rule_sets_are_shared():
+    assert ruleSet(tuple(RULES)) is ruleSet(tuple(RULES))
+
+
+def test_checkValid_reports_matching_rules():
+    net = KnowledgeNet()
+    net.setDisplay('none')
+    net.skip_rules = ['.*stub']
+    valid = net.checkValid('A',['Category:Physics stubs','Category:Living people','Category:Physics'],
+                           ['Category:Physics'],['Category:Living'])
+    assert not valid
+    assert net.skipped_by_rule['A'] == [['Category:Physics stubs','.*stub'],['Category:Living people','Category:Living']]
+    assert net.skipped_by_category['A'] == {'Category:Physics'}
+    assert net.checkValid('B',['Category:Chemistry'],[],['Category:Living'])
+    assert not 'B' in net.skipped_by_rule
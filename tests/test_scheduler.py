@@ -0,0 +1,63 @@
+import pytest
+
+from MockWiki import MockWikiServer,SyntheticWiki,FaultyResponses
+from WikiApi import RequestScheduler,RequestFailed
+from WikiCrawler import KnowledgeNet
+
+FAST_BACKOFF = {'network':(0.001,0.01),'server':(0.001,0.01),'ratelimit':(0.001,0.01),'maxlag':(0.001,0.01)}
+SITEINFO = {'action':'query','meta':'siteinfo','siprop':'namespaces','format':'json'}
+
+
+@pytest.fixture
+def faulty():
+    responder = FaultyResponses(SyntheticWiki(depth=1,fan_out=2,articles_per_category=2,links=2,paragraphs=1,seed=1),
+                                {},retry_after=0.01,seed=2)
+    with MockWikiServer(responder) as server:
+        responder.url = server.url
+        responder.server = server
+        yield responder
+
+
+@pytest.mark.parametrize('error,error_class',[('ratelimit','ratelimit'),('unavailable','server'),
+                                              ('maxlag','maxlag')])
+def test_transient_errors_are_retried(faulty,error,error_class):
+    faulty.rates = {error:0.5}
+    scheduler = RequestScheduler(max_retries=20,backoff=FAST_BACKOFF)
+    for _ in range(10):
+        response = scheduler.request(scheduler.session(),faulty.url,SITEINFO)
+        assert response.json()['query']['namespaces']['14']['name'] == 'Category'
+    stats = scheduler.stats()
+    assert stats['succeeded'] == 10 and stats['failed'] == 0
+    assert stats['retries'] == {error_class:faulty.injected[error]}
+    assert stats['requests'] == 10+faulty.injected[error]
+    if error in ['ratelimit','maxlag']:
+        # Retry-After pauses all requests
+        assert stats['waited'] > 0
+
+
+def test_retry_budget(faulty):
+    faulty.rates = {'unavailable':1.0}
+    scheduler = RequestScheduler(max_retries=3,backoff=FAST_BACKOFF)
+    with pytest.raises(RequestFailed) as failure:
+        scheduler.request(scheduler.session(),faulty.url,SITEINFO)
+    assert failure.value.error_class == 'server'
+    assert faulty.server.request_count == 4
+    assert scheduler.stats()['failed'] == 1
+
+
+@pytest.mark.parametrize('batched',[True,False])
+def test_failed_pages_are_skipped_by_problem(faulty,batched):
+    net = KnowledgeNet()
+    net.setDisplay('none')
+    net.setBackend(batched,api_url=faulty.url)
+    net.setRetries(max_retries=1,backoff=FAST_BACKOFF)
+    net.startScan('Category:Root',depth=2,verbose=0)
+    assert len(net.articles) == 6
+
+    faulty.rates = {'unavailable':1.0}
+    net.collect(links=True,text=False,verbose=0)
+    assert sorted(net.skipped_by_problem) == sorted(net.articles)
+    assert set(net.skipped_by_problem.values()) == {RequestFailed}
+    messages = [entry['message'] for entry in net.logging]
+    assert any('RequestFailed' in message for message in messages)
+    assert not any('connection problems' in message for message in messages)
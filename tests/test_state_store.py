@@ -0,0 +1,198 @@
+import os
+
+from WikiCrawler import KnowledgeNet
+from WikiStore import MappedStore,StoredDict
+
+
+def makeNet():
+    net = KnowledgeNet()
+    net.setDisplay('none')
+    return net
+
+
+def test_setStorage_after_save_keeps_new_entries(tmp_path):
+    state = str(tmp_path/'net.db')
+    net = makeNet()
+    net.links['A'] = ['B','C']
+    net.save(state)
+
+    net.setStorage(str(tmp_path/'mapped'))
+    net.links['D'] = ['E']
+    net.pages['D'] = 3
+    net.save(state,overwrite=True)
+
+    loaded = KnowledgeNet.load(state)
+    assert isinstance(loaded.links,MappedStore)
+    assert dict(loaded.links.items()) == {'A':['B','C'],'D':['E']}
+    assert dict(loaded.pages.items()) == {'D':3}
+
+
+def test_setStorage_back_to_memory(tmp_path):
+    state = str(tmp_path/'net.db')
+    net = makeNet()
+    net.setStorage(str(tmp_path/'mapped'))
+    net.links['A'] = ['B']
+    net.save(state)
+
+    net.setStorage(None)
+    net.links['C'] = ['D']
+    net.save(state,overwrite=True)
+
+    loaded = KnowledgeNet.load(state)
+    assert isinstance(loaded.links,StoredDict)
+    assert dict(loaded.links.items()) == {'A':['B'],'C':['D']}
+
+
+def test_checkpoint_writes_only_changed_tree_entries(tmp_path):
+    state = str(tmp_path/'net.db')
+    net = makeNet()
+    for i in range(5):
+        net.articles['A%d'%i] = 'Category:X'
+        net.category_tree['A%d'%i] = ['Category:X']
+    net.save(state)
+    assert isinstance(net.category_tree,StoredDict)
+    assert net.state_store.variables()[0].count('category_tree') == 0
+
+    net.category_tree['A1'] = net.category_tree['A1']+['Category:Y']
+    net.articles['B'] = 'Category:Y'
+    net.category_tree['B'] = ['Category:Y']
+    assert net.category_tree.commit() == 2
+    assert net.articles.commit() == 1
+    net.save(state)
+
+    loaded = KnowledgeNet.load(state)
+    assert list(loaded.articles) == ['A0','A1','A2','A3','A4','B']
+    assert loaded.category_tree['A1'] == ['Category:X','Category:Y']
+    assert loaded.category_tree.cache_size is None
+
+
+def test_stored_log_keeps_log_size_entries(tmp_path):
+    state = str(tmp_path/'net.db')
+    net = makeNet()
+    net.setDisplay('none',log_size=5)
+    for i in range(8):
+        net.log('message %d'%i)
+    net.save(state)
+    for i in range(8,12):
+        net.log('message %d'%i)
+    net.save(state)
+    assert len(net.logging) == 12
+    assert [entry['message'] for entry in net.logging] == ['message %d'%i for i in range(7,12)]
+
+    net.setDisplay('none',log_size=2)
+    net.save(state)
+    loaded = KnowledgeNet.load(state)
+    assert [entry['message'] for entry in loaded.logging] == ['message 10','message 11']
+    assert loaded.logging.capacity == 2
+    assert loaded.state_store.db.execute('SELECT COUNT(*) FROM log').fetchone()[0] == 2
+
+
+def test_checkpoint_skips_unchanged_versioned_variables(tmp_path,monkeypatch):
+    state = str(tmp_path/'net.db')
+    net = makeNet()
+    for i in range(3):
+        net.open_categories['Category:C%d'%i] = 1
+    net.closed_categories.append('Category:Root')
+    net.save(state)
+
+    import dill
+    pickled = []
+    dumps = dill.dumps
+    monkeypatch.setattr(dill,'dumps',lambda value,*args,**kwargs: pickled.append(value) or dumps(value,*args,**kwargs))
+    net.save(state)
+    assert not any(value is net.open_categories or value is net.closed_categories for value in pickled)
+
+    net.open_categories.pop('Category:C0')
+    net.save(state)
+    assert any(value is net.open_categories for value in pickled)
+    assert not any(value is net.closed_categories for value in pickled)
+    monkeypatch.undo()
+
+    loaded = KnowledgeNet.load(state)
+    assert list(loaded.open_categories) == ['Category:C1','Category:C2']
+    assert list(loaded.closed_categories) == ['Category:Root']
+
+
+def test_network_is_a_stored_map(tmp_path):
+    state = str(tmp_path/'net.db')
+    net = makeNet()
+    net.network = {'A':3,'B':1}
+    net.outside = {'X':2}
+    net.save(state)
+    assert isinstance(net.network,StoredDict) and isinstance(net.outside,StoredDict)
+    assert not 'network' in net.state_store.variables()[0]
+
+    loaded = KnowledgeNet.load(state)
+    assert dict(loaded.network.items()) == {'A':3,'B':1}
+    assert dict(loaded.outside.items()) == {'X':2}
+
+
+def test_stored_dict_items_in_batches(tmp_path):
+    state = str(tmp_path/'net.db')
+    net = makeNet()
+    for i in range(2500):
+        net.links['A%d'%i] = [i]
+    net.save(state)
+    links = KnowledgeNet.load(state).links
+    # changed, deleted and deleted-then-added keys while iterating over the stored rows in batches
+    links['A5'] = ['changed']
+    del links['A7']
+    del links['A9']
+    links['A9'] = ['again']
+    links['new'] = ['new']
+    items = list(links.items())
+    keys = ['A%d'%i for i in range(2500) if not i in [7,9]]+['A9','new']
+    assert [key for key,_ in items] == keys
+    values = dict(items)
+    assert values['A5'] == ['changed'] and values['A9'] == ['again'] and values['A2499'] == [2499]
+    assert not links.complete and len(links.cache) == 0
+
+
+def test_mapped_store_is_pickled_with_absolute_path(tmp_path,monkeypatch):
+    import dill
+    monkeypatch.chdir(tmp_path)
+    store = MappedStore('mapped','links')
+    store['A'] = ['B']
+    pickled = dill.dumps(store)
+    store.close()
+    (tmp_path/'elsewhere').mkdir()
+    monkeypatch.chdir(tmp_path/'elsewhere')
+    loaded = dill.loads(pickled)
+    assert loaded.path == str(tmp_path/'mapped')
+    assert loaded['A'] == ['B']
+    loaded.close()
+
+
+def test_mapped_store_cuts_index_beyond_data(tmp_path):
+    store = MappedStore(str(tmp_path),'links')
+    store['A'] = ['B']
+    store['C'] = ['D','E']
+    store.flush()
+    size = os.path.getsize(store.data_path)
+    index_size = os.path.getsize(store.index_path)
+    store.close()
+    # crash after the index was written but before the data: a line beyond the data and a torn line
+    with open(store.index_path,'a',encoding='utf-8') as fp:
+        fp.write('%d\t100\tF\n%d\t5\tG'%(size,size+100))
+    with open(store.data_path,'ab') as fp:
+        fp.write(b'partial')
+
+    store = MappedStore(str(tmp_path),'links')
+    assert dict(store.items()) == {'A':['B'],'C':['D','E']}
+    assert os.path.getsize(store.index_path) == index_size
+    assert os.path.getsize(store.data_path) == size
+    store['F'] = ['G']
+    store.close()
+    store = MappedStore(str(tmp_path),'links')
+    assert dict(store.items()) == {'A':['B'],'C':['D','E'],'F':['G']}
+    store.close()
+
+
+def test_setStorage_closes_mapped_stores(tmp_path):
+    net = makeNet()
+    net.setStorage(str(tmp_path/'mapped'))
+    net.links['A'] = ['B']
+    mapped = net.links,net.pages
+    net.setStorage(None)
+    assert net.links == {'A':['B']}
+    assert all(store.data.closed and store.index.closed for store in mapped)
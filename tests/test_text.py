@@ -0,0 +1,9 @@
+from WikiText import extractParagraphs
+
+
+def test_void_element_with_skipped_class():
+    html = ('<p>First paragraph <img class="noprint" src="a.png"> with an image.</p>'
+            '<p>Second <br class="mw-empty-elt"> paragraph<input class="noprint"/>.</p>'
+            '<p>Third paragraph<sup class="reference">[1]</sup>.</p>')
+    assert extractParagraphs(html,parser='html.parser') == ['First paragraph with an image.','Second paragraph.',
+                                                      'Third paragraph.']
@@ -0,0 +1,57 @@
+import pytest
+
+from MockWiki import MockWikiServer,SyntheticWiki
+from WikiCrawler import KnowledgeNet
+
+
+@pytest.fixture
+def wiki():
+    wiki = SyntheticWiki(depth=2,fan_out=2,articles_per_category=3,links=3,paragraphs=2,seed=1)
+    with MockWikiServer(wiki) as server:
+        wiki.url = server.url
+        yield wiki
+
+
+def collectedNet(wiki):
+    net = KnowledgeNet()
+    net.setDisplay('none')
+    net.setBackend(True,api_url=wiki.url)
+    net.startScan('Category:Root',depth=3,verbose=0)
+    net.collect(links=True,text=False,verbose=0)
+    return net
+
+
+def test_old_timestamp_compares_all_revisions(wiki):
+    net = collectedNet(wiki)
+    wiki.edit(['Article Root-0'])
+    # the edit is older than the recent changes that Wikipedia keeps
+    wiki.changes = []
+    result = net.updateCollection(text=False,since='2001-01-01T00:00:00Z',verbose=0)
+    assert result['changed'] == ['Article Root-0']
+
+
+def test_update_refreshes_ancestors(wiki):
+    net = collectedNet(wiki)
+    article = 'Article Root-0-0'
+    assert 'Category:Root-0' in net.retrieveCategories(article)
+    wiki.articles[article]['categories'] = ['Category:Root-1']
+    wiki.edit([article])
+    net.updateCollection(text=False,verbose=0)
+    assert net.category_tree[article] == ['Category:Root-1']
+    assert not 'Category:Root-0' in net.retrieveCategories(article)
+    assert net.collected == len(net.articles)
+
+
+def test_new_articles_come_from_crawled_categories(wiki):
+    net = collectedNet(wiki)
+    net.setBackend(True,api_url=wiki.url,record=True)
+    wiki.categories['Category:Elsewhere'] = {'members':[],'categories':[]}
+    for i in range(20):
+        wiki.addArticle('Unrelated %d'%i,['Category:Elsewhere'])
+    wiki.addArticle('Article New',['Category:Root-1-0','Category:Elsewhere'])
+    result = net.updateCollection(text=False,verbose=0)
+    assert result['new'] == ['Article New']
+    assert net.category_tree['Article New'] == ['Category:Root-1-0']
+    assert 'Article New' in net.links and net.collected == len(net.articles)
+    # the unrelated changes of the wiki are not requested
+    assert not any('Unrelated' in key for key in net.api.recorded)